@@ -0,0 +1,20 @@
+# Настройки gunicorn (читаются из текущего каталога автоматически)
+import os
+import shutil
+
+# Метрики воркеров пишутся в общий каталог, /metrics отдаёт их сумму
+# (uch.apps.core.metrics). Переменная должна быть задана до импорта
+# prometheus_client, то есть до загрузки приложения
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/uch-metrics')
+
+
+def on_starting(server):
+    # Значения прошлого запуска не должны попасть в новые счётчики
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'uch.apps.api'
+    verbose_name = 'API'
@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import override_settings
+
+from uch.apps.blog.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость и число запросов к БД у API и HTML-страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+
+    def handle(self, *args, **options):
+        article = Article.objects.filter(status='published').only('slug').first()
+        if article is None:
+            raise CommandError('Нет опубликованных статей')
+
+        targets = [
+            ('HTML: список', '/articles/'),
+            ('API: список', '/api/v1/articles/'),
+            ('API: список, только заголовки', '/api/v1/articles/?fields=title,url'),
+            ('HTML: статья', article.get_absolute_url()),
+            ('API: статья', f'/api/v1/articles/{article.slug}/'),
+        ]
+        client = Client()
+        # DEBUG нужен, чтобы connection.queries записывал SQL
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=True):
+            for label, url in targets:
+                self.run(client, label, url, options['requests'], options['cold'])
+
+    def run(self, client, label, url, count, cold):
+        client.get(url)
+        queries = 0
+        elapsed = 0.0
+        for _ in range(count):
+            if cold:
+                cache.clear()
+            reset_queries()
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed += time.perf_counter() - started
+            queries += len(connection.queries)
+        self.stdout.write(
+            f'{label:<32} {count / elapsed:8.1f} запр/с  '
+            f'{queries / count:5.1f} SQL/запрос  {len(response.content):>8} байт'
+        )
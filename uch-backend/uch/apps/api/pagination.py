@@ -0,0 +1,18 @@
+# uch/apps/api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class ApiCursorPagination(CursorPagination):
+    """Keyset-пагинация: без COUNT и OFFSET на глубоких страницах"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+
+class ArticleCursorPagination(ApiCursorPagination):
+    ordering = ('-published_at', '-id')
+
+
+class NameCursorPagination(ApiCursorPagination):
+    ordering = ('name', 'id')
@@ -0,0 +1,16 @@
+# uch/apps/api/renderers.py
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON через orjson (если установлен) — в разы быстрее стандартного json"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self.encoder_class().default)
@@ -0,0 +1,168 @@
+# uch/apps/api/serializers.py
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+from taggit.models import Tag, TaggedItem
+
+from uch.apps.blog.models import Article, Category, MediaItem
+
+
+def parse_list(request, param):
+    if request is None:
+        return None
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def attach_tag_names(articles):
+    """Имена тегов всех статей одним запросом.
+
+    prefetch_related('tags') в taggit строит отдельный QuerySet на каждую
+    статью, и на странице API это дороже самого SQL.
+    """
+    if not articles:
+        return articles
+    content_type = ContentType.objects.get_for_model(articles[0])
+    names = defaultdict(list)
+    for object_id, name in TaggedItem.objects.filter(
+            content_type=content_type, object_id__in=[a.pk for a in articles]
+    ).order_by('tag__name').values_list('object_id', 'tag__name'):
+        names[object_id].append(name)
+    for article in articles:
+        article.tag_names = names[article.pk]
+    return articles
+
+
+class SparseFieldsMixin:
+    """?fields=a,b — только перечисленные поля, ?embed=x — тяжёлые поля.
+
+    ``Meta.field_sources`` — какие столбцы модели нужны полю (по умолчанию
+    одноимённый). По ним представление строит ``only()`` и
+    ``select_related()`` и не читает лишнего из БД.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = parse_list(request, 'fields')
+        embedded = parse_list(request, 'embed') or set()
+        for name in list(self.fields):
+            if name in getattr(self.Meta, 'embeddable', ()) and name not in embedded:
+                self.fields.pop(name)
+            elif requested and name not in requested and name != 'id':
+                self.fields.pop(name)
+
+    def query_plan(self):
+        """(столбцы для only(), связи для select_related)"""
+        sources = getattr(self.Meta, 'field_sources', {})
+        columns, related = {'id'}, set()
+        for name in self.fields:
+            for column in sources.get(name, [name]):
+                columns.add(column)
+                if '__' in column:
+                    related.add(column.split('__')[0])
+        return sorted(columns), sorted(related)
+
+
+class CategoryRefSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+
+
+class ArticleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url')
+    author = serializers.CharField(source='author.username')
+    category = CategoryRefSerializer(allow_null=True)
+    tags = serializers.SerializerMethodField()
+    cover = serializers.SerializerMethodField()
+    comment_count = serializers.IntegerField(source='approved_comment_count')
+
+    class Meta:
+        model = Article
+        fields = ('id', 'title', 'slug', 'url', 'excerpt', 'author', 'category', 'tags',
+                  'cover', 'is_featured', 'comment_count', 'published_at', 'updated_at',
+                  'content_html')
+        embeddable = ('content_html',)
+        field_sources = {
+            'url': ['slug'],
+            'author': ['author__username'],
+            'category': ['category__id', 'category__name', 'category__slug'],
+            'cover': ['cover_image', 'cover_derivatives'],
+            'comment_count': ['approved_comment_count'],
+            # Подгружаются attach_tag_names()
+            'tags': [],
+        }
+
+    def get_tags(self, article):
+        if hasattr(article, 'tag_names'):
+            return article.tag_names
+        return sorted(tag.name for tag in article.tags.all())
+
+    def get_cover(self, article):
+        if not article.cover_image:
+            return None
+        storage = article.cover_image.storage
+        variants = article.cover_derivatives.get('variants', {})
+        return {
+            'url': article.cover_image.url,
+            'variants': {
+                fmt: [{'url': storage.url(v['name']), 'width': v['width'], 'height': v['height']}
+                      for v in items]
+                for fmt, items in variants.items()
+            },
+        }
+
+
+class ArticleDetailSerializer(ArticleSerializer):
+    class Meta(ArticleSerializer.Meta):
+        # На странице статьи текст нужен всегда
+        embeddable = ()
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    url = serializers.CharField(source='get_absolute_url')
+    article_count = serializers.IntegerField(source='published_article_count')
+
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug', 'url', 'description', 'parent', 'order',
+                  'article_count')
+        field_sources = {
+            'url': ['slug'],
+            'parent': ['parent_id'],
+            'article_count': ['published_article_count'],
+        }
+
+
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    article_count = serializers.IntegerField()
+
+    class Meta:
+        model = Tag
+        fields = ('id', 'name', 'slug', 'article_count')
+        # Считается аннотацией в представлении
+        field_sources = {'article_count': []}
+
+
+class MediaItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    url = serializers.FileField(source='file', use_url=True)
+    thumbnail = serializers.SerializerMethodField()
+    sha256 = serializers.CharField(source='blob_id', allow_null=True)
+
+    class Meta:
+        model = MediaItem
+        fields = ('id', 'title', 'description', 'file_type', 'url', 'thumbnail', 'sha256',
+                  'width', 'height', 'duration', 'uploaded_at', 'metadata')
+        embeddable = ('metadata',)
+        field_sources = {
+            'url': ['file'],
+            'thumbnail': ['thumbnail'],
+            'sha256': ['blob_id'],
+        }
+
+    def get_thumbnail(self, item):
+        return item.thumbnail.url if item.thumbnail else None
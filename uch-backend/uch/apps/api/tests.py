@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from uch.apps.blog.models import Article, Category
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ArticleApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('api')
+        self.category = Category.objects.create(name='Фото', slug='photo')
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                article = Article.objects.create(
+                    title=f'Статья {i}', slug=f'article-{i}', content=f'**Текст {i}**',
+                    author=self.author, category=self.category, status='published',
+                )
+                article.tags.add('camera')
+        Article.objects.create(title='Черновик', slug='draft', content='Текст',
+                               author=self.author, status='draft')
+
+    def test_list_is_paginated_by_cursor(self):
+        response = self.client.get('/api/v1/articles/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertNotIn('count', data)
+
+        slugs = [item['slug'] for item in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            slugs += [item['slug'] for item in data['results']]
+        self.assertEqual(len(slugs), 5)
+        self.assertNotIn('draft', slugs)
+
+    def test_fields_limit_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/articles/', {'fields': 'title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        sql = queries[-1]['sql']
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('auth_user', sql)
+        self.assertEqual(len(queries), 1)
+
+    def test_content_html_only_embedded_on_request(self):
+        item = self.client.get('/api/v1/articles/').json()['results'][0]
+        self.assertNotIn('content_html', item)
+        self.assertEqual(item['tags'], ['camera'])
+        self.assertEqual(item['category']['slug'], 'photo')
+
+        item = self.client.get('/api/v1/articles/', {'embed': 'content_html'}).json()['results'][0]
+        self.assertIn('<strong>', item['content_html'])
+
+        detail = self.client.get('/api/v1/articles/article-1/').json()
+        self.assertIn('<strong>Текст 1</strong>', detail['content_html'])
+        self.assertEqual(self.client.get('/api/v1/articles/draft/').status_code, 404)
+
+    def test_list_query_count_does_not_grow(self):
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/v1/articles/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/articles/')
+        self.assertEqual(first.content, second.content)
+
+    def test_etag_short_circuits_before_database(self):
+        response = self.client.get('/api/v1/articles/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/articles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Другой набор полей — другой ETag
+        other = self.client.get('/api/v1/articles/', {'fields': 'title'})
+        self.assertNotEqual(other['ETag'], etag)
+
+        Article.objects.filter(slug='article-0').first().save()
+        response = self.client.get('/api/v1/articles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_categories_and_tags(self):
+        category = self.client.get('/api/v1/categories/photo/').json()
+        self.assertEqual(category['article_count'], 5)
+        tags = self.client.get('/api/v1/tags/').json()['results']
+        self.assertEqual([(t['slug'], t['article_count']) for t in tags], [('camera', 5)])
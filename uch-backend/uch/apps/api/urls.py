@@ -0,0 +1,16 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('articles', views.ArticleViewSet, basename='article')
+router.register('categories', views.CategoryViewSet, basename='category')
+router.register('tags', views.TagViewSet, basename='tag')
+router.register('media', views.MediaItemViewSet, basename='media')
+
+urlpatterns = [
+    path('v1/', include(router.urls)),
+]
@@ -0,0 +1,147 @@
+# uch/apps/api/views.py
+"""
+Публичное read-only API (v1).
+
+Ответы не зависят от пользователя, поэтому аутентификация отключена
+(нет запросов к сессиям). ETag строится из версии кэша до обращения к
+БД: повторный запрос с If-None-Match получает 304 без единого SQL, а
+готовое JSON-тело берётся из кэша той же версии.
+"""
+import hashlib
+
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from rest_framework import permissions, viewsets
+from rest_framework.renderers import BrowsableAPIRenderer
+from taggit.models import Tag
+
+from uch.apps.blog.cache import media_cache, page_cache
+from uch.apps.blog.models import Article, Category, MediaItem
+
+from .pagination import ApiCursorPagination, ArticleCursorPagination, NameCursorPagination
+from .renderers import FastJSONRenderer
+from .serializers import (ArticleDetailSerializer, ArticleSerializer, CategorySerializer,
+                          MediaItemSerializer, TagSerializer, attach_tag_names)
+
+
+class ReadOnlyApiViewSet(viewsets.ReadOnlyModelViewSet):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # Версия этого кэша меняется при любом изменении данных ресурса
+    etag_cache = page_cache
+
+    def cache_key(self, request):
+        key = f'{request.get_full_path()}|{request.headers.get("Accept", "")}'
+        return 'api:' + hashlib.md5(key.encode()).hexdigest()[:12]
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        version = self.etag_cache.get_version()
+        key = self.cache_key(request)
+        etag = f'"{self.etag_cache.namespace}{version}-{key[4:]}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # JSON-ответы анонимным клиентам одинаковы — храним готовое тело
+            content = self.etag_cache.get(key, version)
+            if content is not None:
+                response = HttpResponse(content, content_type=FastJSONRenderer.media_type)
+            else:
+                response = super().dispatch(request, *args, **kwargs)
+                if (response.status_code == 200 and isinstance(
+                        getattr(response, 'accepted_renderer', None), FastJSONRenderer)):
+                    response.render()
+                    self.etag_cache.set(key, version, response.content)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, no_cache=True)
+            patch_vary_headers(response, ('Accept',))
+        return response
+
+    def get_queryset(self):
+        """Только столбцы и связи, нужные запрошенным полям"""
+        columns, related = self.get_serializer().query_plan()
+        # Поля сортировки нужны пагинатору для курсора
+        ordering = getattr(self.pagination_class, 'ordering', ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        columns += [field.lstrip('-') for field in ordering]
+        queryset = self.base_queryset()
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def base_queryset(self):
+        return self.queryset.all()
+
+
+class ArticleViewSet(ReadOnlyApiViewSet):
+    queryset = Article.objects.filter(status='published')
+    lookup_field = 'slug'
+    pagination_class = ArticleCursorPagination
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return ArticleDetailSerializer
+        return ArticleSerializer
+
+    def base_queryset(self):
+        queryset = self.queryset.all()
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category__ancestor_links__ancestor__slug=category)
+        tag = self.request.query_params.get('tag')
+        if tag:
+            queryset = queryset.filter(tags__slug=tag)
+        return queryset
+
+    def wants_tags(self):
+        return 'tags' in self.get_serializer().fields
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.wants_tags():
+            attach_tag_names(page)
+        return page
+
+    def get_object(self):
+        article = super().get_object()
+        if self.wants_tags():
+            attach_tag_names([article])
+        return article
+
+
+class CategoryViewSet(ReadOnlyApiViewSet):
+    queryset = Category.objects.filter(is_active=True)
+    serializer_class = CategorySerializer
+    lookup_field = 'slug'
+    pagination_class = NameCursorPagination
+
+
+class TagViewSet(ReadOnlyApiViewSet):
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    lookup_field = 'slug'
+    pagination_class = NameCursorPagination
+
+    def base_queryset(self):
+        # Только опубликованные статьи, счётчик из TagStat
+        return self.queryset.filter(stat__published_count__gt=0).annotate(
+            article_count=F('stat__published_count'))
+
+
+class MediaItemViewSet(ReadOnlyApiViewSet):
+    queryset = MediaItem.objects.all()
+    serializer_class = MediaItemSerializer
+    pagination_class = ApiCursorPagination
+    etag_cache = media_cache
+
+    def base_queryset(self):
+        queryset = self.queryset.all()
+        file_type = self.request.query_params.get('type')
+        if file_type:
+            queryset = queryset.filter(file_type=file_type)
+        return queryset
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import F
 from django.utils.html import format_html
 from .models import Category, Article, MediaItem, Comment
 
@@ -7,13 +8,15 @@ from .models import Category, Article, MediaItem, Comment
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent', 'order', 'is_active', 'article_count')
     list_filter = ('is_active', 'parent')
+    list_select_related = ('parent',)
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('order', 'name')
     
     def article_count(self, obj):
-        return obj.article_set.count()
+        return obj.published_article_count
     article_count.short_description = 'Статей'
+    article_count.admin_order_field = 'published_article_count'
 
 
 @admin.register(Article)
@@ -21,6 +24,7 @@ class ArticleAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'category', 'status', 
                     'published_at', 'is_featured', 'comment_count')
     list_filter = ('status', 'category', 'is_featured', 'created_at')
+    list_select_related = ('author', 'category')
     search_fields = ('title', 'content', 'excerpt')
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = ('created_at', 'updated_at', 'published_at', 'content_html')
@@ -42,8 +46,10 @@ class ArticleAdmin(admin.ModelAdmin):
     )
     
     def comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comment_count
     comment_count.short_description = 'Комментариев'
+    # Сортировка по той же сумме, что выводится в колонке
+    comment_count.admin_order_field = F('approved_comment_count') + F('pending_comment_count')
     
     def save_model(self, request, obj, form, change):
         if not obj.author_id:
@@ -51,16 +57,61 @@ class ArticleAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class ResolutionFilter(admin.SimpleListFilter):
+    """Фильтр по ширине (индексируемый столбец, без разбора metadata)"""
+    title = 'Разрешение'
+    parameter_name = 'resolution'
+    
+    def lookups(self, request, model_admin):
+        return [('sd', 'до 1280'), ('hd', 'от 1280'), ('fhd', 'от 1920'), ('4k', 'от 3840')]
+    
+    def queryset(self, request, queryset):
+        bounds = {'hd': 1280, 'fhd': 1920, '4k': 3840}
+        if self.value() == 'sd':
+            return queryset.filter(width__lt=1280)
+        if self.value() in bounds:
+            return queryset.filter(width__gte=bounds[self.value()])
+        return queryset
+
+
+class DurationFilter(admin.SimpleListFilter):
+    title = 'Длительность'
+    parameter_name = 'duration'
+    
+    def lookups(self, request, model_admin):
+        return [('short', 'до 1 мин'), ('medium', '1–10 мин'), ('long', 'больше 10 мин')]
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'short':
+            return queryset.filter(duration__lt=60)
+        if self.value() == 'medium':
+            return queryset.filter(duration__gte=60, duration__lt=600)
+        if self.value() == 'long':
+            return queryset.filter(duration__gte=600)
+        return queryset
+
+
 @admin.register(MediaItem)
 class MediaItemAdmin(admin.ModelAdmin):
-    list_display = ('title', 'file_type', 'uploaded_by', 'uploaded_at', 'preview')
-    list_filter = ('file_type', 'uploaded_at')
+    list_display = ('title', 'file_type', 'dimensions', 'duration',
+                    'uploaded_by', 'uploaded_at', 'preview')
+    list_filter = ('file_type', ResolutionFilter, DurationFilter, 'uploaded_at')
     search_fields = ('title', 'description')
-    readonly_fields = ('uploaded_at', 'preview')
+    readonly_fields = ('uploaded_at', 'preview', 'width', 'height', 'duration', 'metadata')
+    
+    def dimensions(self, obj):
+        if obj.width and obj.height:
+            return f"{obj.width}×{obj.height}"
+        return "—"
+    dimensions.short_description = 'Размер'
+    dimensions.admin_order_field = 'width'
     
     def preview(self, obj):
         if obj.file_type == 'image':
-            return format_html('<img src="{}" width="100" />', obj.file.url)
+            # Только превью: оригиналы в списке не загружаем
+            if obj.thumbnail:
+                return format_html('<img src="{}" width="100" />', obj.thumbnail.url)
+            return "Превью готовится"
         return f"Файл: {obj.file_type}"
     preview.short_description = 'Превью'
 
@@ -78,9 +129,9 @@ class CommentAdmin(admin.ModelAdmin):
     content_preview.short_description = 'Текст'
     
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
+        queryset.set_approved(True)
     approve_comments.short_description = "Одобрить выбранные комментарии"
     
     def disapprove_comments(self, request, queryset):
-        queryset.update(is_approved=False)
+        queryset.set_approved(False)
     disapprove_comments.short_description = "Снять одобрение"
\ No newline at end of file
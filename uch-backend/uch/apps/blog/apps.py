@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'uch.apps.blog'
-    verbose_name = 'Блог и Портфолио'
\ No newline at end of file
+    verbose_name = 'Блог и Портфолио'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,154 @@
+# uch/apps/blog/async_views.py
+"""
+Асинхронные версии главной, списка и страницы статьи для ASGI.
+
+Подключаются вместо синхронных при ``BLOG_ASYNC_VIEWS = True`` (uvicorn,
+daphne). Независимые запросы страницы запускаются одновременно через
+asyncio.gather, пока обработчик ждёт БД, цикл событий обслуживает другие
+соединения. Шаблон рендерится одним переходом в поток: в нём есть
+ленивые обращения к БД (контекстный процессор, соседние статьи).
+
+В Django 4.2 асинхронный ORM — обёртка над синхронным драйвером, и
+запросы одного обработчика по-прежнему выполняются по очереди в общем
+потоке; параллельными они станут с нативно асинхронными бэкендами без
+изменения этого кода.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+from taggit.models import Tag
+
+from .comments import load_comment_tree
+from .models import Article, Category
+from .page_cache import (
+    article_last_modified, blog_last_modified, category_last_modified, public_page,
+)
+from .pagination import CursorPaginator
+from .related import get_limit
+from .tags import popular_tags, tag_cloud
+from .views import ArticleListView, adjacent_articles, filter_articles
+
+arender = sync_to_async(render)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@public_page(blog_last_modified)
+async def home_view(request):
+    """Домашняя страница блога"""
+    published = Article.objects.published()
+    featured_articles, recent_articles, categories, tags = await asyncio.gather(
+        alist(published.filter(is_featured=True).for_cards()[:3]),
+        alist(published.for_cards()[:6]),
+        alist(Category.objects.filter(is_active=True)[:8]),
+        sync_to_async(tag_cloud)(10),
+    )
+    return await arender(request, 'blog/home.html', {
+        'featured_articles': featured_articles,
+        'recent_articles': recent_articles,
+        'categories': categories,
+        'popular_tags': tags,
+    })
+
+
+def ancestors(**descendant):
+    """Цепочка категорий от корня (как breadcrumbs), потомок — по условию"""
+    lookups = {f'descendant_links__descendant__{key}': value
+               for key, value in descendant.items()}
+    return Category.objects.filter(**lookups).order_by('-descendant_links__depth')
+
+
+def _paginate(request, queryset, category_slug):
+    """Пагинация как в ArticleListView (страницы и курсоры), со списком на руках"""
+    view = ArticleListView()
+    view.setup(request, category_slug=category_slug)
+    paginator, page, object_list, is_paginated = view.paginate_queryset(
+        queryset, view.paginate_by)
+    page.object_list = list(object_list)
+    if not isinstance(paginator, CursorPaginator):
+        paginator.count  # COUNT(*) здесь, а не при рендеринге шаблона
+    return paginator, page, page.object_list, is_paginated
+
+
+@public_page(category_last_modified)
+async def article_list_view(request, category_slug=None):
+    """Список статей (категории, теги, поиск) с пагинацией"""
+    category = None
+    if category_slug:
+        category = await Category.objects.filter(slug=category_slug).afirst()
+        if category is None:
+            raise Http404('Категория не найдена')
+
+    page_data, path, categories, recent_articles, tags = await asyncio.gather(
+        sync_to_async(_paginate)(request, filter_articles(request, category), category_slug),
+        alist(ancestors(slug=category_slug) if category else Category.objects.none()),
+        alist(Category.objects.filter(is_active=True)),
+        alist(Article.objects.published().for_links()[:5]),
+        sync_to_async(popular_tags)(10),
+    )
+    paginator, page, articles, is_paginated = page_data
+    return await arender(request, 'blog/article_list.html', {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': is_paginated,
+        'object_list': articles,
+        'articles': articles,
+        'category': category,
+        'breadcrumbs': path,
+        'cursor_pagination': isinstance(paginator, CursorPaginator),
+        'categories': categories,
+        'recent_articles': recent_articles,
+        'popular_tags': tags,
+    })
+
+
+def _comment_tree(request, article):
+    return load_comment_tree(
+        article,
+        include_pending=request.user.is_staff,
+        page=request.GET.get('comments_page'),
+    )
+
+
+@public_page(article_last_modified)
+async def article_detail_view(request, slug):
+    """Детальная страница статьи"""
+    published = Article.objects.published()
+    cards = published.for_links()
+    limit = get_limit()
+    try:
+        article, related, categories, article_tags, path = await asyncio.gather(
+            published.for_detail().aget(slug=slug),
+            alist(cards.filter(related_to__article__slug=slug).order_by('related_to__rank')[:limit]),
+            alist(Category.objects.filter(is_active=True)),
+            # Теги по slug, не дожидаясь самой статьи
+            alist(Tag.objects.filter(article__slug=slug, article__status='published')),
+            alist(ancestors(article__slug=slug)),
+        )
+    except Article.DoesNotExist:
+        raise Http404('Статья не найдена')
+    if not related:
+        # Похожие ещё не посчитаны — показываем свежие
+        related = await alist(cards.exclude(slug=slug)[:limit])
+    previous_article = next_article = None
+    if article.published_at:
+        previous, following = adjacent_articles(article)
+        previous_article, next_article = await asyncio.gather(previous.afirst(), following.afirst())
+
+    context = {
+        'article': article,
+        'object': article,
+        'categories': categories,
+        'related_articles': related,
+        'article_tags': article_tags,
+        'category_path': path,
+        'previous_article': previous_article,
+        'next_article': next_article,
+    }
+    if article.allow_comments:
+        context['comment_tree'] = await sync_to_async(_comment_tree)(request, article)
+    return await arender(request, 'blog/article_detail.html', context)
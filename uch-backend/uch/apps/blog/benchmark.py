@@ -0,0 +1,310 @@
+# uch/apps/blog/benchmark.py
+"""
+Нагрузочный стенд блога.
+
+  * ``generate_dataset()`` — детерминированные данные: статьи, категории
+    (дерево), теги и комментарии. Запись i зависит только от seed и i,
+    поэтому выборка на 1000 статей — начало выборки на 100 000.
+    Статьи пишутся через ArticleImporter (bulk + пул рендера), комментарии —
+    bulk_create со сверкой счётчиков в конце.
+  * ``benchmark_targets()`` — публичные страницы из blog/urls.py и списки
+    админки.
+  * ``measure()`` — задержка (min/p50/p95/mean) и число SQL-запросов.
+  * ``build_report()``/``compare_reports()`` — JSON-отчёт и сравнение двух
+    прогонов.
+
+QUERY_BUDGETS — допустимое число запросов страницы с холодным кэшем; тесты
+проверяют бюджеты и то, что число запросов не растёт вместе с данными.
+Запуск: ``manage.py benchmark_blog``.
+"""
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from taggit.models import Tag
+
+from .cache import fragment_cache, media_cache, page_cache, sidebar_cache
+from .counters import rebuild_counters
+from .models import Article, Category, Comment
+from .related import rebuild_related
+from .transfer import ArticleImporter, batched
+
+PREFIX = 'bench'
+REPORT_VERSION = 1
+BASE_DATE = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+WORDS = (
+    'звук синтез плёнка кадр свет цвет ритм модуляр шум тон фактура линия '
+    'форма жанр сцена монтаж набросок этюд холст глина студия запись микс'
+).split()
+
+# Запросов к БД на страницу с холодным кэшем (включая контекстный процессор
+# боковой панели и, в админке, сессию и пользователя)
+QUERY_BUDGETS = {
+    'home': 11,
+    'article_list': 12,
+    'article_list_page_2': 12,
+    'article_list_cursor': 11,
+    'article_list_tag': 12,
+    'article_list_search': 12,
+    'category_detail': 14,
+    'category_list': 6,
+    'article_detail': 15,
+    'admin_article': 13,
+    'admin_category': 11,
+    'admin_comment': 11,
+    'admin_mediaitem': 10,
+}
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def category_slug(i):
+    return f'{PREFIX}-category-{i}'
+
+
+def article_records(articles, categories, tags, authors, seed=1):
+    """Записи статей для ArticleImporter; запись i зависит только от (seed, i)"""
+    for i in range(articles):
+        rng = random.Random(f'{seed}:article:{i}')
+        paragraphs = [_words(rng, rng.randint(20, 60)) for _ in range(rng.randint(2, 5))]
+        category = rng.randrange(categories) if categories else None
+        yield {
+            'slug': f'{PREFIX}-article-{i}',
+            'title': _words(rng, rng.randint(2, 6)).capitalize(),
+            'excerpt': paragraphs[0][:200],
+            'content': f'## {_words(rng, 3)}\n\n' + '\n\n**{}**\n\n'.format(
+                _words(rng, 2)).join(paragraphs),
+            'status': 'published' if rng.random() < 0.9 else 'draft',
+            'is_featured': rng.random() < 0.05,
+            'author': f'{PREFIX}-user-{rng.randrange(authors)}',
+            'category': category_slug(category) if category is not None else None,
+            'category_name': f'Категория {category}',
+            # Популярность тегов убывает (как в реальных данных)
+            'tags': sorted({f'{PREFIX}-tag-{int(rng.paretovariate(1.2)) % tags}'
+                            for _ in range(rng.randint(1, 5))}) if tags else [],
+            'published_at': (BASE_DATE + timedelta(minutes=i * 37)).isoformat(),
+        }
+
+
+def generate_dataset(articles=1000, categories=20, tags=100, comments=5000, authors=10,
+                     seed=1, batch_size=1000, workers=0, log=None):
+    """Создаёт (или дополняет) данные стенда; возвращает число объектов"""
+    log = log or (lambda message: None)
+    User.objects.bulk_create([User(username=f'{PREFIX}-user-{i}') for i in range(authors)],
+                             ignore_conflicts=True)
+
+    # Дерево: первая четверть — корни, остальные вложены в более ранние
+    existing = set(Category.objects.filter(slug__startswith=f'{PREFIX}-').values_list(
+        'slug', flat=True))
+    rng = random.Random(f'{seed}:categories')
+    for i in range(categories):
+        parent = rng.randrange(i) if i >= max(1, categories // 4) else None
+        if category_slug(i) not in existing:
+            Category(name=f'Категория {i}', slug=category_slug(i), order=i,
+                     parent=Category.objects.get(slug=category_slug(parent))
+                     if parent is not None else None).save()
+    log(f'Категорий: {categories}')
+
+    started = time.monotonic()
+    done = 0
+    with ArticleImporter(workers=workers) as importer:
+        records = article_records(articles, categories, tags, authors, seed)
+        for batch in batched(records, batch_size):
+            done += importer.import_batch(batch)
+            log(f'  статей: {done} ({time.monotonic() - started:.1f} с)')
+
+    _generate_comments(comments, authors, seed, batch_size)
+    log(f'Комментариев: {comments}')
+    rebuild_counters()
+    rebuild_related()
+    return dataset_counts()
+
+
+def _generate_comments(count, authors, seed, batch_size):
+    """Комментарии: четверть — ответы, пятая часть — на модерации"""
+    existing = Comment.objects.filter(author__username__startswith=f'{PREFIX}-').count()
+    article_ids = list(Article.objects.filter(
+        slug__startswith=f'{PREFIX}-', status='published').order_by('pk').values_list(
+        'pk', flat=True))
+    author_ids = list(User.objects.filter(username__startswith=f'{PREFIX}-user-').order_by(
+        'pk').values_list('pk', flat=True))[:authors]
+    if not article_ids or not author_ids:
+        return
+
+    for batch in batched(range(existing, count), batch_size):
+        roots, replies = [], []
+        for i in batch:
+            rng = random.Random(f'{seed}:comment:{i}')
+            comment = Comment(
+                # Комментарии сосредоточены на части статей
+                article_id=article_ids[min(int(rng.expovariate(10 / len(article_ids))),
+                                           len(article_ids) - 1)],
+                author_id=rng.choice(author_ids),
+                content=_words(rng, rng.randint(5, 30)),
+                is_approved=rng.random() < 0.8,
+            )
+            (replies if roots and rng.random() < 0.25 else roots).append(comment)
+        Comment.objects.bulk_create(roots)
+        if connection.features.can_return_rows_from_bulk_insert:
+            by_article = {}
+            for root in roots:
+                by_article.setdefault(root.article_id, root.pk)
+            for reply in replies:
+                reply.parent_id = by_article.get(reply.article_id)
+        Comment.objects.bulk_create(replies)
+
+
+def dataset_counts():
+    return {
+        'articles': Article.objects.count(),
+        'published': Article.objects.published().count(),
+        'categories': Category.objects.count(),
+        'tags': Tag.objects.count(),
+        'comments': Comment.objects.count(),
+    }
+
+
+def flush_dataset():
+    """Удаляет данные стенда (по префиксу)"""
+    Comment.objects.filter(author__username__startswith=f'{PREFIX}-').delete()
+    Article.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+    Category.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+    Tag.objects.filter(name__startswith=f'{PREFIX}-').delete()
+    User.objects.filter(username__startswith=f'{PREFIX}-').delete()
+    rebuild_counters()
+
+
+def clear_caches():
+    """Холодный старт: общий кэш и локальные уровни VersionedCache"""
+    cache.clear()
+    for versioned in (sidebar_cache, page_cache, media_cache, fragment_cache):
+        versioned.clear_local()
+
+
+def benchmark_targets():
+    """[(имя, url, нужен ли вход в админку)] — самые тяжёлые варианты страниц"""
+    published = Article.objects.published()
+    article = published.order_by('-approved_comment_count', 'pk').first()
+    category = Category.objects.filter(parent=None).order_by(
+        '-published_article_count', 'pk').first()
+    tag = Tag.objects.order_by('-stat__published_count', 'pk').first()
+    articles = reverse('blog:article_list')
+    targets = [
+        ('home', reverse('blog:home'), False),
+        ('article_list', articles, False),
+        ('article_list_page_2', f'{articles}?page=2', False),
+        ('article_list_cursor', f'{articles}?cursor=', False),
+        ('category_list', reverse('blog:category_list'), False),
+    ]
+    if tag:
+        targets.append(('article_list_tag', f'{articles}?tag={tag.slug}', False))
+    if article:
+        word = article.title.split()[0]
+        targets += [
+            ('article_list_search', f'{articles}?q={word}', False),
+            ('article_detail', article.get_absolute_url(), False),
+        ]
+    if category:
+        targets.append(('category_detail', category.get_absolute_url(), False))
+    targets += [
+        (f'admin_{model}', reverse(f'admin:blog_{model}_changelist'), True)
+        for model in ('article', 'category', 'comment', 'mediaitem')
+    ]
+    return targets
+
+
+def admin_client():
+    user, _ = User.objects.get_or_create(
+        username=f'{PREFIX}-admin', defaults={'is_staff': True, 'is_superuser': True})
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(client, url, repeat=10, cold=True):
+    """Задержка и число запросов; с cold=True кэш очищается перед каждым запросом"""
+    client.get(url)  # прогрев: импорты, шаблоны, соединение
+    timings, queries = [], []
+    for _ in range(repeat):
+        if cold:
+            clear_caches()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    return {
+        'url': url,
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'queries': max(queries),
+        'min_ms': round(min(timings), 3),
+        'p50_ms': round(_percentile(timings, 0.5), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+
+def run_benchmark(repeat=10, cold=True, targets=None, log=None):
+    """{имя: результат measure() + бюджет запросов}"""
+    log = log or (lambda name, result: None)
+    clients = {False: Client(), True: admin_client()}
+    results = {}
+    for name, url, admin in targets or benchmark_targets():
+        result = measure(clients[admin], url, repeat, cold)
+        result['budget'] = QUERY_BUDGETS.get(name)
+        results[name] = result
+        log(name, result)
+    return results
+
+
+def over_budget(results):
+    return {name: result for name, result in results.items()
+            if result['budget'] is not None and result['queries'] > result['budget']}
+
+
+def build_report(results, repeat, cold, label=''):
+    return {
+        'version': REPORT_VERSION,
+        'label': label,
+        'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+        },
+        'settings': {'repeat': repeat, 'cold': cold},
+        'dataset': dataset_counts(),
+        'results': results,
+    }
+
+
+def compare_reports(old, new, metric='p50_ms'):
+    """[(имя, было, стало, изменение в %, запросов было, стало)] по общим страницам"""
+    rows = []
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        change = ((result[metric] - before[metric]) / before[metric] * 100
+                  if before[metric] else 0.0)
+        rows.append((name, before[metric], result[metric], round(change, 1),
+                     before['queries'], result['queries']))
+    return rows
@@ -0,0 +1,103 @@
+# uch/apps/blog/cache.py
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from uch.apps.core.metrics import CACHE_REQUESTS
+
+
+class VersionedCache:
+    """Версионированный кэш: локальный уровень процесса перед кэшем Django.
+
+    Все ключи пространства имён содержат номер версии. Инвалидация — это
+    увеличение версии (bump): старые записи больше не читаются и просто
+    истекают по таймауту, а локальный уровень других процессов промахивается
+    по новой версии.
+    """
+
+    def __init__(self, namespace, timeout=300):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.version_key = f'blog:{namespace}:version'
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 1, None)
+            version = cache.get(self.version_key, 1)
+        return version
+
+    def bump(self):
+        """Инвалидирует всё пространство имён.
+
+        Внутри транзакции версия увеличивается ещё раз после фиксации:
+        запись, собранная другим процессом из старых данных до COMMIT,
+        не переживёт транзакцию.
+        """
+        self._bump()
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(self._bump)
+
+    def _bump(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # Ключа версии ещё нет (или он вытеснен) — начинаем заново
+            cache.add(self.version_key, 1, None)
+            cache.incr(self.version_key)
+        self.clear_local()
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def make_key(self, key, version):
+        return f'blog:{self.namespace}:{version}:{key}'
+
+    def get(self, key, version):
+        """Чтение только из общего кэша (для крупных значений вроде страниц)"""
+        value = cache.get(self.make_key(key, version))
+        CACHE_REQUESTS.labels(self.namespace, 'miss' if value is None else 'hit').inc()
+        return value
+
+    def set(self, key, version, value):
+        cache.set(self.make_key(key, version), value, self.timeout)
+
+    def get_or_set(self, key, builder):
+        """Возвращает значение из кэша или строит его через builder()"""
+        version = self.get_version()
+        local_key = (key, version)
+
+        value = self._local.get(local_key)
+        if value is not None:
+            CACHE_REQUESTS.labels(self.namespace, 'local_hit').inc()
+            return value
+
+        cache_key = self.make_key(key, version)
+        value = cache.get(cache_key)
+        if value is None:
+            CACHE_REQUESTS.labels(self.namespace, 'miss').inc()
+            value = builder()
+            cache.set(cache_key, value, self.timeout)
+        else:
+            CACHE_REQUESTS.labels(self.namespace, 'hit').inc()
+
+        with self._lock:
+            # Записи устаревших версий больше не нужны
+            for stale in [k for k in self._local if k[1] != version]:
+                del self._local[stale]
+            self._local[local_key] = value
+        return value
+
+
+sidebar_cache = VersionedCache('sidebar')
+page_cache = VersionedCache('pages', timeout=600)
+# Версия медиатеки: ETag ответов API о медиафайлах
+media_cache = VersionedCache('media')
+# Фрагменты HTML (fragments.py). Правка статьи меняет её updated_at, а версия
+# растёт от того, что в updated_at не отражается: теги, категории, отрисовка
+# Markdown и обложек
+fragment_cache = VersionedCache('fragments', timeout=24 * 3600)
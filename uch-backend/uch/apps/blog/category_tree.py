@@ -0,0 +1,146 @@
+# uch/apps/blog/category_tree.py
+"""
+Иерархия категорий в таблице замыкания (CategoryClosure).
+
+Для каждой категории хранятся пары (предок, потомок, глубина) со всеми
+предками, включая её саму (глубина 0). Поэтому одним запросом без
+рекурсии можно получить:
+  * статьи категории вместе с подкатегориями — ``in_subtree()``;
+  * цепочку предков для хлебных крошек — ``breadcrumbs()``;
+  * всё дерево — ``get_category_tree()`` (строится из одного запроса и
+    хранится в кэше боковой панели вместе с готовым HTML).
+
+Таблица обновляется в Category.save(): новая категория получает связи
+предков родителя, перенос заменяет связи поддерева с прежними предками
+на связи с новыми. Удаление чистится каскадом.
+"""
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .cache import sidebar_cache
+
+
+def insert_node(category_id, parent_id):
+    from .models import CategoryClosure
+
+    links = [CategoryClosure(ancestor_id=category_id, descendant_id=category_id, depth=0)]
+    if parent_id:
+        links += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=parent_id).values_list('ancestor_id', 'depth')
+        ]
+    CategoryClosure.objects.bulk_create(links)
+
+
+def move_node(category_id, parent_id):
+    """Переносит поддерево category_id под parent_id (None — в корень)"""
+    from .models import CategoryClosure
+
+    with transaction.atomic():
+        subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id)
+                       .values_list('descendant_id', 'depth'))
+        ids = [descendant_id for descendant_id, _ in subtree]
+        if parent_id in ids:
+            raise ValueError('Категорию нельзя вложить в её собственную подкатегорию')
+
+        # Связи поддерева с прежними предками
+        CategoryClosure.objects.filter(descendant_id__in=ids).exclude(
+            ancestor_id__in=ids).delete()
+        if parent_id:
+            ancestors = CategoryClosure.objects.filter(descendant_id=parent_id).values_list(
+                'ancestor_id', 'depth')
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id,
+                                depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            ])
+
+
+def closure_links(parents):
+    """Все связи по словарю {id: parent_id}: [(предок, потомок, глубина)]"""
+    links = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        seen = set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append((ancestor_id, category_id, depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    return links
+
+
+def rebuild_closure():
+    """Перестраивает таблицу по Category.parent; возвращает число связей"""
+    from .models import Category, CategoryClosure
+
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create([
+            CategoryClosure(ancestor_id=a, descendant_id=d, depth=depth)
+            for a, d, depth in closure_links(parents)
+        ], batch_size=1000)
+    sidebar_cache.bump()
+    return CategoryClosure.objects.count()
+
+
+def is_descendant(category_id, ancestor_id):
+    from .models import CategoryClosure
+
+    return CategoryClosure.objects.filter(
+        ancestor_id=ancestor_id, descendant_id=category_id).exists()
+
+
+def in_subtree(queryset, category, field='category'):
+    """Фильтр статей (или другого queryset) по категории и её подкатегориям"""
+    return queryset.filter(**{f'{field}__ancestor_links__ancestor': category})
+
+
+def breadcrumbs(category):
+    """Предки категории от корня до неё самой"""
+    from .models import Category
+
+    if category is None:
+        return []
+    return list(Category.objects.filter(descendant_links__descendant=category)
+                .order_by('-descendant_links__depth'))
+
+
+def build_category_tree():
+    """Корни дерева активных категорий; у узлов child_nodes, depth и subtree_count"""
+    from .models import Category
+
+    nodes = list(Category.objects.filter(is_active=True))
+    by_id = {node.pk: node for node in nodes}
+    roots = []
+    for node in nodes:
+        node.child_nodes = []
+    for node in nodes:
+        parent = by_id.get(node.parent_id)
+        if parent is not None:
+            parent.child_nodes.append(node)
+        elif node.parent_id is None:
+            roots.append(node)
+        # Ветки под неактивной категорией не показываются
+
+    def walk(node, depth):
+        node.depth = depth
+        node.subtree_count = node.published_article_count + sum(
+            walk(child, depth + 1) for child in node.child_nodes)
+        return node.subtree_count
+
+    for root in roots:
+        walk(root, 0)
+    return roots
+
+
+def get_category_tree():
+    return sidebar_cache.get_or_set('category_tree', build_category_tree)
+
+
+def render_category_tree():
+    """HTML дерева категорий (кэшируется вместе с данными боковой панели)"""
+    return sidebar_cache.get_or_set('category_tree_html', lambda: render_to_string(
+        'blog/includes/category_tree.html', {'nodes': get_category_tree()}))
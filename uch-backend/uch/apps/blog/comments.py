@@ -0,0 +1,73 @@
+# uch/apps/blog/comments.py
+from django.core.paginator import Paginator
+
+from .models import Comment
+
+# Дальше этой глубины ответы не сдвигаются вправо (классы Bootstrap ms-0..ms-5)
+MAX_INDENT = 5
+
+
+class CommentTree:
+    """Страница веток комментариев статьи.
+
+    ``page`` — страница корневых комментариев (для навигации),
+    ``comments`` — все комментарии этих веток в порядке обхода в глубину;
+    у каждого есть ``depth``, ``indent`` и ``children``.
+    """
+
+    def __init__(self, page, comments, total):
+        self.page = page
+        self.comments = comments
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+
+def load_comment_tree(article, include_pending=False, page=1, per_page=20):
+    """Загружает ветки комментариев статьи одним запросом.
+
+    Вложенность строится в памяти на любую глубину. Ответы на скрытые
+    (неодобренные) комментарии скрываются вместе с родителем.
+    """
+    queryset = Comment.objects.filter(article=article).select_related('author').only(
+        'id', 'parent_id', 'content', 'is_approved', 'created_at', 'author__username',
+    ).order_by('created_at', 'id')
+    if not include_pending:
+        queryset = queryset.filter(is_approved=True)
+
+    comments = list(queryset)
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+    for comment in comments:
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            by_id[comment.parent_id].children.append(comment)
+
+    # Новые ветки сверху, ответы внутри ветки — по времени
+    roots.reverse()
+    threads = Paginator(roots, per_page).get_page(page)
+
+    flat = []
+    stack = [(root, 0) for root in reversed(threads.object_list)]
+    while stack:
+        comment, depth = stack.pop()
+        comment.depth = depth
+        comment.indent = min(depth, MAX_INDENT)
+        flat.append(comment)
+        stack.extend((child, depth + 1) for child in reversed(comment.children))
+
+    # Видимых комментариев: без ответов на скрытые
+    total, stack = 0, list(roots)
+    while stack:
+        comment = stack.pop()
+        total += 1
+        stack.extend(comment.children)
+
+    return CommentTree(threads, flat, total)
@@ -1,87 +1,57 @@
 # uch/apps/blog/context_processors.py
-from .models import Category, Article
-from taggit.models import Tag
-from django.db.models import Count, Q  # ← ДОБАВЬТЕ Q
+import logging
 
+from .sidebar import get_sidebar_data
 
-def blog_categories(request):
-    """Добавляет категории блога во все шаблоны"""
+logger = logging.getLogger(__name__)
+
+
+def sidebar_data(request):
+    """Комбинированный процессор для боковой панели (данные из кэша)"""
     try:
-        categories = Category.objects.annotate(
-            article_count=Count('article', filter=Q(article__status='published'))
-        ).filter(is_active=True, article_count__gt=0)[:10]
-        
+        data = get_sidebar_data()
+
         return {
-            'blog_categories': categories,
-            'categories': categories,  # Для совместимости
+            'blog_categories': data['categories'],
+            'categories': data['categories'],  # Для совместимости
+            'popular_tags': data['popular_tags'],
+            'latest_articles': data['latest_articles'],
+            'total_articles': data['total_articles'],
+            'total_categories': data['total_categories'],
         }
-    except Exception as e:
-        print(f"Error in blog_categories: {e}")
+    except Exception:
+        logger.exception('Не удалось получить данные боковой панели')
         return {
             'blog_categories': [],
             'categories': [],
+            'popular_tags': [],
+            'latest_articles': [],
+            'total_articles': 0,
+            'total_categories': 0,
         }
 
 
+def blog_categories(request):
+    """Добавляет категории блога во все шаблоны"""
+    context = sidebar_data(request)
+    return {
+        'blog_categories': context['blog_categories'],
+        'categories': context['categories'],
+    }
+
+
 def popular_tags(request):
     """Добавляет популярные теги во все шаблоны"""
-    try:
-        tags = Tag.objects.annotate(
-            num_times=Count('taggit_taggeditem_items')
-        ).order_by('-num_times')[:10]
-        
-        return {
-            'popular_tags': tags,
-        }
-    except Exception as e:
-        print(f"Error in popular_tags: {e}")
-        return {
-            'popular_tags': [],
-        }
+    return {
+        'popular_tags': sidebar_data(request)['popular_tags'],
+    }
 
 
 def blog_stats(request):
     """Добавляет статистику блога"""
-    try:
-        latest_articles = Article.objects.filter(status='published').order_by('-created_at')[:5]
-        
-        return {
-            'total_articles': Article.objects.filter(status='published').count(),
-            'total_categories': Category.objects.filter(is_active=True).count(),
-            'latest_articles': latest_articles,
-        }
-    except Exception as e:
-        print(f"Error in blog_stats: {e}")
-        return {
-            'total_articles': 0,
-            'total_categories': 0,
-            'latest_articles': [],
-        }
-
-
-def sidebar_data(request):
-    """Комбинированный процессор для боковой панели"""
-    try:
-        # Получаем все данные
-        categories = Category.objects.annotate(
-            article_count=Count('article', filter=Q(article__status='published'))
-        ).filter(is_active=True, article_count__gt=0)[:10]
-        
-        tags = Tag.objects.annotate(
-            num_times=Count('taggit_taggeditem_items')
-        ).order_by('-num_times')[:10]
-        
-        latest_articles = Article.objects.filter(status='published').order_by('-created_at')[:5]
-        
-        return {
-            'categories': categories,
-            'popular_tags': tags,
-            'latest_articles': latest_articles,
-        }
-    except Exception as e:
-        print(f"Error in sidebar_data: {e}")
-        return {
-            'categories': [],
-            'popular_tags': [],
-            'latest_articles': [],
-        }
\ No newline at end of file
+    context = sidebar_data(request)
+    return {
+        'total_articles': context['total_articles'],
+        'total_categories': context['total_categories'],
+        'latest_articles': context['latest_articles'],
+    }
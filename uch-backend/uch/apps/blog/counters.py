@@ -0,0 +1,222 @@
+# uch/apps/blog/counters.py
+"""
+Денормализованные счётчики:
+  * Article.approved_comment_count / pending_comment_count;
+  * Category.published_article_count;
+  * TagStat.published_count (только опубликованные статьи).
+
+Счётчики меняются атомарными UPDATE ... SET x = x + delta в той же
+транзакции, что и изменение комментария или статьи. Пересчитать и
+проверить их целиком можно командой ``rebuild_counters``.
+"""
+from collections import Counter
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import page_cache, sidebar_cache
+from .models import Article, Category, Comment, TagStat
+
+
+def _increment(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def adjust_comment_counts(article_id, approved=0, pending=0):
+    changes = {}
+    if approved:
+        changes['approved_comment_count'] = _increment('approved_comment_count', approved)
+    if pending:
+        changes['pending_comment_count'] = _increment('pending_comment_count', pending)
+    if article_id and changes:
+        Article.objects.filter(pk=article_id).update(**changes)
+
+
+def adjust_category_count(category_id, delta):
+    if category_id and delta:
+        Category.objects.filter(pk=category_id).update(
+            published_article_count=_increment('published_article_count', delta)
+        )
+
+
+def _comment_delta(state, sign):
+    """(article_id, is_approved) -> изменения счётчиков"""
+    article_id, is_approved = state
+    if is_approved:
+        return article_id, sign, 0
+    return article_id, 0, sign
+
+
+def comment_changed(old_state, new_state):
+    """Учитывает переход комментария из old_state в new_state (None — нет)"""
+    if old_state == new_state:
+        return
+    if old_state is not None:
+        article_id, approved, pending = _comment_delta(old_state, -1)
+        adjust_comment_counts(article_id, approved, pending)
+    if new_state is not None:
+        article_id, approved, pending = _comment_delta(new_state, 1)
+        adjust_comment_counts(article_id, approved, pending)
+
+
+def adjust_tag_counts(tag_ids, delta):
+    tag_ids = list(tag_ids or ())
+    if not tag_ids or not delta:
+        return
+    if delta > 0:
+        # Строки статистики появляются при первом использовании тега
+        TagStat.objects.bulk_create([TagStat(tag_id=pk) for pk in tag_ids],
+                                    ignore_conflicts=True)
+    TagStat.objects.filter(tag_id__in=tag_ids).update(
+        published_count=_increment('published_count', delta)
+    )
+
+
+def article_tags():
+    """TaggedItem статей (общая таблица taggit для всех моделей)"""
+    return Article.tags.through.objects.filter(
+        content_type=ContentType.objects.get_for_model(Article))
+
+
+def article_tag_ids(article_id):
+    return list(article_tags().filter(object_id=article_id).values_list('tag_id', flat=True))
+
+
+def is_published(article):
+    """Опубликована ли статья по состоянию в БД (если оно известно)"""
+    state = getattr(article, '_counted_state', None)
+    return (state[0] if state else article.status) == 'published'
+
+
+def article_changed(old_state, new_state, article_id=None):
+    """То же для статьи: state = (status, category_id).
+
+    С article_id при публикации и снятии с публикации меняются и
+    счётчики тегов статьи.
+    """
+    old_category = old_state[1] if old_state and old_state[0] == 'published' else None
+    new_category = new_state[1] if new_state and new_state[0] == 'published' else None
+    if old_category != new_category:
+        adjust_category_count(old_category, -1)
+        adjust_category_count(new_category, 1)
+
+    was_published = bool(old_state) and old_state[0] == 'published'
+    now_published = bool(new_state) and new_state[0] == 'published'
+    if article_id and was_published != now_published:
+        adjust_tag_counts(article_tag_ids(article_id), 1 if now_published else -1)
+
+
+def tags_changed(article, action, tag_ids):
+    """Учитывает add/remove/clear тегов опубликованной статьи (m2m_changed)"""
+    if not is_published(article):
+        return
+    if action == 'pre_clear':
+        # После clear() узнать снятые теги уже нельзя
+        article._cleared_tag_ids = article_tag_ids(article.pk)
+    elif action == 'post_clear':
+        adjust_tag_counts(article.__dict__.pop('_cleared_tag_ids', None), -1)
+    elif action == 'post_add':
+        adjust_tag_counts(tag_ids, 1)
+    elif action == 'post_remove':
+        adjust_tag_counts(tag_ids, -1)
+
+
+def set_comments_approved(queryset, approved):
+    """Массово (не)одобряет комментарии и переносит их между счётчиками"""
+    with transaction.atomic():
+        rows = list(
+            queryset.exclude(is_approved=approved)
+            .select_for_update(of=('self',))
+            .values_list('pk', 'article_id')
+        )
+        if not rows:
+            return 0
+
+        Comment.objects.filter(pk__in=[pk for pk, _ in rows]).update(is_approved=approved)
+
+        sign = 1 if approved else -1
+        per_article = Counter(article_id for _, article_id in rows)
+        for article_id, count in per_article.items():
+            adjust_comment_counts(article_id, approved=sign * count, pending=-sign * count)
+        # update() не посылает сигналов — сбрасываем кэш страниц сами
+        page_cache.bump()
+        return len(rows)
+
+
+def _count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(
+        Subquery(counts.annotate(total=Count('pk')).values('total')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def actual_counts():
+    """Запросы с фактическими значениями всех счётчиков"""
+    articles = Article.objects.annotate(
+        actual_approved=_count_subquery(Comment.objects.filter(is_approved=True), 'article'),
+        actual_pending=_count_subquery(Comment.objects.filter(is_approved=False), 'article'),
+    )
+    categories = Category.objects.annotate(
+        actual_published=_count_subquery(Article.objects.published(), 'category'),
+    )
+    return articles, categories
+
+
+def actual_tag_counts():
+    """{tag_id: число опубликованных статей с тегом}"""
+    return dict(
+        article_tags()
+        .filter(object_id__in=Article.objects.published().values('pk'))
+        .values('tag_id').annotate(total=Count('pk')).values_list('tag_id', 'total')
+    )
+
+
+def find_tag_mismatches():
+    """[(tag_id, в таблице, факт)] для разошедшихся счётчиков тегов"""
+    actual = actual_tag_counts()
+    stored = dict(TagStat.objects.values_list('tag_id', 'published_count'))
+    return [
+        (tag_id, stored.get(tag_id, 0), actual.get(tag_id, 0))
+        for tag_id in sorted(set(actual) | set(stored))
+        if stored.get(tag_id, 0) != actual.get(tag_id, 0)
+    ]
+
+
+def find_mismatches():
+    """Статьи и категории, у которых счётчик разошёлся с фактом"""
+    articles, categories = actual_counts()
+    articles = articles.filter(
+        ~Q(approved_comment_count=F('actual_approved')) |
+        ~Q(pending_comment_count=F('actual_pending'))
+    )
+    categories = categories.exclude(published_article_count=F('actual_published'))
+    return articles, categories
+
+
+def rebuild_counters():
+    """Пересчитывает все счётчики; возвращает число исправленных статей, категорий и тегов"""
+    with transaction.atomic():
+        articles, categories = find_mismatches()
+        fixed_articles = Article.objects.filter(pk__in=articles.values('pk')).update(
+            approved_comment_count=_count_subquery(
+                Comment.objects.filter(is_approved=True), 'article'),
+            pending_comment_count=_count_subquery(
+                Comment.objects.filter(is_approved=False), 'article'),
+        )
+        fixed_categories = Category.objects.filter(pk__in=categories.values('pk')).update(
+            published_article_count=_count_subquery(
+                Article.objects.published(), 'category'),
+        )
+        mismatches = find_tag_mismatches()
+        TagStat.objects.bulk_create(
+            [TagStat(tag_id=tag_id) for tag_id, _, _ in mismatches], ignore_conflicts=True)
+        for tag_id, _, actual in mismatches:
+            TagStat.objects.filter(tag_id=tag_id).update(published_count=actual)
+        if fixed_articles or fixed_categories or mismatches:
+            page_cache.bump()
+            sidebar_cache.bump()
+    return fixed_articles, fixed_categories, len(mismatches)
@@ -0,0 +1,118 @@
+# uch/apps/blog/covers.py
+"""
+Производные обложек статей для srcset.
+
+Файлы лежат в ``articles/covers/derived/<sha256 оригинала>/`` и описаны
+там же в ``manifest.json``, который пишется последним. Одинаковая
+обложка у нескольких статей (или повторная загрузка того же файла)
+обрабатывается один раз: при наличии манифеста картинки не декодируются.
+Описание производных копируется в ``Article.cover_derivatives``::
+
+    {'source': <имя файла обложки>, 'width': ..., 'height': ...,
+     'variants': {'WEBP': [{'name': ..., 'width': ..., 'height': ...}, ...],
+                  'JPEG': [...]}}
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .thumbnails import IMAGE_ERRORS, file_source, render_thumbnails
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'articles/covers/derived'
+COVER_VERSION = 1
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png', 'AVIF': 'image/avif'}
+
+
+def get_specs():
+    return {
+        f'{width}-{fmt}': {'size': (width, None), 'format': fmt.upper(),
+                           'quality': settings.MEDIA_THUMBNAIL_QUALITY}
+        for width in settings.ARTICLE_COVER_WIDTHS
+        for fmt in settings.ARTICLE_COVER_FORMATS
+    }
+
+
+def file_hash(field_file):
+    digest = hashlib.sha256(f'{COVER_VERSION}:'.encode())
+    with field_file.open('rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_current(article):
+    return article.cover_derivatives.get('source') == article.cover_image.name
+
+
+def build_derivatives(field_file, digest, pool=None):
+    """Создаёт (или берёт с диска) производные обложки; возвращает манифест"""
+    from uch.apps.core.background import run_cpu
+
+    storage = field_file.storage
+    directory = f'{DERIVED_DIR}/{digest}'
+    manifest_name = f'{directory}/manifest.json'
+    if storage.exists(manifest_name):
+        with storage.open(manifest_name) as f:
+            return json.load(f)
+
+    specs = get_specs()
+    (width, height), results = run_cpu(
+        render_thumbnails, file_source(field_file), specs, pool=pool)
+
+    variants = {}
+    for name, spec in sorted(specs.items(), key=lambda kv: kv[1]['size'][0]):
+        content, variant_width, variant_height = results[name]
+        fmt = spec['format']
+        # Картинка уже в ширину оригинала — бо́льшие варианты не нужны
+        if any(v['width'] == variant_width for v in variants.get(fmt, [])):
+            continue
+        path = f'{directory}/{variant_width}w.{fmt.lower()}'
+        storage.delete(path)
+        variants.setdefault(fmt, []).append({
+            'name': storage.save(path, ContentFile(content)),
+            'width': variant_width, 'height': variant_height,
+        })
+
+    manifest = {'width': width, 'height': height, 'variants': variants}
+    storage.delete(manifest_name)
+    storage.save(manifest_name, ContentFile(json.dumps(manifest).encode()))
+    return manifest
+
+
+def generate_covers(article_id, pool=None):
+    """Обновляет производные обложки статьи (идемпотентно)"""
+    from .cache import fragment_cache, page_cache
+    from .models import Article
+
+    article = Article.objects.filter(pk=article_id).only(
+        'pk', 'cover_image', 'cover_derivatives').first()
+    if article is None or not article.cover_image or is_current(article):
+        return False
+
+    source = article.cover_image.name
+    try:
+        digest = file_hash(article.cover_image)
+        record = dict(build_derivatives(article.cover_image, digest, pool), source=source)
+    except IMAGE_ERRORS as e:
+        logger.warning('Не удалось обработать обложку %s: %s', source, e)
+        digest, record = '', {'source': source, 'error': str(e)}
+
+    # Обложку заменили во время обработки — результат отбрасываем
+    updated = Article.objects.filter(pk=article_id, cover_image=source).update(
+        cover_hash=digest, cover_derivatives=record)
+    if updated:
+        page_cache.bump()
+        fragment_cache.bump()
+    return bool(updated)
+
+
+def schedule_covers(article):
+    from uch.apps.core.background import run_task_on_commit
+    from .tasks import generate_covers_task
+
+    run_task_on_commit(generate_covers_task, article.pk)
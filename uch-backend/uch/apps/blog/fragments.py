@@ -0,0 +1,80 @@
+# uch/apps/blog/fragments.py
+"""
+Кэш фрагментов: HTML карточек статей и тела страницы статьи.
+
+Страница целиком кэшируется только для анонимных посетителей (page_cache.py),
+а карточки одинаковы для всех, поэтому кэшируются отдельно. Ключ карточки —
+(вариант, pk, updated_at, число комментариев, версия fragment_cache):
+изменённая статья получает новый ключ, а старый истекает сам.
+
+Карточки списка читаются одним get_many, отрисовываются только промахи
+(теги подгружаются тоже только для них) и записываются одним set_many.
+Тело статьи — тегом ``{% cache %}`` с той же версией (article_detail.html).
+
+Фрагменты из данных реплики отрисовываются, но не сохраняются: версия уже
+увеличена коммитом в основной БД, а реплика могла не догнать её.
+"""
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from uch.apps.core.metrics import CACHE_REQUESTS
+from uch.apps.core.routers import replica_reads
+
+from .cache import fragment_cache
+
+CARD_TEMPLATES = {
+    'list': 'blog/includes/article_card.html',
+    'home': 'blog/includes/article_card_home.html',
+    'featured': 'blog/includes/article_card_featured.html',
+}
+# Вариантам с тегами на карточке нужна их подгрузка
+CARDS_WITH_TAGS = {'list', 'home'}
+
+
+def card_key(article, variant, lazy, version):
+    stamp = article.updated_at.timestamp() if article.updated_at else 0
+    return fragment_cache.make_key(
+        f'card:{variant}:{int(lazy)}:{article.pk}:{stamp}:{article.approved_comment_count}',
+        version)
+
+
+def store_timeout():
+    """Срок хранения новых фрагментов; 0 — не сохранять (чтение с реплики)"""
+    return 0 if replica_reads() else fragment_cache.timeout
+
+
+def render_card(article, variant, lazy=True):
+    return render_to_string(CARD_TEMPLATES[variant], {'article': article, 'lazy': lazy})
+
+
+def render_cards(articles, variant, eager=0):
+    """HTML карточек; первые eager — с обложкой без ленивой загрузки"""
+    articles = list(articles)
+    if not articles:
+        return ''
+    version = fragment_cache.get_version()
+    keys = [card_key(article, variant, i >= eager, version)
+            for i, article in enumerate(articles)]
+    cached = cache.get_many(keys)
+
+    # Фрагмент поиска с подсветкой зависит от запроса — такие не кэшируются
+    searched = {i for i, article in enumerate(articles) if getattr(article, 'search_snippet', '')}
+    misses = [i for i, key in enumerate(keys) if i in searched or key not in cached]
+    if misses and variant in CARDS_WITH_TAGS:
+        prefetch_related_objects([articles[i] for i in misses], 'tags')
+
+    parts = [cached.get(key) for key in keys]
+    rendered = {}
+    for i in misses:
+        parts[i] = render_card(articles[i], variant, lazy=i >= eager)
+        if i not in searched:
+            rendered[keys[i]] = parts[i]
+    timeout = store_timeout()
+    if rendered and timeout:
+        cache.set_many(rendered, timeout)
+
+    CACHE_REQUESTS.labels(fragment_cache.namespace, 'hit').inc(len(articles) - len(misses))
+    CACHE_REQUESTS.labels(fragment_cache.namespace, 'miss').inc(len(misses))
+    return mark_safe(''.join(parts))
@@ -0,0 +1,87 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from uch.apps.blog.benchmark import (
+    build_report, compare_reports, flush_dataset, generate_dataset, over_budget, run_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов страниц блога и админки; '
+            'при необходимости генерирует данные и сравнивает с прошлым отчётом')
+
+    def add_arguments(self, parser):
+        data = parser.add_argument_group('генерация данных')
+        data.add_argument('--generate', action='store_true',
+                          help='Создать (дополнить) детерминированные данные стенда')
+        data.add_argument('--flush', action='store_true',
+                          help='Удалить данные стенда перед генерацией')
+        data.add_argument('--articles', type=int, default=1000)
+        data.add_argument('--categories', type=int, default=20)
+        data.add_argument('--tags', type=int, default=100)
+        data.add_argument('--comments', type=int, default=5000)
+        data.add_argument('--seed', type=int, default=1)
+        data.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                          help='Процессы для рендера Markdown (0 — в текущем)')
+
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--warm', action='store_true',
+                            help='Не очищать кэш между запросами')
+        parser.add_argument('--output', help='Записать JSON-отчёт в файл')
+        parser.add_argument('--label', default='', help='Метка прогона в отчёте')
+        parser.add_argument('--compare', help='Сравнить с JSON-отчётом прошлого прогона')
+        parser.add_argument('--check-budgets', action='store_true',
+                            help='Ошибка, если страница превысила бюджет запросов')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            flush_dataset()
+        if options['generate']:
+            counts = generate_dataset(
+                articles=options['articles'], categories=options['categories'],
+                tags=options['tags'], comments=options['comments'], seed=options['seed'],
+                workers=options['workers'], log=self.stdout.write,
+            )
+            self.stdout.write(f'Данные: {counts}')
+
+        cold = not options['warm']
+        with override_settings(ALLOWED_HOSTS=['*']):
+            results = run_benchmark(options['repeat'], cold, log=self.log_result)
+        report = build_report(results, options['repeat'], cold, options['label'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f'Отчёт: {options["output"]}')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                self.print_comparison(compare_reports(json.load(stream), report))
+
+        exceeded = over_budget(results)
+        if exceeded and options['check_budgets']:
+            raise CommandError('Превышен бюджет запросов: ' + ', '.join(
+                f'{name} ({result["queries"]} > {result["budget"]})'
+                for name, result in exceeded.items()))
+
+    def log_result(self, name, result):
+        budget = result['budget']
+        line = (f'{name:<22} {result["p50_ms"]:8.1f} мс p50 {result["p95_ms"]:8.1f} мс p95  '
+                f'{result["queries"]:3} SQL{"" if budget is None else f" / {budget}"}  '
+                f'{result["bytes"]:>8} байт')
+        if result['status'] != 200:
+            line += f'  HTTP {result["status"]}'
+        if budget is not None and result['queries'] > budget:
+            line = self.style.ERROR(line)
+        self.stdout.write(line)
+
+    def print_comparison(self, rows):
+        self.stdout.write('\nСравнение (p50, мс):')
+        for name, before, after, change, queries_before, queries_after in rows:
+            line = (f'{name:<22} {before:8.1f} → {after:8.1f}  {change:+6.1f}%  '
+                    f'SQL {queries_before} → {queries_after}')
+            if queries_after > queries_before:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from uch.apps.blog.models import Article
+from uch.apps.blog.transfer import export_records, write_jsonl, write_markdown
+
+
+class Command(BaseCommand):
+    help = 'Выгружает статьи в JSONL или в каталог Markdown с front matter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл JSONL («-» — stdout) или каталог для Markdown')
+        parser.add_argument('--format', choices=('jsonl', 'markdown'), default='jsonl')
+        parser.add_argument('--status', choices=[key for key, _ in Article.STATUS_CHOICES],
+                            help='Только статьи с этим статусом')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Article.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        records = export_records(queryset, batch_size=options['batch_size'])
+
+        started = time.monotonic()
+        output = options['output']
+        if options['format'] == 'markdown':
+            count = write_markdown(records, output)
+        elif output == '-':
+            count = write_jsonl(records, sys.stdout)
+        else:
+            with open(output, 'w', encoding='utf-8') as stream:
+                count = write_jsonl(records, stream)
+
+        elapsed = time.monotonic() - started
+        # При выводе в stdout итог пишем в stderr, чтобы не испортить JSONL
+        log = self.stderr if output == '-' else self.stdout
+        log.write(self.style.SUCCESS(
+            f'Выгружено {count} статей за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} статей/с)'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from uch.apps.blog.media_metadata import extract_metadata, is_extracted
+from uch.apps.blog.models import MediaItem
+
+
+class Command(BaseCommand):
+    help = ('Заполняет metadata и столбцы width/height/duration медиафайлов '
+            '(читаются только заголовки файлов)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Перечитать и уже обработанные файлы')
+        parser.add_argument('--file-type', choices=[t for t, _ in MediaItem.MEDIA_TYPES])
+
+    def handle(self, *args, **options):
+        items = MediaItem.objects.exclude(file='').only('pk', 'file', 'metadata').order_by('pk')
+        if options['file_type']:
+            items = items.filter(file_type=options['file_type'])
+
+        started = time.monotonic()
+        done = 0
+        for item in items.iterator(chunk_size=500):
+            if options['force'] or not is_extracted(item):
+                done += extract_metadata(item.pk, force=options['force'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Метаданные обновлены для {done} файлов за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from uch.apps.blog.covers import generate_covers
+from uch.apps.blog.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Создаёт производные обложек статей для srcset (только недостающие)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        ids = [
+            article.pk for article in
+            Article.objects.exclude(cover_image='').exclude(cover_image=None)
+            .only('pk', 'cover_image', 'cover_derivatives').order_by('pk').iterator()
+            if article.cover_derivatives.get('source') != article.cover_image.name
+        ]
+
+        def process(article_id):
+            try:
+                return generate_covers(article_id, pool=pool)
+            finally:
+                close_old_connections()
+
+        started = time.monotonic()
+        # Потоки читают файлы и пишут в БД, декодирование — в пуле процессов
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+        with pool, ThreadPoolExecutor(max_workers=workers) as threads:
+            done = sum(threads.map(process, ids))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано обложек: {done} из {len(ids)} за {elapsed:.1f} с'
+        ))
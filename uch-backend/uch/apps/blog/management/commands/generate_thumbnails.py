@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from uch.apps.blog.models import MediaItem
+from uch.apps.blog.thumbnails import (
+    IMAGE_ERRORS, file_source, get_specs, missing_sizes, render_thumbnails,
+    store_error, store_thumbnails,
+)
+from uch.apps.blog.transfer import batched
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие превью изображений MediaItem в пуле процессов. '
+            'Прерванный запуск можно просто повторить')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать все превью, в том числе готовые')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        specs = get_specs()
+        items = (
+            MediaItem.objects.filter(file_type='image').exclude(file='')
+            .only('pk', 'file', 'metadata').order_by('pk')
+            .iterator(chunk_size=options['batch_size'])
+        )
+        pending = (
+            (item, todo) for item in items
+            for todo in [specs if options['force'] else missing_sizes(item, specs)]
+            if todo
+        )
+
+        started = time.monotonic()
+        done = failed = 0
+        pool = ProcessPoolExecutor(max_workers=options['workers'],
+                                   mp_context=multiprocessing.get_context('spawn'))
+        with pool:
+            for batch in batched(pending, options['batch_size']):
+                futures = [
+                    (item, todo, pool.submit(render_thumbnails, file_source(item.file), todo))
+                    for item, todo in batch
+                ]
+                # Каждая запись сохраняется сразу: после прерывания
+                # готовые файлы повторно не обрабатываются
+                for item, todo, future in futures:
+                    try:
+                        original_size, results = future.result()
+                    except IMAGE_ERRORS as e:
+                        self.stderr.write(f'  {item.file.name}: {e}')
+                        store_error(item, e)
+                        failed += 1
+                        continue
+                    done += store_thumbnails(item, todo, original_size, results)
+                self.stdout.write(f'  обработано: {done + failed}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Превью созданы для {done} файлов (ошибок: {failed}) за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from uch.apps.blog.related import rebuild_related
+from uch.apps.blog.transfer import ArticleImporter, batched, read_jsonl, read_markdown
+
+
+class Command(BaseCommand):
+    help = ('Загружает статьи из JSONL или каталога Markdown пачками '
+            '(существующие обновляются по slug, прерванный импорт продолжается)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Файл JSONL («-» — stdin) или каталог с *.md')
+        parser.add_argument('--author', help='Автор (username) для записей без автора')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессы для рендера Markdown (0 — в текущем)')
+        parser.add_argument('--progress',
+                            help='Файл прогресса (по умолчанию <source>.progress)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать сначала, не учитывая файл прогресса')
+        parser.add_argument('--skip-related', action='store_true',
+                            help='Не пересчитывать похожие статьи после импорта')
+
+    def progress_path(self, source, path):
+        if path:
+            return Path(path)
+        if source == '-':
+            return None
+        source = Path(source)
+        return source / '.import-progress' if source.is_dir() else Path(f'{source}.progress')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        progress = self.progress_path(source, options['progress'])
+        done = 0
+        if progress and progress.exists() and not options['restart']:
+            done = json.loads(progress.read_text())['done']
+            self.stdout.write(f'Продолжение с записи {done + 1}')
+
+        started = time.monotonic()
+        imported = 0
+        with ExitStack() as stack:
+            if source == '-':
+                records = read_jsonl(sys.stdin)
+            elif Path(source).is_dir():
+                records = read_markdown(source)
+            elif Path(source).exists():
+                records = read_jsonl(stack.enter_context(open(source, encoding='utf-8')))
+            else:
+                raise CommandError(f'Нет такого файла или каталога: {source}')
+
+            importer = stack.enter_context(ArticleImporter(
+                default_author=options['author'], workers=options['workers']))
+            try:
+                for batch in batched(islice(records, done, None), options['batch_size']):
+                    imported += importer.import_batch(batch)
+                    done += len(batch)
+                    if progress:
+                        progress.write_text(json.dumps({'done': done}))
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'  записей: {done} ({imported / elapsed:.0f} статей/с)')
+            except ValueError as exc:
+                # Пачка откатилась целиком — повторный запуск начнёт с неё
+                raise CommandError(f'Запись {done + 1}–{done + options["batch_size"]}: {exc}')
+
+        if progress:
+            progress.unlink(missing_ok=True)
+        if importer.article_ids and not options['skip_related']:
+            rebuild_related()
+
+        elapsed = time.monotonic() - started
+        stats = importer.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {imported} статей: создано {stats["created"]}, '
+            f'обновлено {stats["updated"]}, отрисовано {stats["rendered"]} '
+            f'за {elapsed:.1f} с ({imported / max(elapsed, 1e-6):.0f} статей/с)'
+        ))
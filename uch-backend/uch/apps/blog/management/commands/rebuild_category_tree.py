@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from uch.apps.blog.category_tree import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу замыкания категорий по полю parent'
+
+    def handle(self, *args, **options):
+        count = rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(f'Связей категорий: {count}'))
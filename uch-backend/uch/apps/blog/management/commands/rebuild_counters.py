@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from uch.apps.blog.counters import find_mismatches, find_tag_mismatches, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает (или проверяет) счётчики комментариев, статей и тегов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только проверить: ошибка, если счётчики разошлись с фактом',
+        )
+
+    def handle(self, *args, verify=False, **options):
+        if verify:
+            articles, categories = find_mismatches()
+            for article in articles:
+                self.stdout.write(
+                    f'Статья #{article.pk}: одобрено {article.approved_comment_count} '
+                    f'(факт {article.actual_approved}), на модерации '
+                    f'{article.pending_comment_count} (факт {article.actual_pending})'
+                )
+            for category in categories:
+                self.stdout.write(
+                    f'Категория #{category.pk}: {category.published_article_count} '
+                    f'(факт {category.actual_published})'
+                )
+            tags = find_tag_mismatches()
+            for tag_id, stored, actual in tags:
+                self.stdout.write(f'Тег #{tag_id}: {stored} (факт {actual})')
+            total = articles.count() + categories.count() + len(tags)
+            if total:
+                raise CommandError(f'Расхождений: {total}')
+            self.stdout.write(self.style.SUCCESS('Счётчики в порядке'))
+            return
+
+        fixed_articles, fixed_categories, fixed_tags = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено статей: {fixed_articles}, категорий: {fixed_categories}, '
+            f'тегов: {fixed_tags}'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from uch.apps.blog.related import rebuild_related, sparse
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие статьи для всех опубликованных статей'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_related()
+        elapsed = time.monotonic() - started
+        engine = 'SciPy' if sparse is not None else 'Python'
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие статьи пересчитаны: {count} статей за {elapsed:.1f} с ({engine})'
+        ))
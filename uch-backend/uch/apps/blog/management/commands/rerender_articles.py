@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from uch.apps.blog.cache import fragment_cache, page_cache
+from uch.apps.blog.models import Article
+from uch.apps.blog.rendering import content_hash, markdown_to_html
+from uch.apps.blog.transfer import batched
+
+
+class Command(BaseCommand):
+    help = ('Перерисовывает Markdown статей пакетами в пуле процессов '
+            '(после смены расширений или настроек рендера)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перерисовать все статьи, а не только устаревшие')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = (
+            Article.objects.order_by('pk')
+            .values_list('pk', 'content', 'content_hash', 'updated_at')
+            .iterator(chunk_size=batch_size)
+        )
+        stale = (
+            (pk, content, digest, updated_at)
+            for pk, content, old_digest, updated_at in rows
+            for digest in [content_hash(content)]
+            if options['all'] or digest != old_digest
+        )
+
+        started = time.monotonic()
+        rendered = skipped = 0
+        # spawn: дочерние процессы не наследуют открытые соединения с БД
+        pool = ProcessPoolExecutor(max_workers=options['workers'],
+                                   mp_context=multiprocessing.get_context('spawn'))
+        with pool:
+            for batch in batched(stale, batch_size):
+                htmls = pool.map(markdown_to_html, [row[1] for row in batch],
+                                 chunksize=max(1, len(batch) // (options['workers'] * 4)))
+                with transaction.atomic():
+                    for (pk, _, digest, updated_at), html in zip(batch, htmls):
+                        # Статью сохранили во время рендера — её отрисует фоновая задача
+                        updated = Article.objects.filter(pk=pk, updated_at=updated_at).update(
+                            content_html=html, content_hash=digest)
+                        rendered += updated
+                        skipped += 1 - updated
+                self.stdout.write(f'  обработано: {rendered + skipped}')
+
+        if rendered:
+            page_cache.bump()
+            fragment_cache.bump()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Перерисовано {rendered} статей (пропущено {skipped}) '
+            f'за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,386 @@
+# uch/apps/blog/media_metadata.py
+"""
+Извлечение метаданных медиафайлов.
+
+Экстракторы регистрируются по ``MediaItem.file_type`` декоратором
+``@extractor`` и получают открытый двоичный файл. Читаются только
+заголовки: контейнеры обходятся через seek (например, ``mdat`` в MP4
+пропускается целиком), поэтому стоимость не зависит от размера файла.
+Экстрактор возвращает словарь или None, если формат не его — тогда
+пробуется следующий экстрактор того же типа.
+
+Результат сливается в ``MediaItem.metadata`` вместе со служебной записью
+``metadata['extracted'] = {'source': ..., 'version': ...}``; ширина, высота
+и длительность дополнительно копируются в индексируемые столбцы модели.
+"""
+import json
+import logging
+import re
+import struct
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+EXTRACTOR_VERSION = 1
+# Ключи metadata, которые копируются в одноимённые столбцы MediaItem
+INDEXED_KEYS = ('width', 'height', 'duration')
+# Ключи, которые принадлежат другим обработчикам и не сбрасываются
+PRESERVED_KEYS = ('thumbnails',)
+# Наибольший JSON-чанк GLB, который читается в память
+GLB_JSON_LIMIT = 16 * 1024 * 1024
+
+EXTRACTORS = {}
+
+
+def extractor(file_type):
+    """Регистрирует функцию f(file) -> dict | None для типа файла"""
+    def register(func):
+        EXTRACTORS.setdefault(file_type, []).append(func)
+        return func
+    return register
+
+
+def extract(file_type, f):
+    for func in EXTRACTORS.get(file_type, []):
+        f.seek(0)
+        info = func(f)
+        if info is not None:
+            return info
+    return {}
+
+
+def _file_size(f):
+    position = f.tell()
+    size = f.seek(0, 2)
+    f.seek(position)
+    return size
+
+
+# --- Изображения -------------------------------------------------------------
+
+@extractor('image')
+def image_info(f):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # Image.open читает только заголовок, пиксели не декодируются
+        with Image.open(f) as image:
+            width, height = image.size
+            # Ориентация EXIF 5–8: снимок повёрнут на 90°
+            if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+            return {'width': width, 'height': height,
+                    'format': image.format, 'mode': image.mode}
+    except UnidentifiedImageError:
+        return None
+    except (Image.DecompressionBombError, SyntaxError) as e:
+        # Файл помечается ошибкой (см. extract_metadata), а не роняет задачу
+        raise ValueError(str(e)) from e
+
+
+# --- Аудио -------------------------------------------------------------------
+
+@extractor('audio')
+def wav_info(f):
+    header = f.read(12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+
+    info = {'format': 'WAV'}
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        kind, size = struct.unpack('<4sI', chunk)
+        if kind == b'fmt ':
+            fields = struct.unpack('<HHIIHH', f.read(16))
+            codec, channels, sample_rate, byte_rate, _, bits = fields
+            info.update(codec='pcm' if codec == 1 else f'wav-{codec}', channels=channels,
+                        sample_rate=sample_rate, bits_per_sample=bits)
+            f.seek(size - 16 + size % 2, 1)
+        elif kind == b'data':
+            if byte_rate:
+                info['duration'] = round(size / byte_rate, 3)
+            break
+        else:
+            f.seek(size + size % 2, 1)
+    return info
+
+
+@extractor('audio')
+def flac_info(f):
+    if f.read(4) != b'fLaC':
+        return None
+    block_header = f.read(4)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0:
+        return {'format': 'FLAC', 'codec': 'flac'}
+
+    # STREAMINFO: 20 бит частоты, 3 — каналов, 5 — разрядности, 36 — сэмплов
+    streaminfo = f.read(34)
+    packed = int.from_bytes(streaminfo[10:18], 'big')
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    info = {
+        'format': 'FLAC', 'codec': 'flac', 'sample_rate': sample_rate,
+        'channels': ((packed >> 41) & 0x7) + 1,
+        'bits_per_sample': ((packed >> 36) & 0x1F) + 1,
+    }
+    if sample_rate and total_samples:
+        info['duration'] = round(total_samples / sample_rate, 3)
+    return info
+
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+
+@extractor('audio')
+def mp3_info(f):
+    size = _file_size(f)
+    header = f.read(10)
+    offset = 0
+    if header[:3] == b'ID3':
+        # Размер ID3v2 — syncsafe-число (по 7 бит в байте)
+        tag_size = 0
+        for byte in header[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        offset = 10 + tag_size
+
+    f.seek(offset)
+    window = f.read(4096)
+    for position in range(len(window) - 4):
+        if window[position] == 0xFF and window[position + 1] & 0xE0 == 0xE0:
+            frame = int.from_bytes(window[position:position + 4], 'big')
+            version = {3: 1, 2: 2, 0: 2.5}.get((frame >> 19) & 0x3)
+            layer = (frame >> 17) & 0x3
+            bitrate_index = (frame >> 12) & 0xF
+            rate_index = (frame >> 10) & 0x3
+            # Только MPEG Layer III с корректными индексами
+            if version and layer == 1 and 0 < bitrate_index < 15 and rate_index < 3:
+                break
+    else:
+        return None
+
+    mono = (frame >> 6) & 0x3 == 3
+    bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    samples_per_frame = 1152 if version == 1 else 576
+    info = {'format': 'MP3', 'codec': 'mp3', 'sample_rate': sample_rate,
+            'channels': 1 if mono else 2, 'bitrate': bitrate}
+
+    # VBR-файлы несут число кадров в заголовке Xing/Info первого кадра
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = window[position + 4 + side_info:position + 16 + side_info]
+    if xing[:4] in (b'Xing', b'Info') and int.from_bytes(xing[4:8], 'big') & 0x1:
+        frames = int.from_bytes(xing[8:12], 'big')
+        info['duration'] = round(frames * samples_per_frame / sample_rate, 3)
+    else:
+        info['duration'] = round((size - offset - position) * 8 / bitrate, 3)
+    return info
+
+
+# --- Видео -------------------------------------------------------------------
+
+def _boxes(f, end):
+    """Боксы ISO BMFF между текущей позицией и end: (тип, начало данных, конец)"""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, kind = struct.unpack('>I4s', f.read(8))
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+        elif size == 0:
+            size = end - start
+        if size < 8:
+            return
+        yield kind, f.tell(), start + size
+        f.seek(start + size)
+
+
+def _mp4_track(f, end):
+    track = {}
+    for kind, start, box_end in _boxes(f, end):
+        if kind == b'tkhd':
+            # Ширина и высота — последние 8 байт, числа 16.16
+            f.seek(box_end - 8)
+            width, height = struct.unpack('>II', f.read(8))
+            track.update(width=width >> 16, height=height >> 16)
+        elif kind in (b'mdia', b'minf', b'stbl'):
+            track.update(_mp4_track(f, box_end))
+        elif kind == b'hdlr':
+            f.seek(start + 8)
+            track['handler'] = f.read(4)
+        elif kind == b'stsd':
+            f.seek(start + 12)
+            track['codec'] = f.read(4).decode('latin-1').strip()
+    return track
+
+
+@extractor('video')
+def mp4_info(f):
+    end = _file_size(f)
+    info = None
+    for kind, start, box_end in _boxes(f, end):
+        if kind == b'ftyp':
+            info = {'format': 'MP4', 'brand': f.read(4).decode('latin-1').strip()}
+        elif info is None:
+            return None
+        elif kind == b'moov':
+            for child, child_start, child_end in _boxes(f, box_end):
+                if child == b'mvhd':
+                    # Обрезанный бокс — struct.error, как и в остальных заголовках
+                    version, = struct.unpack('>B', f.read(1))
+                    f.seek(child_start + (20 if version else 12))
+                    timescale, duration = struct.unpack(
+                        '>IQ' if version else '>II', f.read(12 if version else 8))
+                    if timescale:
+                        info['duration'] = round(duration / timescale, 3)
+                elif child == b'trak':
+                    track = _mp4_track(f, child_end)
+                    if track.get('handler') == b'vide':
+                        info.update(width=track.get('width'), height=track.get('height'),
+                                    codec=track.get('codec'))
+                    elif track.get('handler') == b'soun':
+                        info['audio_codec'] = track.get('codec')
+            # Всё нужное — в moov; mdat не читаем
+            break
+    return info
+
+
+@extractor('video')
+def matroska_info(f):
+    if f.read(4) != b'\x1a\x45\xdf\xa3':
+        return None
+    # Заголовок EBML: ищем DocType (0x4282) — "webm" или "matroska"
+    header = f.read(64)
+    match = re.search(rb'\x42\x82[\x80-\xff](webm|matroska)', header)
+    return {'format': match.group(1).decode().upper() if match else 'MATROSKA'}
+
+
+# --- Документы ---------------------------------------------------------------
+
+@extractor('document')
+def pdf_info(f):
+    match = re.match(rb'%PDF-(\d\.\d)', f.read(16))
+    if not match:
+        return None
+    return {'format': 'PDF', 'pdf_version': match.group(1).decode()}
+
+
+@extractor('document')
+def office_info(f):
+    # zipfile читает только центральный каталог в конце архива
+    if not zipfile.is_zipfile(f):
+        return None
+    f.seek(0)
+    with zipfile.ZipFile(f) as archive:
+        names = set(archive.namelist())
+        if 'word/document.xml' in names:
+            info = {'format': 'DOCX'}
+        elif 'xl/workbook.xml' in names:
+            info = {'format': 'XLSX'}
+        elif 'ppt/presentation.xml' in names:
+            info = {'format': 'PPTX'}
+        else:
+            return None
+        if 'docProps/app.xml' in names:
+            app = archive.read('docProps/app.xml').decode('utf-8', 'replace')
+            for key in ('Pages', 'Words', 'Slides'):
+                value = re.search(rf'<{key}>(\d+)</{key}>', app)
+                if value:
+                    info[key.lower()] = int(value.group(1))
+    return info
+
+
+# --- 3D модели ---------------------------------------------------------------
+
+@extractor('3d')
+def glb_info(f):
+    header = f.read(20)
+    if len(header) < 20 or header[:4] != b'glTF':
+        return None
+    version, _, json_length, chunk_type = struct.unpack('<III4s', header[4:])
+    info = {'format': 'GLB', 'gltf_version': version}
+    if chunk_type == b'JSON':
+        # Длина из заголовка файла: не больше самого файла и GLB_JSON_LIMIT
+        if json_length > min(_file_size(f) - 20, GLB_JSON_LIMIT):
+            raise ValueError(f'Неверная длина JSON-чанка GLB: {json_length}')
+        # Только JSON-чанк, бинарный буфер за ним не читается
+        document = json.loads(f.read(json_length))
+        if not isinstance(document, dict):
+            raise ValueError('JSON-чанк GLB — не объект')
+        for key in ('meshes', 'nodes', 'materials', 'animations'):
+            items = document.get(key, [])
+            if not isinstance(items, list):
+                raise ValueError(f'GLB: {key} — не список')
+            info[key] = len(items)
+    return info
+
+
+@extractor('3d')
+def stl_info(f):
+    size = _file_size(f)
+    header = f.read(84)
+    if len(header) == 84:
+        triangles = struct.unpack('<I', header[80:84])[0]
+        if 84 + triangles * 50 == size:
+            return {'format': 'STL', 'triangles': triangles}
+    if header.startswith(b'solid'):
+        return {'format': 'STL', 'encoding': 'ascii'}
+    return None
+
+
+# --- Сохранение --------------------------------------------------------------
+
+def is_extracted(item):
+    record = item.metadata.get('extracted') or {}
+    return (record.get('source') == item.file.name
+            and record.get('version') == EXTRACTOR_VERSION)
+
+
+def extract_metadata(item_id, force=False):
+    """Заполняет metadata медиафайла (идемпотентно)"""
+    from django.db import transaction
+    from .cache import media_cache
+    from .models import MediaItem
+
+    item = MediaItem.objects.filter(pk=item_id).first()
+    if item is None or not item.file or (is_extracted(item) and not force):
+        return False
+
+    source = item.file.name
+    try:
+        with item.file.open('rb') as f:
+            info = extract(item.file_type, f)
+    except (OSError, ValueError, struct.error, zipfile.BadZipFile) as e:
+        logger.warning('Не удалось прочитать метаданные %s: %s', source, e)
+        info = {'error': str(e)}
+
+    with transaction.atomic():
+        current = MediaItem.objects.select_for_update().filter(
+            pk=item_id, file=source).first()
+        if current is None:
+            # Файл заменили во время чтения
+            return False
+        metadata = {key: value for key, value in current.metadata.items()
+                    if key in PRESERVED_KEYS}
+        metadata.update(info)
+        metadata['extracted'] = {'source': source, 'version': EXTRACTOR_VERSION}
+        columns = {key: info.get(key) for key in INDEXED_KEYS}
+        MediaItem.objects.filter(pk=item_id).update(metadata=metadata, **columns)
+        media_cache.bump()
+    return True
+
+
+def schedule_extraction(item):
+    from uch.apps.core.background import run_task_on_commit
+    from .tasks import extract_metadata_task
+
+    run_task_on_commit(extract_metadata_task, item.pk)
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uch.apps.blog.search
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 для SQLite, генерируемый tsvector с GIN-индексом для PostgreSQL"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_article_fts USING fts5("
+            "title, excerpt, content, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO blog_article_fts (rowid, title, excerpt, content) "
+            "SELECT id, title, excerpt, content FROM blog_article"
+        )
+    elif vendor == 'postgresql':
+        config = uch.apps.blog.search.POSTGRES_SEARCH_CONFIG
+        schema_editor.execute(
+            "ALTER TABLE blog_article ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('{config}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{config}', coalesce(excerpt, '')), 'B') || "
+            f"setweight(to_tsvector('{config}', coalesce(content, '')), 'C')"
+            ") STORED"
+        )
+        schema_editor.execute(
+            "CREATE INDEX blog_article_search_vector_gin "
+            "ON blog_article USING gin (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS blog_article_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS blog_article_search_vector_gin")
+        schema_editor.execute("ALTER TABLE blog_article DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSearchIndex',
+            fields=[
+                ('article', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='blog.article')),
+                ('title', models.TextField()),
+                ('excerpt', models.TextField()),
+                ('content', models.TextField()),
+                ('document', uch.apps.blog.search.SearchDocumentField(db_column='blog_article_fts')),
+            ],
+            options={
+                'db_table': 'blog_article_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:37
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(
+        Subquery(counts.annotate(total=Count('pk')).values('total')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Article = apps.get_model('blog', 'Article')
+    Category = apps.get_model('blog', 'Category')
+    Comment = apps.get_model('blog', 'Comment')
+
+    Article.objects.update(
+        approved_comment_count=count_subquery(Comment.objects.filter(is_approved=True), 'article'),
+        pending_comment_count=count_subquery(Comment.objects.filter(is_approved=False), 'article'),
+    )
+    Category.objects.update(
+        published_article_count=count_subquery(Article.objects.filter(status='published'), 'category'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_article_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Одобренных комментариев'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='pending_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев на модерации'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='published_article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных статей'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
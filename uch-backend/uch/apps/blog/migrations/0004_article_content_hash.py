@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш содержания'),
+        ),
+    ]
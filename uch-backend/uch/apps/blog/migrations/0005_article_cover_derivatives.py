@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_article_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='cover_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Размеры обложки'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='cover_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш обложки'),
+        ),
+    ]
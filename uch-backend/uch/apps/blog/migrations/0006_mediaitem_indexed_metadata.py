@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_article_cover_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Длительность, с'),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота'),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['file_type', 'width', 'height'], name='blog_mediai_file_ty_ab7f90_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['file_type', 'duration'], name='blog_mediai_file_ty_92ae7c_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0001_initial'),
+        ('blog', '0006_mediaitem_indexed_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='media_items', to='media.blob', verbose_name='Файл (CAS)'),
+        ),
+    ]
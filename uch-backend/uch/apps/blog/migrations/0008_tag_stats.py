@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:02
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_tag_stats(apps, schema_editor):
+    Article = apps.get_model('blog', 'Article')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStat = apps.get_model('blog', 'TagStat')
+
+    content_type = ContentType.objects.filter(app_label='blog', model='article').first()
+    if content_type is None:
+        return
+    counts = (
+        TaggedItem.objects.filter(
+            content_type=content_type,
+            object_id__in=Article.objects.filter(status='published').values('pk'),
+        )
+        .values('tag_id').annotate(total=Count('pk')).values_list('tag_id', 'total')
+    )
+    TagStat.objects.bulk_create(
+        [TagStat(tag_id=tag_id, published_count=total) for tag_id, total in counts],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('blog', '0007_mediaitem_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='taggit.tag', verbose_name='Тег')),
+                ('published_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Опубликованных статей')),
+            ],
+            options={
+                'verbose_name': 'Статистика тега',
+                'verbose_name_plural': 'Статистика тегов',
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
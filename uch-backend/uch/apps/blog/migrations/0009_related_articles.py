@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_tag_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blog.article', verbose_name='Статья')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='blog.article', verbose_name='Похожая статья')),
+            ],
+            options={
+                'verbose_name': 'Похожая статья',
+                'verbose_name_plural': 'Похожие статьи',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedarticle',
+            constraint=models.UniqueConstraint(fields=('article', 'rank'), name='blog_related_article_rank'),
+        ),
+    ]
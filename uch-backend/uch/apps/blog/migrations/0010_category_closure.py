@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_closure(apps, schema_editor):
+    Category = apps.get_model('blog', 'Category')
+    CategoryClosure = apps.get_model('blog', 'CategoryClosure')
+
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        while ancestor_id is not None:
+            links.append(CategoryClosure(
+                ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_related_articles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='Глубина')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='blog.category', verbose_name='Предок')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='blog.category', verbose_name='Потомок')),
+            ],
+            options={
+                'verbose_name': 'Связь категорий',
+                'verbose_name_plural': 'Связи категорий',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='blog_catego_descend_577f6c_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='blog_category_closure_pair'),
+        ),
+        migrations.RunPython(fill_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_category_closure'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='article',
+            options={'ordering': ['-published_at', '-id'], 'verbose_name': 'Статья', 'verbose_name_plural': 'Статьи'},
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='blog_articl_status_8b18ca_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='blog_articl_slug_cc8df7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='article',
+            name='blog_articl_categor_5bebf3_idx',
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-published_at', '-id'], name='blog_article_published'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('status', 'published'), ('is_featured', True)), fields=['-published_at', '-id'], name='blog_article_featured'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['category', '-published_at', '-id'], name='blog_article_category_pub'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-created_at'], name='blog_article_latest'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['updated_at'], name='blog_article_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['article', 'created_at', 'id'], name='blog_comment_thread'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['article', 'updated_at'], name='blog_comment_updated'),
+        ),
+    ]
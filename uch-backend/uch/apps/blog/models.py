@@ -1,10 +1,39 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.urls import reverse
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 
+from .search import SearchDocumentField, get_search_backend
 
-class Category(models.Model):
+
+class CounterStateMixin:
+    """Запоминает поля, от которых зависят денормализованные счётчики"""
+    counter_fields = ()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if set(cls.counter_fields) <= set(field_names):
+            instance._counted_state = instance.counter_state()
+        return instance
+    
+    def counter_state(self):
+        return tuple(getattr(self, field) for field in self.counter_fields)
+    
+    def previous_counter_state(self):
+        """Состояние строки в БД до текущего сохранения (None — новая)"""
+        if self._state.adding:
+            return None
+        if hasattr(self, '_counted_state'):
+            return self._counted_state
+        # Поля были отложены (only/defer) — читаем из БД
+        return type(self)._base_manager.filter(pk=self.pk).values_list(
+            *self.counter_fields).first()
+
+
+class Category(CounterStateMixin, models.Model):
     """Категории статей (иерархические)"""
     name = models.CharField(max_length=100, verbose_name="Название")
     slug = models.SlugField(max_length=100, unique=True, verbose_name="URL")
@@ -15,6 +44,13 @@ class Category(models.Model):
     order = models.IntegerField(default=0, verbose_name="Порядок")
     is_active = models.BooleanField(default=True, verbose_name="Активна")
     
+    # Денормализованный счётчик (см. counters.py)
+    published_article_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Опубликованных статей")
+    
+    # Положение в дереве хранит таблица замыкания (см. category_tree.py)
+    counter_fields = ('parent_id',)
+    
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
@@ -25,9 +61,85 @@ class Category(models.Model):
     
     def get_absolute_url(self):
         return reverse('blog:category_detail', args=[self.slug])
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .category_tree import is_descendant
+        
+        if self.pk and self.parent_id and is_descendant(self.parent_id, self.pk):
+            raise ValidationError(
+                {'parent': 'Категорию нельзя вложить в неё саму или в её подкатегорию'})
+    
+    def save(self, *args, **kwargs):
+        from .category_tree import insert_node, move_node
+        
+        previous_state = self.previous_counter_state()
+        with transaction.atomic():
+            if previous_state is not None and previous_state[0] != self.parent_id:
+                move_node(self.pk, self.parent_id)
+            super().save(*args, **kwargs)
+            if previous_state is None:
+                insert_node(self.pk, self.parent_id)
+            self._counted_state = self.counter_state()
 
 
-class Article(models.Model):
+class CategoryClosure(models.Model):
+    """Таблица замыкания: пара (предок, потомок) на каждую вложенность"""
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE,
+                                 related_name='descendant_links', verbose_name="Предок")
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE,
+                                   related_name='ancestor_links', verbose_name="Потомок")
+    depth = models.PositiveSmallIntegerField(verbose_name="Глубина")
+    
+    class Meta:
+        verbose_name = "Связь категорий"
+        verbose_name_plural = "Связи категорий"
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'],
+                                    name='blog_category_closure_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+
+PUBLISHED = Q(status='published')
+
+
+class ArticleQuerySet(models.QuerySet):
+    """Выборки статей под страницы: без лишних столбцов и с нужными связями.
+
+    Текст (Markdown и HTML) — самые тяжёлые столбцы строки, а в списках
+    нужны только заголовок, описание, обложка, автор и даты.
+    """
+    # Карточка в списке статей и на главной
+    CARD_FIELDS = (
+        'title', 'slug', 'excerpt', 'cover_image', 'cover_derivatives', 'is_featured',
+        'published_at', 'created_at', 'updated_at', 'approved_comment_count',
+        'author__username', 'category__name', 'category__slug',
+    )
+    # Ссылка в боковых списках (свежие, похожие, соседние)
+    LINK_FIELDS = (
+        'title', 'slug', 'published_at', 'created_at', 'category__name', 'category__slug',
+    )
+    # Страница статьи показывает HTML, исходный Markdown ей не нужен
+    DETAIL_DEFERRED = ('content', 'content_hash', 'cover_hash')
+
+    def published(self):
+        return self.filter(PUBLISHED)
+
+    def for_cards(self):
+        # Теги карточек подгружаются только для промахов кэша (fragments.py)
+        return self.select_related('author', 'category').only(*self.CARD_FIELDS)
+
+    def for_links(self):
+        return self.select_related('category').only(*self.LINK_FIELDS)
+
+    def for_detail(self):
+        return self.select_related('author', 'category').defer(*self.DETAIL_DEFERRED)
+
+
+class Article(CounterStateMixin, models.Model):
     """Статьи/записи блога"""
     STATUS_CHOICES = [
         ('draft', 'Черновик'),
@@ -40,10 +152,18 @@ class Article(models.Model):
     excerpt = models.TextField(max_length=500, blank=True, verbose_name="Краткое описание")
     content = models.TextField(verbose_name="Содержание (Markdown)")
     content_html = models.TextField(blank=True, editable=False, verbose_name="Содержание (HTML)")
+    # Хэш содержимого, из которого получен content_html (см. rendering.py)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False,
+                                    verbose_name="Хэш содержания")
     
     cover_image = models.ImageField(upload_to='articles/covers/', 
                                    blank=True, null=True,
                                    verbose_name="Обложка")
+    # Производные обложки для srcset (см. covers.py)
+    cover_hash = models.CharField(max_length=64, blank=True, editable=False,
+                                  verbose_name="Хэш обложки")
+    cover_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         verbose_name="Размеры обложки")
     
     author = models.ForeignKey(User, on_delete=models.CASCADE, 
                               verbose_name="Автор")
@@ -61,40 +181,164 @@ class Article(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
     published_at = models.DateTimeField(null=True, blank=True, verbose_name="Опубликовано")
     
+    # Денормализованные счётчики комментариев (см. counters.py)
+    approved_comment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Одобренных комментариев")
+    pending_comment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Комментариев на модерации")
+    
     # Теги через django-taggit
     tags = TaggableManager(blank=True, verbose_name="Теги")
     
+    objects = ArticleQuerySet.as_manager()
+    
+    counter_fields = ('status', 'category_id')
+    # Поля полнотекстового индекса (search.py)
+    search_fields = ('title', 'excerpt', 'content')
+    
     class Meta:
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
-        ordering = ['-published_at', '-created_at']
+        # Тот же порядок, что у курсоров (pagination.py), — один индекс на оба
+        ordering = ['-published_at', '-id']
+        # Частичные индексы только по опубликованным: по ним идут все
+        # публичные выборки, черновики в индексы не попадают. Индексы slug и
+        # category уже создаются уникальностью и внешним ключом
         indexes = [
-            models.Index(fields=['status', 'published_at']),
-            models.Index(fields=['slug']),
-            models.Index(fields=['category']),
+            # Списки, курсоры, соседние статьи
+            models.Index(fields=['-published_at', '-id'], condition=PUBLISHED,
+                         name='blog_article_published'),
+            # Рекомендуемые на главной
+            models.Index(fields=['-published_at', '-id'], condition=PUBLISHED & Q(is_featured=True),
+                         name='blog_article_featured'),
+            # Статьи категории
+            models.Index(fields=['category', '-published_at', '-id'], condition=PUBLISHED,
+                         name='blog_article_category_pub'),
+            # Последние в боковой панели
+            models.Index(fields=['-created_at'], condition=PUBLISHED,
+                         name='blog_article_latest'),
+            # Last-Modified страниц: MAX(updated_at) только по индексу
+            models.Index(fields=['updated_at'], condition=PUBLISHED,
+                         name='blog_article_updated'),
         ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if set(cls.search_fields) <= set(field_names):
+            instance._indexed_state = instance.search_state()
+        return instance
+    
+    def search_state(self):
+        return tuple(getattr(self, field) for field in self.search_fields)
+    
     def get_absolute_url(self):
         return reverse('blog:article_detail', args=[self.slug])
     
+    @property
+    def comment_count(self):
+        return self.approved_comment_count + self.pending_comment_count
+    
     def save(self, *args, **kwargs):
+        from .counters import article_changed
+        from .covers import is_current, schedule_covers
+        from .related import schedule_related
+        from .rendering import content_hash, schedule_render
+        
         # При публикации устанавливаем дату публикации
         if self.status == 'published' and not self.published_at:
             from django.utils import timezone
             self.published_at = timezone.now()
         
-        # Конвертируем Markdown в HTML при сохранении
-        if self.content:
-            import markdown
-            self.content_html = markdown.markdown(
-                self.content,
-                extensions=['extra', 'codehilite', 'tables']
-            )
+        # Markdown рендерится в фоне и только если содержание изменилось
+        needs_render = content_hash(self.content) != self.content_hash
         
-        super().save(*args, **kwargs)
+        # Производные обложки — тоже в фоне, при замене файла
+        # Производные прежнего файла сбрасываются сразу: до генерации новых
+        # страница показывает оригинал, а не чужой srcset
+        needs_covers = False
+        if not self.cover_image or not is_current(self):
+            self.cover_hash, self.cover_derivatives = '', {}
+            needs_covers = bool(self.cover_image)
+        
+        # Полнотекстовый индекс — только если изменились его поля
+        update_fields = kwargs.get('update_fields')
+        needs_index = (
+            (update_fields is None or not set(update_fields).isdisjoint(self.search_fields))
+            and getattr(self, '_indexed_state', None) != self.search_state()
+        )
+        
+        previous_state = self.previous_counter_state()
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if needs_index:
+                get_search_backend(self._state.db).index_article(self)
+                self._indexed_state = self.search_state()
+            state = self.counter_state()
+            article_changed(previous_state, state, self.pk)
+            self._counted_state = state
+            if needs_render:
+                schedule_render(self)
+            if needs_covers:
+                schedule_covers(self)
+            # Похожие зависят от публикации и категории (теги — см. signals)
+            if previous_state != state and 'published' in (
+                    previous_state and previous_state[0], state[0]):
+                schedule_related(self.pk)
+
+
+class TagStat(models.Model):
+    """Число опубликованных статей с тегом (см. counters.py)"""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True,
+                               related_name='stat', verbose_name="Тег")
+    published_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Опубликованных статей")
+    
+    class Meta:
+        verbose_name = "Статистика тега"
+        verbose_name_plural = "Статистика тегов"
+    
+    def __str__(self):
+        return f'{self.tag_id}: {self.published_count}'
+
+
+class RelatedArticle(models.Model):
+    """Похожая статья (предрасчёт, см. related.py)"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE,
+                                related_name='related_links', verbose_name="Статья")
+    related = models.ForeignKey(Article, on_delete=models.CASCADE,
+                                related_name='related_to', verbose_name="Похожая статья")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Сходство")
+    
+    class Meta:
+        verbose_name = "Похожая статья"
+        verbose_name_plural = "Похожие статьи"
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'rank'], name='blog_related_article_rank'),
+        ]
+    
+    def __str__(self):
+        return f'{self.article_id} -> {self.related_id} ({self.score:.2f})'
+
+
+class ArticleSearchIndex(models.Model):
+    """Строка полнотекстового индекса FTS5 (таблица создаётся миграцией)"""
+    article = models.OneToOneField(Article, on_delete=models.DO_NOTHING,
+                                   primary_key=True, db_column='rowid',
+                                   db_constraint=False,
+                                   related_name='search_index')
+    title = models.TextField()
+    excerpt = models.TextField()
+    content = models.TextField()
+    document = SearchDocumentField(db_column='blog_article_fts')
+    
+    class Meta:
+        managed = False
+        db_table = 'blog_article_fts'
 
 
 class MediaItem(models.Model):
@@ -120,13 +364,31 @@ class MediaItem(models.Model):
                                    verbose_name="Загрузил")
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Загружено")
     
+    # Общий файл в хранилище с адресацией по содержимому (загрузки частями)
+    blob = models.ForeignKey('media.Blob', on_delete=models.PROTECT,
+                             null=True, blank=True, editable=False,
+                             related_name='media_items', verbose_name="Файл (CAS)")
+    
     # Метаданные для разных типов
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Метаданные")
     
+    # Копии частых ключей metadata для фильтров без разбора JSON
+    # (см. media_metadata.py)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False,
+                                        verbose_name="Ширина")
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False,
+                                         verbose_name="Высота")
+    duration = models.FloatField(null=True, blank=True, editable=False,
+                                 verbose_name="Длительность, с")
+    
     class Meta:
         verbose_name = "Медиафайл"
         verbose_name_plural = "Медиафайлы"
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['file_type', 'width', 'height']),
+            models.Index(fields=['file_type', 'duration']),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.file_type})"
@@ -134,8 +396,36 @@ class MediaItem(models.Model):
     def get_absolute_url(self):
         return self.file.url
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Метаданные и превью создаются в фоне; повторное сохранение без
+        # замены файла ничего не запускает
+        if not self.file:
+            return
+        from .media_metadata import is_extracted, schedule_extraction
+        if not is_extracted(self):
+            schedule_extraction(self)
+        if self.file_type == 'image':
+            from .thumbnails import missing_sizes, schedule_thumbnails
+            if missing_sizes(self):
+                schedule_thumbnails(self)
+    
+    def thumbnail_url(self, size):
+        """URL превью нужного размера (None, пока не создано)"""
+        info = (self.metadata.get('thumbnails') or {}).get('sizes', {}).get(size)
+        if info is None:
+            return None
+        return self.file.storage.url(info['name'])
+    
 
-class Comment(models.Model):
+class CommentQuerySet(models.QuerySet):
+    def set_approved(self, approved=True):
+        """Массовое (не)одобрение с обновлением счётчиков статей"""
+        from .counters import set_comments_approved
+        return set_comments_approved(self, approved)
+
+
+class Comment(CounterStateMixin, models.Model):
     """Комментарии к статьям"""
     article = models.ForeignKey(Article, on_delete=models.CASCADE,
                                related_name='comments', verbose_name="Статья")
@@ -152,10 +442,34 @@ class Comment(models.Model):
                               null=True, blank=True,
                               related_name='replies', verbose_name="Родительский комментарий")
     
+    objects = CommentQuerySet.as_manager()
+    
+    counter_fields = ('article_id', 'is_approved')
+    
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ['-created_at']
+        # Булево условие в SQL — просто столбец, а не «= значение», и
+        # ключом составного индекса не работает, поэтому индексы частичные
+        indexes = [
+            # Ветки одобренных комментариев статьи (comments.py)
+            models.Index(fields=['article', 'created_at', 'id'], condition=Q(is_approved=True),
+                         name='blog_comment_thread'),
+            # Last-Modified страницы статьи (page_cache.py)
+            models.Index(fields=['article', 'updated_at'], condition=Q(is_approved=True),
+                         name='blog_comment_updated'),
+        ]
     
     def __str__(self):
-        return f"Комментарий от {self.author} к {self.article}"
\ No newline at end of file
+        return f"Комментарий от {self.author} к {self.article}"
+    
+    def save(self, *args, **kwargs):
+        from .counters import comment_changed
+        
+        previous_state = self.previous_counter_state()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            state = self.counter_state()
+            comment_changed(previous_state, state)
+            self._counted_state = state
\ No newline at end of file
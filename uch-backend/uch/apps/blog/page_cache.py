@@ -0,0 +1,164 @@
+# uch/apps/blog/page_cache.py
+"""
+Условные GET-запросы и кэш целых страниц для анонимных посетителей.
+
+Last-Modified — последний ``updated_at`` статей, из которых собрана
+страница (статья и её комментарии, категория, весь блог). Удаления и
+модерация по ``updated_at`` не видны, поэтому ETag включает ещё и версию
+``page_cache``, которую сигналы увеличивают при любом изменении статей,
+категорий, тегов и комментариев. Браузеры присылают If-None-Match, и он
+проверяется раньше If-Modified-Since.
+
+Промах кэша читает из основной БД, а не с реплики (см. core/routers.py):
+версия увеличивается по коммиту в основной, и отстающая реплика иначе
+сохранила бы старую страницу под новой версией и ETag.
+
+Авторизованным пользователям страницы отдаются как раньше: в них есть
+персональные данные (неодобренные комментарии для персонала, CSRF-токен).
+"""
+import asyncio
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from uch.apps.core.routers import replica_reads, use_primary
+
+from .cache import page_cache
+from .models import Article, Comment
+
+# Параметры, от которых зависит содержимое страницы; остальные
+# (utm-метки и т.п.) на ключ кэша не влияют
+PAGE_PARAMS = ('page', 'cursor', 'tag', 'q', 'comments_page')
+
+
+def page_key(request):
+    params = [(name, value) for name in PAGE_PARAMS
+              for value in request.GET.getlist(name)]
+    raw = f'{request.path}?{urlencode(params)}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def make_etag(version, last_modified):
+    stamp = int(last_modified.timestamp()) if last_modified else 0
+    return f'"p{version}-{stamp}"'
+
+
+def blog_last_modified(request, *args, **kwargs):
+    return Article.objects.published().aggregate(
+        last=Max('updated_at'))['last']
+
+
+def category_last_modified(request, category_slug=None, **kwargs):
+    articles = Article.objects.published()
+    if category_slug:
+        # Вместе с подкатегориями, как и сам список
+        articles = articles.filter(category__ancestor_links__ancestor__slug=category_slug)
+    return articles.aggregate(last=Max('updated_at'))['last']
+
+
+def article_last_modified(request, slug, **kwargs):
+    article = Article.objects.published().filter(slug=slug).values(
+        'pk', 'updated_at').first()
+    if article is None:
+        return None
+    last_comment = Comment.objects.filter(
+        article_id=article['pk'], is_approved=True,
+    ).aggregate(last=Max('updated_at'))['last']
+    return max(filter(None, [article['updated_at'], last_comment]))
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Хранить можно, но перед показом — перепроверить
+    patch_cache_control(response, public=True, no_cache=True)
+
+
+def _begin(request, last_modified_func, args, kwargs):
+    """Всё, что делается до представления: (готовый ответ, состояние).
+
+    Состояние передаётся в _finish; None — ответ не кэшировать.
+    """
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return None, None
+
+    version = page_cache.get_version()
+    key = page_key(request)
+    entry = page_cache.get(key, version)
+    if entry is not None:
+        content, content_type, etag, last_modified = entry
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()))
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        _set_validators(response, etag, last_modified)
+        return response, None
+
+    use_primary()
+    last_modified = last_modified_func(request, *args, **kwargs)
+    if last_modified is None:
+        return None, None
+
+    etag = make_etag(version, last_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is not None:
+        _set_validators(response, etag, last_modified)
+        return response, None
+    return None, (key, version, etag, last_modified)
+
+
+def _finish(response, state):
+    if state is None:
+        return response
+    key, version, etag, last_modified = state
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    if response.status_code == 200 and not response.streaming:
+        _set_validators(response, etag, last_modified)
+        if replica_reads():
+            return response
+        page_cache.set(key, version, (
+            response.content, response['Content-Type'], etag, last_modified,
+        ))
+    return response
+
+
+def public_page(last_modified_func):
+    """Декоратор публичной страницы: 304 по ETag/Last-Modified и кэш для анонимов.
+
+    ``last_modified_func(request, *args, **kwargs)`` вызывается только при
+    промахе кэша; None (например, статьи нет) — страница не кэшируется.
+    Подходит и для async-представлений: проверки кэша (сессия, кэш,
+    Last-Modified) выполняются одним переходом в поток.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, state = await sync_to_async(_begin)(
+                    request, last_modified_func, args, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if state is None:
+                    return response
+                return await sync_to_async(_finish)(response, state)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, state = _begin(request, last_modified_func, args, kwargs)
+            if response is not None:
+                return response
+            return _finish(view(request, *args, **kwargs), state)
+        return wrapper
+    return decorator
@@ -0,0 +1,114 @@
+# uch/apps/blog/pagination.py
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """Страница keyset-пагинации: без общего количества, только «есть ли ещё»"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (published_at, id) в порядке убывания.
+
+    Вместо OFFSET и COUNT(*) каждая страница — это выборка «после/до»
+    граничной статьи, поэтому глубокие страницы стоят столько же, сколько
+    первая. Курсор — непрозрачный токен с позицией граничной статьи и
+    направлением, он не зависит от номера страницы и не «съезжает» при
+    публикации новых статей.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.filter(published_at__isnull=False)
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(article, direction):
+        payload = [article.published_at.isoformat(), article.pk, direction]
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            published_at, pk, direction = json.loads(raw)
+            published_at = parse_datetime(published_at)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Некорректный курсор')
+        if published_at is None or direction not in ('n', 'p'):
+            raise InvalidCursor('Некорректный курсор')
+        return published_at, pk, direction
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        direction = 'n'
+
+        if cursor:
+            published_at, pk, direction = self.decode_cursor(cursor)
+            if direction == 'n':
+                queryset = queryset.filter(
+                    Q(published_at__lt=published_at) |
+                    Q(published_at=published_at, pk__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(published_at__gt=published_at) |
+                    Q(published_at=published_at, pk__gt=pk)
+                )
+
+        if direction == 'n':
+            queryset = queryset.order_by('-published_at', '-pk')
+        else:
+            queryset = queryset.order_by('published_at', 'pk')
+
+        # Лишняя строка показывает, есть ли что-то дальше — без COUNT(*)
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == 'p':
+            items.reverse()
+
+        if not items:
+            return CursorPage([], self)
+
+        if direction == 'n':
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = True, has_more
+
+        return CursorPage(
+            items,
+            self,
+            next_cursor=self.encode_cursor(items[-1], 'n') if has_next else None,
+            previous_cursor=self.encode_cursor(items[0], 'p') if has_previous else None,
+        )
@@ -0,0 +1,234 @@
+# uch/apps/blog/related.py
+"""
+Похожие статьи.
+
+Каждая опубликованная статья — строка разреженной матрицы признаков:
+теги с весом 1 и категория с весом ``BLOG_RELATED_CATEGORY_WEIGHT``.
+Строки нормируются, сходство — косинус (скалярное произведение).
+Топ-K для пачки статей считается одним умножением разреженных матриц
+SciPy; без NumPy/SciPy — тем же алгоритмом по инвертированному индексу
+на чистом Python (результат совпадает).
+
+Результат хранится в RelatedArticle и на странице статьи читается
+одним запросом по индексу (article, rank). При изменении тегов,
+категории или статуса статьи пересчитываются она сама, статьи, которые
+ссылались на неё, и статьи с общими тегами; признаки загружаются только
+для них и их соседей. Статьи, у которых с изменённой общая лишь
+категория, не пересчитываются (иначе каждое сохранение пересчитывало бы
+всю категорию) — их догоняет полный пересчёт ``rebuild_related``.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - NumPy/SciPy необязательны
+    np = sparse = None
+
+BATCH_SIZE = 512
+
+
+def get_limit():
+    return getattr(settings, 'BLOG_RELATED_ARTICLES', 5)
+
+
+def category_weight():
+    return getattr(settings, 'BLOG_RELATED_CATEGORY_WEIGHT', 0.5)
+
+
+def load_features(articles=None):
+    """{article_id: {признак: вес}} опубликованных статей (2 запроса).
+
+    articles — id или подзапрос id статей; None — все статьи.
+    """
+    from .counters import article_tags
+    from .models import Article
+
+    weight = category_weight()
+    published = Article.objects.published()
+    if articles is not None:
+        published = published.filter(pk__in=articles)
+    features = {}
+    for pk, category_id in published.values_list('pk', 'category_id'):
+        features[pk] = {('c', category_id): weight} if category_id and weight else {}
+    for object_id, tag_id in article_tags().filter(
+            object_id__in=published.values('pk')).values_list('object_id', 'tag_id'):
+        if object_id in features:
+            features[object_id][('t', tag_id)] = 1.0
+    return features
+
+
+def _normalized(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {f: w / norm for f, w in vector.items()} if norm else {}
+
+
+def _top(candidates, limit):
+    """Лучшие (id, score): по убыванию сходства, при равенстве — новее (больший id)"""
+    return sorted(candidates, key=lambda item: (-round(item[1], 12), -item[0]))[:limit]
+
+
+def similar_python(features, targets, limit):
+    vectors = {pk: _normalized(vector) for pk, vector in features.items()}
+    postings = defaultdict(list)
+    for pk, vector in vectors.items():
+        for feature, weight in vector.items():
+            postings[feature].append((pk, weight))
+
+    result = {}
+    for target in targets:
+        scores = defaultdict(float)
+        for feature, weight in vectors.get(target, {}).items():
+            for other, other_weight in postings[feature]:
+                if other != target:
+                    scores[other] += weight * other_weight
+        result[target] = _top(scores.items(), limit)
+    return result
+
+
+def similar_scipy(features, targets, limit):
+    ids = np.fromiter(features, dtype=np.int64, count=len(features))
+    row_of = {pk: i for i, pk in enumerate(features)}
+    columns = {}
+    rows, cols, data = [], [], []
+    for pk, vector in features.items():
+        for feature, weight in vector.items():
+            rows.append(row_of[pk])
+            cols.append(columns.setdefault(feature, len(columns)))
+            data.append(weight)
+
+    matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(ids), len(columns)),
+                               dtype=np.float64)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = (sparse.diags(1 / norms) @ matrix).tocsr()
+    transposed = matrix.T.tocsr()
+
+    result = {}
+    targets = [pk for pk in targets if pk in row_of]
+    for start in range(0, len(targets), BATCH_SIZE):
+        batch = targets[start:start + BATCH_SIZE]
+        scores = (matrix[[row_of[pk] for pk in batch]] @ transposed).tocsr()
+        for i, target in enumerate(batch):
+            begin, end = scores.indptr[i], scores.indptr[i + 1]
+            others = ids[scores.indices[begin:end]]
+            values = scores.data[begin:end]
+            keep = (others != target) & (values > 0)
+            others, values = others[keep], values[keep]
+            # Порядок: сходство по убыванию, затем больший id
+            order = np.lexsort((-others, -np.round(values, 12)))[:limit]
+            result[target] = [(int(others[j]), float(values[j])) for j in order]
+    return result
+
+
+def compute_related(targets=None, features=None, limit=None):
+    """{article_id: [(похожая_id, сходство)]} для targets (по умолчанию — всех)"""
+    features = load_features() if features is None else features
+    targets = list(features) if targets is None else list(targets)
+    limit = limit or get_limit()
+    if not features or not targets:
+        return {}
+    similar = similar_scipy if sparse is not None else similar_python
+    return similar(features, targets, limit)
+
+
+def store_related(results, article_ids=None):
+    """Заменяет списки похожих у article_ids (None — у всех статей).
+
+    Статьи из article_ids без результата (не опубликованы) остаются без списка.
+    Строки статей блокируются до удаления списков: параллельный пересчёт
+    тех же статей ждёт, а не натыкается на уникальность (article, rank).
+    """
+    from .cache import page_cache
+    from .models import Article, RelatedArticle
+
+    if article_ids is None:
+        article_ids = list(results)
+        stale = RelatedArticle.objects.all()
+    else:
+        stale = RelatedArticle.objects.filter(article_id__in=article_ids)
+    with transaction.atomic():
+        # Порядок по pk — одинаковый порядок блокировок у всех пересчётов
+        list(Article.objects.select_for_update().filter(pk__in=article_ids)
+             .order_by('pk').values_list('pk', flat=True))
+        stale.delete()
+        RelatedArticle.objects.bulk_create([
+            RelatedArticle(article_id=pk, related_id=other, rank=rank, score=score)
+            for pk in article_ids
+            for rank, (other, score) in enumerate(results.get(pk, []))
+        ], batch_size=1000)
+        page_cache.bump()
+
+
+def affected_articles(article_ids):
+    """Статьи, чьи списки похожих могут измениться вместе с article_ids"""
+    from .counters import article_tags
+    from .models import Article, RelatedArticle
+
+    affected = set(article_ids)
+    # Ссылались на статьи раньше (они могли потерять теги или публикацию)
+    affected.update(RelatedArticle.objects.filter(related_id__in=article_ids)
+                    .values_list('article_id', flat=True))
+    # Делят с ними теги сейчас; общая только категория — не в счёт
+    tags = article_tags().filter(object_id__in=article_ids).values('tag_id')
+    affected.update(article_tags().filter(
+        tag_id__in=tags, object_id__in=Article.objects.published().values('pk'),
+    ).values_list('object_id', flat=True))
+    return affected
+
+
+def candidates(article_ids):
+    """Подзапрос id: article_ids и опубликованные статьи с общим тегом или категорией"""
+    from django.db.models import Q
+
+    from .counters import article_tags
+    from .models import Article
+
+    published = Article.objects.published()
+    tagged = article_tags().filter(
+        tag_id__in=article_tags().filter(object_id__in=article_ids).values('tag_id'),
+    ).values('object_id')
+    condition = Q(pk__in=article_ids) | Q(pk__in=tagged)
+    if category_weight():
+        condition |= Q(category_id__in=published.filter(
+            pk__in=article_ids, category__isnull=False).values('category_id'))
+    return published.filter(condition).values('pk')
+
+
+def refresh_related(article_ids):
+    """Инкрементальный пересчёт после изменения статей"""
+    affected = affected_articles(article_ids)
+    # Признаки — только у пересчитываемых статей и их возможных похожих
+    features = load_features(candidates(affected))
+    store_related(compute_related(affected, features), affected)
+    return len(affected)
+
+
+def rebuild_related():
+    """Полный пересчёт; возвращает число статей"""
+    results = compute_related()
+    store_related(results)
+    return len(results)
+
+
+def related_articles(article, limit=None):
+    """Похожие статьи одним запросом; если их нет — свежие"""
+    from .models import Article
+
+    limit = limit or get_limit()
+    published = Article.objects.published().for_links()
+    related = list(
+        published.filter(related_to__article=article).order_by('related_to__rank')[:limit]
+    )
+    return related or list(published.exclude(pk=article.pk)[:limit])
+
+
+def schedule_related(*article_ids):
+    from uch.apps.core.background import run_task_on_commit
+    from .tasks import refresh_related_task
+
+    run_task_on_commit(refresh_related_task, list(article_ids))
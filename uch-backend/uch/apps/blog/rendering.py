@@ -0,0 +1,83 @@
+# uch/apps/blog/rendering.py
+"""
+Рендеринг Markdown статей вне цикла запроса.
+
+``Article.content_hash`` — хэш содержимого (вместе с версией настроек
+рендера), из которого получен текущий ``content_html``. Если хэш текущего
+``content`` совпадает с сохранённым, рендерить нечего: сохранение, которое
+меняет только статус или флаги, Markdown не трогает.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from uch.apps.core.metrics import MARKDOWN_RENDER
+from uch.apps.core.profiling import timed
+
+from .cache import fragment_cache, page_cache
+
+# Изменение расширений или RENDER_VERSION делает устаревшими все статьи —
+# после этого запустите ``manage.py rerender_articles``
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables']
+RENDER_VERSION = 1
+
+MEMO_TIMEOUT = 60 * 60 * 24
+
+
+def content_hash(content):
+    config = f'{RENDER_VERSION}:{",".join(MARKDOWN_EXTENSIONS)}\n'
+    return hashlib.sha256((config + (content or '')).encode()).hexdigest()
+
+
+def markdown_to_html(content):
+    """Чистая функция рендера (используется и в пуле процессов)"""
+    if not content:
+        return ''
+    import markdown
+    return markdown.markdown(content, extensions=MARKDOWN_EXTENSIONS)
+
+
+def render_markdown(content, digest=None):
+    """Рендер с мемоизацией по хэшу содержимого"""
+    digest = digest or content_hash(content)
+    key = f'blog:markdown:{digest}'
+    html = cache.get(key)
+    if html is None:
+        with timed('markdown'), MARKDOWN_RENDER.time():
+            html = markdown_to_html(content)
+        cache.set(key, html, MEMO_TIMEOUT)
+    return html
+
+
+def render_article(article_id):
+    """Перерисовывает content_html статьи, если он устарел.
+
+    Запись защищена проверкой updated_at: если статью успели сохранить
+    ещё раз, результат отбрасывается — её отрисует следующая задача.
+    """
+    from .models import Article
+
+    row = Article.objects.filter(pk=article_id).values(
+        'content', 'content_hash', 'updated_at'
+    ).first()
+    if row is None:
+        return False
+
+    digest = content_hash(row['content'])
+    if digest == row['content_hash']:
+        return False
+
+    html = render_markdown(row['content'], digest)
+    updated = Article.objects.filter(pk=article_id, updated_at=row['updated_at']).update(
+        content_html=html, content_hash=digest)
+    if updated:
+        page_cache.bump()
+        fragment_cache.bump()
+    return bool(updated)
+
+
+def schedule_render(article):
+    from uch.apps.core.background import run_task_on_commit
+    from .tasks import render_article_task
+
+    run_task_on_commit(render_article_task, article.pk)
@@ -0,0 +1,190 @@
+# uch/apps/blog/search.py
+"""
+Полнотекстовый поиск по статьям.
+
+Бэкенд выбирается по типу БД:
+  * SQLite — виртуальная таблица FTS5 ``blog_article_fts`` (rowid = id статьи),
+    обновляется в ``Article.save``;
+  * PostgreSQL — генерируемая колонка ``search_vector`` (tsvector) с GIN-индексом;
+  * остальные — прежний поиск через icontains.
+
+Все бэкенды возвращают queryset, упорядоченный по релевантности и
+аннотированный полями ``search_rank`` и ``search_snippet``. Во фрагменте
+совпадения обрамлены маркерами HIGHLIGHT_START/HIGHLIGHT_END (см. фильтр
+``highlight_snippet``).
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import F, Q, Value
+from django.db.models.expressions import RawSQL
+
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_TOKENS = 24
+MAX_QUERY_TERMS = 10
+
+FTS_TABLE = 'blog_article_fts'
+POSTGRES_SEARCH_CONFIG = 'russian'
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5 с именем таблицы — левая часть MATCH"""
+
+
+@SearchDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def parse_terms(query):
+    """Разбивает пользовательский запрос на слова (без операторов)"""
+    return re.findall(r'\w+', query or '')[:MAX_QUERY_TERMS]
+
+
+class BaseSearchBackend:
+    """Общий интерфейс поисковых бэкендов; using — алиас БД"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def index_article(self, article):
+        """Обновляет индекс для статьи (вызывается из Article.save)"""
+
+    def remove_article(self, article_id):
+        """Удаляет статью из индекса"""
+
+    def rebuild(self):
+        """Перестраивает индекс целиком"""
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Запасной вариант: icontains по заголовку, описанию и тексту"""
+
+    def search(self, queryset, query):
+        terms = parse_terms(query)
+        if not terms:
+            return queryset.none()
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term) |
+                Q(content__icontains=term) |
+                Q(excerpt__icontains=term)
+            )
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=models.FloatField()),
+            search_snippet=Value('', output_field=models.TextField()),
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 с ранжированием bm25 и функцией snippet()"""
+
+    # Веса столбцов для bm25: заголовок, описание, текст
+    weights = (10.0, 5.0, 1.0)
+
+    def index_article(self, article):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [article.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content) '
+                f'VALUES (%s, %s, %s, %s)',
+                [article.pk, article.title, article.excerpt, article.content],
+            )
+
+    def remove_article(self, article_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [article_id])
+
+    def rebuild(self):
+        from .models import Article
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content) '
+                f'SELECT id, title, excerpt, content FROM {Article._meta.db_table}'
+            )
+
+    @staticmethod
+    def build_match(terms):
+        # Каждое слово — префиксный поиск в кавычках, слова объединяются через AND
+        return ' '.join('"%s"*' % term.replace('"', '') for term in terms)
+
+    def search(self, queryset, query):
+        terms = parse_terms(query)
+        if not terms:
+            return queryset.none()
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.filter(
+            search_index__document__match=self.build_match(terms)
+        ).annotate(
+            search_rank=RawSQL(
+                f'bm25("{FTS_TABLE}", {weights})', [],
+                output_field=models.FloatField(),
+            ),
+            search_snippet=RawSQL(
+                f'snippet("{FTS_TABLE}", -1, %s, %s, %s, {SNIPPET_TOKENS})',
+                [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_ELLIPSIS],
+                output_field=models.TextField(),
+            ),
+        ).order_by('search_rank', '-published_at')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector + GIN; колонка генерируется СУБД при каждом сохранении"""
+
+    def search(self, queryset, query):
+        terms = parse_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = f"to_tsquery('{POSTGRES_SEARCH_CONFIG}', %s)"
+        match = ' & '.join(f'{term}:*' for term in terms)
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            RawSQL(f'"{table}"."search_vector" @@ {tsquery}', [match],
+                   output_field=models.BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank_cd("{table}"."search_vector", {tsquery})', [match],
+                output_field=models.FloatField(),
+            ),
+            search_snippet=RawSQL(
+                f"ts_headline('{POSTGRES_SEARCH_CONFIG}', "
+                f"coalesce(\"{table}\".\"excerpt\", '') || ' ' || \"{table}\".\"content\", "
+                f"{tsquery}, %s)",
+                [
+                    match,
+                    f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, '
+                    f'MaxWords={SNIPPET_TOKENS}, MinWords=8, '
+                    f'FragmentDelimiter={SNIPPET_ELLIPSIS}, MaxFragments=2',
+                ],
+                output_field=models.TextField(),
+            ),
+        ).order_by(F('search_rank').desc(), '-published_at')
+
+
+_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    """Бэкенд поиска для БД using"""
+    return _BACKENDS.get(connections[using].vendor, SimpleSearchBackend)(using)
+
+
+def search_articles(queryset, query):
+    """Ищет статьи в queryset; результат упорядочен по релевантности"""
+    return get_search_backend(queryset.db).search(queryset, query)
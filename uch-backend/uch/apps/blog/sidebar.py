@@ -0,0 +1,28 @@
+# uch/apps/blog/sidebar.py
+from .cache import sidebar_cache
+from .models import Category, Article
+from .tags import popular_tags
+
+
+def build_sidebar_data():
+    """Собирает данные боковой панели одним набором запросов"""
+    published = Article.objects.published()
+
+    categories = list(
+        Category.objects.filter(is_active=True, published_article_count__gt=0)[:10]
+    )
+    tags = popular_tags(10)
+    latest_articles = list(published.for_links().order_by('-created_at')[:5])
+
+    return {
+        'categories': categories,
+        'popular_tags': tags,
+        'latest_articles': latest_articles,
+        'total_articles': published.count(),
+        'total_categories': Category.objects.filter(is_active=True).count(),
+    }
+
+
+def get_sidebar_data():
+    """Данные боковой панели из версионированного кэша"""
+    return sidebar_cache.get_or_set('data', build_sidebar_data)
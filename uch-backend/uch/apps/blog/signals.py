@@ -0,0 +1,94 @@
+# uch/apps/blog/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from taggit.models import Tag, TaggedItem
+
+from .cache import fragment_cache, media_cache, page_cache, sidebar_cache
+from .counters import (
+    adjust_tag_counts, article_changed, article_tag_ids, comment_changed, is_published,
+    tags_changed,
+)
+from .models import Article, Category, Comment, MediaItem, RelatedArticle
+from .related import schedule_related
+from .search import get_search_backend
+
+
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=TaggedItem)
+def invalidate_sidebar(sender, **kwargs):
+    """Сбрасывает кэш боковой панели при изменении контента"""
+    sidebar_cache.bump()
+
+
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=TaggedItem)
+def invalidate_pages(sender, **kwargs):
+    """Сбрасывает кэш страниц для анонимных посетителей"""
+    page_cache.bump()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=TaggedItem)
+def invalidate_fragments(sender, **kwargs):
+    """Карточки и тело статьи показывают теги и категорию"""
+    fragment_cache.bump()
+
+
+@receiver([post_save, post_delete], sender=MediaItem)
+def invalidate_media(sender, **kwargs):
+    """Меняет версию медиатеки (ETag ответов API)"""
+    media_cache.bump()
+
+
+@receiver(post_delete, sender=Article)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    """Удаляет статью из полнотекстового индекса"""
+    get_search_backend(using).remove_article(instance.pk)
+
+
+def _deleted_state(instance):
+    return getattr(instance, '_counted_state', None) or instance.counter_state()
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчик статей категории"""
+    article_changed(_deleted_state(instance), None)
+
+
+@receiver(pre_delete, sender=Article)
+def article_deleting(sender, instance, **kwargs):
+    """Уменьшает счётчики тегов, пока связи статьи с тегами ещё есть"""
+    if is_published(instance):
+        adjust_tag_counts(article_tag_ids(instance.pk), -1)
+        # Кому статья была похожей — пересчитать после удаления
+        instance._related_from = list(RelatedArticle.objects.filter(
+            related_id=instance.pk).values_list('article_id', flat=True))
+
+
+@receiver(post_delete, sender=Article)
+def refresh_related_after_delete(sender, instance, **kwargs):
+    related_from = getattr(instance, '_related_from', None)
+    if related_from:
+        schedule_related(*related_from)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def article_tags_changed(sender, instance, action, pk_set, **kwargs):
+    """Счётчики тегов при изменении тегов опубликованной статьи"""
+    if isinstance(instance, Article):
+        tags_changed(instance, action, pk_set)
+        if action in ('post_add', 'post_remove', 'post_clear') and is_published(instance):
+            schedule_related(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчик комментариев статьи"""
+    comment_changed(_deleted_state(instance), None)
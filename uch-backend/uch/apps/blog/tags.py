@@ -0,0 +1,37 @@
+# uch/apps/blog/tags.py
+"""
+Популярные теги и облако тегов из таблицы TagStat.
+
+Счётчики учитывают только опубликованные статьи и поддерживаются
+инкрементально (counters.py), поэтому выборка — это чтение верхних
+строк по индексу ``published_count``, без агрегации по TaggedItem.
+"""
+import math
+
+from .models import TagStat
+
+
+def popular_tags(limit=10):
+    """Самые используемые теги; у тега заполнен num_times"""
+    stats = (
+        TagStat.objects.filter(published_count__gt=0)
+        .select_related('tag').order_by('-published_count', 'tag_id')[:limit]
+    )
+    tags = []
+    for stat in stats:
+        stat.tag.num_times = stat.published_count
+        tags.append(stat.tag)
+    return tags
+
+
+def tag_cloud(limit=30, steps=5):
+    """Популярные теги по алфавиту с весом 1..steps (логарифмическая шкала)"""
+    tags = popular_tags(limit)
+    if not tags:
+        return []
+    low = math.log(min(tag.num_times for tag in tags))
+    high = math.log(max(tag.num_times for tag in tags))
+    spread = high - low or 1
+    for tag in tags:
+        tag.weight = 1 + round((math.log(tag.num_times) - low) / spread * (steps - 1))
+    return sorted(tags, key=lambda tag: tag.name.lower())
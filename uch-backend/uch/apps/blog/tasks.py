@@ -0,0 +1,43 @@
+from celery import shared_task
+from django.db import IntegrityError, OperationalError
+
+from .covers import generate_covers
+from .media_metadata import extract_metadata
+from .related import refresh_related
+from .rendering import render_article
+from .thumbnails import generate_thumbnails
+
+
+@shared_task(ignore_result=True, autoretry_for=(OperationalError,),
+             retry_backoff=True, max_retries=3)
+def render_article_task(article_id):
+    """Рендер Markdown статьи в HTML"""
+    return render_article(article_id)
+
+
+@shared_task(ignore_result=True, autoretry_for=(OperationalError,),
+             retry_backoff=True, max_retries=3)
+def generate_thumbnails_task(item_id):
+    """Превью изображения MediaItem"""
+    return generate_thumbnails(item_id)
+
+
+@shared_task(ignore_result=True, autoretry_for=(OperationalError,),
+             retry_backoff=True, max_retries=3)
+def generate_covers_task(article_id):
+    """Производные обложки статьи для srcset"""
+    return generate_covers(article_id)
+
+
+@shared_task(ignore_result=True, autoretry_for=(OperationalError,),
+             retry_backoff=True, max_retries=3)
+def extract_metadata_task(item_id):
+    """Метаданные медиафайла из заголовков"""
+    return extract_metadata(item_id)
+
+
+@shared_task(ignore_result=True, autoretry_for=(OperationalError, IntegrityError),
+             retry_backoff=True, max_retries=3)
+def refresh_related_task(article_ids):
+    """Пересчёт похожих статей после изменения тегов, категории или статуса"""
+    return refresh_related(article_ids)
@@ -0,0 +1,83 @@
+from django import template
+from django.conf import settings
+from django.utils.html import escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from ..category_tree import render_category_tree
+from ..cache import fragment_cache
+from ..covers import MIME_TYPES, is_current
+from ..fragments import render_cards, store_timeout
+from ..search import HIGHLIGHT_START, HIGHLIGHT_END
+
+register = template.Library()
+
+
+@register.filter
+def highlight_snippet(snippet):
+    """Экранирует фрагмент поиска и подсвечивает совпадения через <mark>"""
+    if not snippet:
+        return ''
+    html = escape(snippet)
+    html = html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+def _srcset(storage, variants):
+    return ', '.join(f"{storage.url(v['name'])} {v['width']}w" for v in variants)
+
+
+@register.simple_tag
+def responsive_cover(article, sizes='100vw', css_class='', style='', lazy=True):
+    """<picture> обложки со srcset из производных (covers.py).
+
+    Пока производные не готовы, выводится оригинал. ``lazy=False`` — для
+    обложек на первом экране.
+    """
+    loading = 'lazy' if lazy else 'eager'
+    variants = article.cover_derivatives.get('variants') if is_current(article) else None
+    if not variants:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="{}" decoding="async">',
+            article.cover_image.url, css_class, article.title, style, loading,
+        )
+
+    storage = article.cover_image.storage
+    formats = [fmt for fmt in settings.ARTICLE_COVER_FORMATS if fmt in variants]
+    formats += [fmt for fmt in variants if fmt not in formats]
+    # Последний формат — запасной для <img>, остальные — через <source>
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (MIME_TYPES.get(fmt, ''), _srcset(storage, variants[fmt]), sizes)
+        for fmt in formats[:-1]
+    ))
+    fallback = variants[formats[-1]]
+    largest = fallback[-1]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'class="{}" alt="{}" style="{}" loading="{}" decoding="async"></picture>',
+        sources, storage.url(largest['name']), _srcset(storage, fallback), sizes,
+        largest['width'], largest['height'], css_class, article.title, style, loading,
+    )
+
+
+@register.simple_tag
+def category_tree():
+    """Дерево активных категорий (готовый HTML из кэша)"""
+    return mark_safe(render_category_tree())
+
+
+@register.simple_tag
+def article_cards(articles, variant, eager=0):
+    """Карточки статей из кэша фрагментов (один запрос к кэшу на список)"""
+    return render_cards(articles, variant, eager)
+
+
+@register.simple_tag
+def fragment_version():
+    """Версия кэша фрагментов — для {% cache %} в шаблонах"""
+    return fragment_cache.get_version()
+
+
+@register.simple_tag
+def fragment_timeout():
+    """Срок для {% cache %}: 0 — фрагмент не сохраняется (данные с реплики)"""
+    return store_timeout()
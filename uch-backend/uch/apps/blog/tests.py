@@ -1,3 +1,1449 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from uch.apps.core import routers
+from uch.apps.core.query_plans import QueryPlanAssertions
+
+from .cache import fragment_cache, sidebar_cache
+from .comments import load_comment_tree
+from .counters import find_mismatches, find_tag_mismatches
+from .models import Article, Category, CategoryClosure, Comment, MediaItem, TagStat
+from .pagination import CursorPaginator
+from . import (
+    async_views, benchmark, category_tree, fragments, media_metadata, page_cache, related,
+    rendering, search, thumbnails, transfer,
+)
+from .search import HIGHLIGHT_START, search_articles
+from .sidebar import get_sidebar_data
+from .tags import popular_tags, tag_cloud
+from .views import ArticleListView, adjacent_articles
+
+
+class SidebarCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        sidebar_cache.clear_local()
+        self.author = User.objects.create_user('author', password='pass')
+        self.category = Category.objects.create(name='Музыка', slug='music')
+        self.article = Article.objects.create(
+            title='Первая', slug='first', content='Текст',
+            author=self.author, category=self.category, status='published',
+        )
+        self.article.tags.add('django')
+
+    def test_warm_sidebar_costs_no_queries(self):
+        get_sidebar_data()
+        with self.assertNumQueries(0):
+            data = get_sidebar_data()
+        self.assertEqual(data['total_articles'], 1)
+        self.assertEqual([c.published_article_count for c in data['categories']], [1])
+
+    def test_publish_invalidates_sidebar(self):
+        get_sidebar_data()
+        Article.objects.create(
+            title='Вторая', slug='second', content='Текст',
+            author=self.author, category=self.category, status='published',
+        )
+        data = get_sidebar_data()
+        self.assertEqual(data['total_articles'], 2)
+        self.assertEqual(data['latest_articles'][0].slug, 'second')
+
+    def test_tag_change_invalidates_sidebar(self):
+        get_sidebar_data()
+        self.article.tags.add('python')
+        names = {tag.name for tag in get_sidebar_data()['popular_tags']}
+        self.assertEqual(names, {'django', 'python'})
+
+    def test_sidebar_error_is_logged(self):
+        from .context_processors import sidebar_data
+
+        with mock.patch('uch.apps.blog.context_processors.get_sidebar_data',
+                        side_effect=RuntimeError('cache down')), \
+                self.assertLogs('uch.apps.blog.context_processors', 'ERROR'):
+            self.assertEqual(sidebar_data(None)['total_articles'], 0)
+
+    def test_other_process_sees_new_version(self):
+        get_sidebar_data()
+        # Другой процесс: локальный уровень пуст, версия уже увеличена
+        sidebar_cache.bump()
+        with self.assertNumQueries(5):
+            get_sidebar_data()
+
+
+class ArticleAdminTests(TestCase):
+    def test_comment_count_sorts_by_shown_total(self):
+        admin = User.objects.create_superuser('admin', password='pass')
+        for slug, approved, pending in [('a', 3, 0), ('b', 1, 5), ('c', 2, 0)]:
+            article = Article.objects.create(title=slug, slug=slug, content='x', author=admin)
+            Article.objects.filter(pk=article.pk).update(
+                approved_comment_count=approved, pending_comment_count=pending)
+        self.client.force_login(admin)
+        # Седьмая колонка list_display — comment_count
+        response = self.client.get(reverse('admin:blog_article_changelist'), {'o': '7'})
+        self.assertEqual([a.slug for a in response.context['cl'].result_list], ['c', 'a', 'b'])
+
+
+class ArticleSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass')
+
+    def create(self, slug, **fields):
+        fields.setdefault('title', slug)
+        fields.setdefault('content', 'Текст')
+        return Article.objects.create(
+            slug=slug, author=self.author, status='published', **fields
+        )
+
+    def test_title_match_ranks_above_content_match(self):
+        self.create('body', content='Синтезатор упоминается только в тексте')
+        self.create('title', title='Синтезатор своими руками')
+        results = list(search_articles(Article.objects.all(), 'синтезатор'))
+        self.assertEqual([a.slug for a in results], ['title', 'body'])
+        self.assertIn(HIGHLIGHT_START, results[1].search_snippet)
+
+    def test_prefix_and_all_terms_required(self):
+        self.create('both', content='модульный синтезатор')
+        self.create('one', content='модульный')
+        slugs = [a.slug for a in search_articles(Article.objects.all(), 'модул синт')]
+        self.assertEqual(slugs, ['both'])
+
+    def test_index_follows_save_and_delete(self):
+        article = self.create('edit', content='гитара')
+        article.content = 'барабаны'
+        article.save()
+        self.assertFalse(search_articles(Article.objects.all(), 'гитара').exists())
+        self.assertTrue(search_articles(Article.objects.all(), 'барабаны').exists())
+        article.delete()
+        self.assertFalse(search_articles(Article.objects.all(), 'барабаны').exists())
+
+    def test_reindex_only_when_indexed_fields_change(self):
+        article = self.create('edit', content='гитара')
+        backend = type(search.get_search_backend())
+        with mock.patch.object(backend, 'index_article', autospec=True) as index:
+            article.is_featured = True
+            article.save()
+            Article.objects.get(pk=article.pk).save()
+            index.assert_not_called()
+            article.title = 'Барабаны'
+            article.save()
+            index.assert_called_once()
+            self.assertEqual(index.call_args.args[0].using, 'default')
+
+    def test_operators_in_query_are_ignored(self):
+        self.create('safe', content='звук')
+        results = search_articles(Article.objects.all(), '"звук*" ^(:')
+        self.assertEqual([a.slug for a in results], ['safe'])
+
+    def test_list_view_highlights_matches(self):
+        self.create('hit', content='Про <b>аналоговый</b> звук')
+        response = self.client.get(reverse('blog:article_list'), {'q': 'аналоговый'})
+        self.assertContains(response, '<mark>аналоговый</mark>')
+        self.assertNotContains(response, '<b>аналоговый</b>')
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', password='pass')
+        self.category = Category.objects.create(name='Музыка', slug='music')
+        now = timezone.now()
+        for i in range(7):
+            article = Article.objects.create(
+                title=f'Статья {i}', slug=f'a{i}', content='Текст', author=author,
+                status='published', category=self.category if i % 2 else None,
+                # Две статьи с одинаковой датой — порядок решает id
+                published_at=now - timedelta(days=min(i, 5)),
+            )
+            if i < 4:
+                article.tags.add('synth')
+        self.expected = list(
+            Article.objects.order_by('-published_at', '-pk').values_list('slug', flat=True)
+        )
+
+    def walk(self, queryset, per_page=3):
+        paginator = CursorPaginator(queryset, per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_forward_walk_covers_everything_once(self):
+        _, pages = self.walk(Article.objects.all())
+        slugs = [a.slug for page in pages for a in page]
+        self.assertEqual(slugs, self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_same_page(self):
+        paginator, pages = self.walk(Article.objects.all())
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual([a.slug for a in back], [a.slug for a in pages[1]])
+        self.assertTrue(back.has_next())
+
+    def test_no_count_or_offset_queries(self):
+        paginator, pages = self.walk(Article.objects.all())
+        with self.assertNumQueries(1) as ctx:
+            paginator.page(pages[1].next_cursor)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('COUNT(', sql.upper())
+        self.assertNotIn('OFFSET', sql.upper())
+
+    def test_category_and_tag_views(self):
+        url = reverse('blog:category_detail', args=['music'])
+        response = self.client.get(url, {'cursor': ''})
+        slugs = [a.slug for a in response.context['articles']]
+        self.assertEqual(slugs, [s for s in self.expected if int(s[1:]) % 2])
+        self.assertTrue(response.context['cursor_pagination'])
+
+        with override_settings(BLOG_CURSOR_PAGINATION=True), \
+                mock.patch.object(ArticleListView, 'paginate_by', 3):
+            response = self.client.get(reverse('blog:article_list'), {'tag': 'synth'})
+            page = response.context['page_obj']
+            self.assertContains(response, 'tag=synth')
+            response = self.client.get(
+                reverse('blog:article_list'), {'tag': 'synth', 'cursor': page.next_cursor}
+            )
+        self.assertEqual([a.slug for a in response.context['articles']], ['a3'])
+
+    def test_bad_cursor_is_404(self):
+        response = self.client.get(reverse('blog:article_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='pass')
+        self.music = Category.objects.create(name='Музыка', slug='music')
+        self.art = Category.objects.create(name='Арт', slug='art')
+        self.article = Article.objects.create(
+            title='Статья', slug='article', content='Текст', author=self.user,
+            category=self.music, status='published',
+        )
+
+    def comment(self, **fields):
+        return Comment.objects.create(
+            article=self.article, author=self.user, content='Комментарий', **fields
+        )
+
+    def assertCounts(self, approved, pending):
+        self.article.refresh_from_db()
+        self.assertEqual(
+            (self.article.approved_comment_count, self.article.pending_comment_count),
+            (approved, pending),
+        )
+
+    def test_comment_lifecycle(self):
+        comment = self.comment()
+        self.comment(is_approved=True)
+        self.assertCounts(1, 1)
+        comment.is_approved = True
+        comment.save()
+        self.assertCounts(2, 0)
+        comment.is_approved = False
+        comment.save()
+        self.assertCounts(1, 1)
+        comment.delete()
+        self.assertCounts(1, 0)
+
+    def test_bulk_approval_keeps_counters(self):
+        for _ in range(3):
+            self.comment()
+        self.comment(is_approved=True)
+        self.assertEqual(Comment.objects.all().set_approved(True), 3)
+        self.assertCounts(4, 0)
+        Comment.objects.filter(pk__in=Comment.objects.values('pk')[:2]).set_approved(False)
+        self.assertCounts(2, 2)
+
+    def test_reply_cascade_delete(self):
+        parent = self.comment(is_approved=True)
+        Comment.objects.create(article=self.article, author=self.user,
+                               content='Ответ', parent=parent)
+        parent.delete()
+        self.assertCounts(0, 0)
+
+    def test_category_article_count(self):
+        self.music.refresh_from_db()
+        self.assertEqual(self.music.published_article_count, 1)
+
+        article = Article.objects.only('pk', 'title').get(pk=self.article.pk)
+        article.category = self.art
+        article.save()
+        self.music.refresh_from_db()
+        self.art.refresh_from_db()
+        self.assertEqual((self.music.published_article_count,
+                          self.art.published_article_count), (0, 1))
+
+        article = Article.objects.get(pk=self.article.pk)
+        article.status = 'draft'
+        article.save()
+        self.art.refresh_from_db()
+        self.assertEqual(self.art.published_article_count, 0)
+
+        article.status = 'published'
+        article.save()
+        article.delete()
+        self.art.refresh_from_db()
+        self.assertEqual(self.art.published_article_count, 0)
+
+    def test_rebuild_and_verify_command(self):
+        self.comment(is_approved=True)
+        Article.objects.update(approved_comment_count=7)
+        Category.objects.update(published_article_count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--verify', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', '--verify', stdout=StringIO())
+        self.assertCounts(1, 0)
+
+    def test_list_pages_need_no_per_row_counts(self):
+        for i in range(5):
+            Article.objects.create(
+                title=f'Статья {i}', slug=f'a{i}', content='Текст', author=self.user,
+                category=self.music, status='published',
+            )
+        self.client.get(reverse('blog:article_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('blog:article_list'))
+        comment_queries = [q for q in ctx.captured_queries if 'blog_comment' in q['sql']]
+        self.assertEqual(comment_queries, [])
+
+
+class CommentTreeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass')
+        author = User.objects.create_user('author', password='pass')
+        self.article = Article.objects.create(
+            title='Статья', slug='article', content='Текст', author=author,
+            status='published',
+        )
+
+    def comment(self, text, parent=None, approved=True):
+        return Comment.objects.create(
+            article=self.article, author=self.user, content=text,
+            parent=parent, is_approved=approved,
+        )
+
+    def test_tree_in_one_query_at_any_depth(self):
+        first = self.comment('1')
+        reply = self.comment('1.1', parent=first)
+        self.comment('1.1.1', parent=reply)
+        self.comment('2')
+        with self.assertNumQueries(1):
+            tree = load_comment_tree(self.article)
+            rows = [(c.content, c.depth, c.author.username) for c in tree]
+        self.assertEqual(rows, [
+            ('2', 0, 'reader'),
+            ('1', 0, 'reader'), ('1.1', 1, 'reader'), ('1.1.1', 2, 'reader'),
+        ])
+        self.assertEqual(tree.total, 4)
+
+    def test_pending_subtrees_hidden_from_readers(self):
+        hidden = self.comment('скрыт', approved=False)
+        self.comment('ответ', parent=hidden)
+        self.comment('виден')
+        self.assertEqual([c.content for c in load_comment_tree(self.article)], ['виден'])
+        staff_view = load_comment_tree(self.article, include_pending=True)
+        self.assertEqual(staff_view.total, 3)
+
+    def test_top_level_threads_are_paginated(self):
+        for i in range(5):
+            root = self.comment(f'ветка {i}')
+            self.comment(f'ответ {i}', parent=root)
+        tree = load_comment_tree(self.article, page=2, per_page=2)
+        self.assertEqual([c.content for c in tree],
+                         ['ветка 2', 'ответ 2', 'ветка 1', 'ответ 1'])
+        self.assertTrue(tree.page.has_next())
+
+    def test_detail_page_shows_each_reply_once(self):
+        root = self.comment('корень')
+        self.comment('уникальный ответ', parent=root)
+        response = self.client.get(self.article.get_absolute_url())
+        self.assertContains(response, 'уникальный ответ', count=1)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class MarkdownRenderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass')
+
+    def create(self, content='# Заголовок'):
+        return Article.objects.create(
+            title='Статья', slug='article', content=content, author=self.author,
+        )
+
+    def test_render_on_create_and_content_change_only(self):
+        article = self.create()
+        article.refresh_from_db()
+        self.assertIn('<h1>Заголовок</h1>', article.content_html)
+        self.assertEqual(article.content_hash, rendering.content_hash(article.content))
+
+        with mock.patch.object(rendering, 'markdown_to_html', wraps=rendering.markdown_to_html) as md:
+            article.is_featured = True
+            article.status = 'published'
+            article.save()
+            md.assert_not_called()
+            article.content = '*новый* текст'
+            article.save()
+            md.assert_called_once()
+        article.refresh_from_db()
+        self.assertIn('<em>новый</em>', article.content_html)
+
+    def test_identical_content_is_memoized(self):
+        self.create('**общий** текст')
+        with mock.patch.object(rendering, 'markdown_to_html') as md:
+            Article.objects.create(
+                title='Копия', slug='copy', content='**общий** текст', author=self.author,
+            )
+            md.assert_not_called()
+
+    @override_settings(BACKGROUND_TASKS_EAGER=False, CELERY_BROKER_URL='')
+    def test_render_is_deferred_until_commit(self):
+        with mock.patch('uch.apps.core.background.run_task') as run_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                article = self.create()
+                run_task.assert_not_called()
+        run_task.assert_called_once()
+        self.assertEqual(run_task.call_args.args[1], article.pk)
+
+    def test_stale_render_is_discarded(self):
+        article = self.create()
+        Article.objects.filter(pk=article.pk).update(content_hash='')
+        # Статью сохранили, пока задача рендерила старую версию
+        with mock.patch.object(rendering, 'render_markdown',
+                               side_effect=lambda *a: Article.objects.filter(pk=article.pk).update(
+                                   updated_at=timezone.now()) and 'старый'):
+            self.assertFalse(rendering.render_article(article.pk))
+
+    def test_rerender_command_after_config_change(self):
+        article = self.create('~~~\nкод\n~~~')
+        with mock.patch.object(rendering, 'RENDER_VERSION', rendering.RENDER_VERSION + 1):
+            call_command('rerender_articles', '--workers', '1', stdout=StringIO())
+            article.refresh_from_db()
+            self.assertEqual(article.content_hash, rendering.content_hash(article.content))
+        self.assertIn('<code>', article.content_html)
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('pages')
+        self.category = Category.objects.create(name='Видео', slug='video')
+        self.article = Article.objects.create(
+            title='Монтаж', slug='montage', content='Текст', author=self.author,
+            category=self.category, status='published',
+        )
+        self.url = self.article.get_absolute_url()
+
+    def test_repeat_visit_gets_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_page_costs_no_queries(self):
+        first = self.client.get(reverse('blog:category_detail', args=['video']),
+                                {'tag': 'x', 'utm_source': 'a'})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('blog:category_detail', args=['video']),
+                                     {'tag': 'x', 'utm_source': 'b'})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(first.content, second.content)
+
+    def test_changes_purge_pages(self):
+        etag = self.client.get(self.url)['ETag']
+
+        comment = Comment.objects.create(article=self.article, author=self.author,
+                                         content='Первый!', is_approved=False)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Первый!')
+
+        Comment.objects.filter(pk=comment.pk).set_approved()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Первый!')
+
+        self.category.name = 'Кино'
+        self.category.save()
+        self.assertContains(self.client.get(self.url), 'Кино')
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.author)
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+        self.assertContains(response, 'Добавить комментарий')
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    MEDIA_THUMBNAILS={
+        'admin': {'size': (100, 100), 'format': 'JPEG'},
+        'small': {'size': (300, 300), 'format': 'WEBP'},
+    },
+)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('media')
+
+    def upload(self, size=(1600, 1200), mode='RGB', fmt='JPEG', name='photo.jpg'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, fmt)
+        return MediaItem.objects.create(
+            title='Фото', file_type='image', uploaded_by=self.user,
+            file=SimpleUploadedFile(name, buffer.getvalue()),
+        )
+
+    def test_sizes_generated_after_upload(self):
+        item = self.upload()
+        item.refresh_from_db()
+        record = item.metadata['thumbnails']
+        self.assertEqual((record['width'], record['height']), (1600, 1200))
+        self.assertEqual(record['sizes']['small']['format'], 'WEBP')
+        self.assertEqual((record['sizes']['small']['width'],
+                          record['sizes']['small']['height']), (300, 225))
+        self.assertEqual(item.thumbnail.name, record['sizes']['admin']['name'])
+        self.assertTrue(item.thumbnail.storage.exists(item.thumbnail.name))
+        self.assertTrue(item.thumbnail_url('small').endswith('.webp'))
+
+    def test_jpeg_is_decoded_in_draft_mode(self):
+        from PIL import JpegImagePlugin
+        item = self.upload()
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft',
+                               autospec=True, side_effect=JpegImagePlugin.JpegImageFile.draft) as draft:
+            thumbnails.generate_thumbnails(item.pk, force=True)
+        draft.assert_called_once()
+        self.assertEqual(draft.call_args.args[2], (300, 300))
+
+    def test_idempotent_and_resumable(self):
+        item = self.upload()
+        with mock.patch.object(thumbnails, 'render_thumbnails',
+                               wraps=thumbnails.render_thumbnails) as render:
+            item.refresh_from_db()
+            item.title = 'Другое название'
+            item.save()
+            self.assertFalse(thumbnails.generate_thumbnails(item.pk))
+            render.assert_not_called()
+
+            # Запуск прервался до записи одного из размеров
+            del item.metadata['thumbnails']['sizes']['small']
+            MediaItem.objects.filter(pk=item.pk).update(metadata=item.metadata)
+            self.assertTrue(thumbnails.generate_thumbnails(item.pk))
+            self.assertEqual(set(render.call_args.args[1]), {'small'})
+
+    def test_transparent_png_and_broken_file(self):
+        item = self.upload(mode='RGBA', fmt='PNG', name='logo.png')
+        item.refresh_from_db()
+        self.assertIn('admin', item.metadata['thumbnails']['sizes'])
+
+        with self.assertLogs('uch.apps.blog.thumbnails', 'WARNING'):
+            broken = MediaItem.objects.create(
+                title='Битый', file_type='image', uploaded_by=self.user,
+                file=SimpleUploadedFile('broken.jpg', b'not an image'),
+            )
+        broken.refresh_from_db()
+        self.assertIn('error', broken.metadata['thumbnails'])
+        self.assertEqual(thumbnails.missing_sizes(broken), {})
+
+    def test_backfill_command(self):
+        with override_settings(BACKGROUND_TASKS_EAGER=False, CELERY_BROKER_URL=''):
+            with mock.patch('uch.apps.core.background.run_task'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    item = self.upload()
+        item.refresh_from_db()
+        self.assertNotIn('thumbnails', item.metadata)
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Превью созданы для 1 файлов', out.getvalue())
+        item.refresh_from_db()
+        self.assertEqual(set(item.metadata['thumbnails']['sizes']), {'admin', 'small'})
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Превью созданы для 0 файлов', out.getvalue())
+
+    def test_pending_queue_matches_missing_sizes(self):
+        def pending():
+            expected = {item.pk for item in MediaItem.objects.all()
+                        if thumbnails.missing_sizes(item)}
+            actual = set(thumbnails.pending_thumbnails().values_list('pk', flat=True))
+            self.assertEqual(actual, expected)
+            return actual
+
+        item = self.upload()
+        with self.assertLogs('uch.apps.blog.thumbnails', 'WARNING'):
+            MediaItem.objects.create(title='Битый', file_type='image', uploaded_by=self.user,
+                                     file=SimpleUploadedFile('broken.jpg', b'not an image'))
+        self.assertEqual(pending(), set())
+
+        item.refresh_from_db()
+        del item.metadata['thumbnails']['sizes']['small']
+        MediaItem.objects.filter(pk=item.pk).update(metadata=item.metadata)
+        self.assertEqual(pending(), {item.pk})
+        with self.settings(MEDIA_THUMBNAIL_QUALITY=50):
+            MediaItem.objects.filter(pk=item.pk).update(metadata={})
+            self.assertEqual(pending(), {item.pk})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, ARTICLE_COVER_WIDTHS=[320, 640, 2000],
+                   ARTICLE_COVER_FORMATS=['WEBP', 'JPEG'])
+class CoverDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.author = User.objects.create_user('covers')
+
+    def cover(self, name='cover.jpg', color='blue'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def create(self, slug, cover):
+        return Article.objects.create(title=slug, slug=slug, content='x', author=self.author,
+                                      status='published', cover_image=cover)
+
+    def test_derivatives_created_on_save(self):
+        article = self.create('a', self.cover())
+        article.refresh_from_db()
+        record = article.cover_derivatives
+        self.assertEqual(record['source'], article.cover_image.name)
+        self.assertEqual(len(article.cover_hash), 64)
+        # 2000 шире оригинала — остаётся вариант в ширину оригинала
+        self.assertEqual([v['width'] for v in record['variants']['WEBP']], [320, 640, 1000])
+        self.assertEqual(record['variants']['JPEG'][0]['height'], 160)
+
+    def test_same_source_reuses_files_from_disk(self):
+        self.create('a', self.cover())
+        with mock.patch('uch.apps.blog.covers.render_thumbnails') as render:
+            article = self.create('b', self.cover(name='copy.jpg'))
+        render.assert_not_called()
+        article.refresh_from_db()
+        self.assertEqual(len(article.cover_derivatives['variants']['WEBP']), 3)
+
+    def test_removing_cover_clears_derivatives(self):
+        article = self.create('a', self.cover())
+        article.refresh_from_db()
+        article.cover_image = None
+        article.save()
+        article.refresh_from_db()
+        self.assertEqual((article.cover_hash, article.cover_derivatives), ('', {}))
+
+    def test_replacing_cover_drops_old_derivatives(self):
+        from .templatetags.blog_tags import responsive_cover
+
+        article = self.create('a', self.cover())
+        article.refresh_from_db()
+        stale = article.cover_derivatives
+        # Задача генерации ещё не выполнилась (или упала)
+        with mock.patch('uch.apps.blog.covers.schedule_covers') as schedule:
+            article.cover_image = self.cover(name='new.jpg', color='red')
+            article.save()
+        schedule.assert_called_once()
+        article.refresh_from_db()
+        self.assertEqual((article.cover_hash, article.cover_derivatives), ('', {}))
+        self.assertNotIn('<picture>', responsive_cover(article))
+
+        # Производные чужого файла тегом не используются
+        article.cover_derivatives = stale
+        html = responsive_cover(article)
+        self.assertNotIn('<picture>', html)
+        self.assertIn(article.cover_image.url, html)
+
+    def test_template_tag_and_list_page(self):
+        self.create('a', self.cover())
+        self.create('b', self.cover(color='green'))
+        html = self.client.get(reverse('blog:article_list')).content.decode()
+        self.assertEqual(html.count('<picture>'), 2)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('320w', html)
+        self.assertIn('width="1000" height="500"', html)
+        # Первая карточка на первом экране, остальные — лениво
+        self.assertEqual(html.count('loading="eager"'), 1)
+        self.assertEqual(html.count('loading="lazy"'), 1)
+
+
+def mp4_box(kind, payload):
+    import struct
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+class CountingReader(BytesIO):
+    """BytesIO, который считает прочитанные байты"""
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class MediaMetadataTests(TestCase):
+    def test_wav_header(self):
+        import wave
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(b'\0' * 4 * 8000 * 3)
+        info = media_metadata.extract('audio', BytesIO(buffer.getvalue()))
+        self.assertEqual(info['duration'], 3.0)
+        self.assertEqual((info['channels'], info['sample_rate']), (2, 8000))
+
+    def test_mp3_cbr_duration(self):
+        # MPEG-1 Layer III, 128 кбит/с, 44.1 кГц, стерео; 10 секунд данных
+        frame = bytes([0xFF, 0xFB, 0x90, 0x00])
+        data = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\0' * 10
+        data += frame + b'\0' * (128000 // 8 * 10 - 4)
+        info = media_metadata.extract('audio', BytesIO(data))
+        self.assertEqual(info['format'], 'MP3')
+        self.assertEqual((info['bitrate'], info['sample_rate']), (128000, 44100))
+        self.assertAlmostEqual(info['duration'], 10.0, places=2)
+
+    def test_mp4_reads_only_headers(self):
+        import struct
+        mvhd = b'\0' * 12 + struct.pack('>II', 1000, 95500) + b'\0' * 80
+        tkhd = b'\0' * 76 + struct.pack('>II', 1920 << 16, 1080 << 16)
+        hdlr = b'\0' * 8 + b'vide' + b'\0' * 12
+        stsd = b'\0' * 8 + struct.pack('>I', 16) + b'avc1' + b'\0' * 8
+        trak = mp4_box(b'trak', mp4_box(b'tkhd', tkhd) + mp4_box(b'mdia', (
+            mp4_box(b'hdlr', hdlr) + mp4_box(b'minf', mp4_box(b'stbl', mp4_box(b'stsd', stsd))))))
+        data = (mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'mdat', b'\0' * 5_000_000)
+                + mp4_box(b'moov', mp4_box(b'mvhd', mvhd) + trak))
+
+        f = CountingReader(data)
+        info = media_metadata.extract('video', f)
+        self.assertEqual(info['duration'], 95.5)
+        self.assertEqual((info['width'], info['height'], info['codec']), (1920, 1080, 'avc1'))
+        self.assertLess(f.bytes_read, 1000)
+
+    def test_binary_stl(self):
+        import struct
+        data = b'\0' * 80 + struct.pack('<I', 2) + b'\0' * 100
+        self.assertEqual(media_metadata.extract('3d', BytesIO(data)),
+                         {'format': 'STL', 'triangles': 2})
+
+    def test_glb_json_chunk(self):
+        import struct
+
+        def glb(payload, length=None):
+            length = len(payload) if length is None else length
+            return b'glTF' + struct.pack('<III4s', 2, 20 + len(payload), length, b'JSON') + payload
+
+        info = media_metadata.extract('3d', BytesIO(glb(b'{"meshes": [{}, {}], "nodes": [{}]}')))
+        self.assertEqual((info['meshes'], info['nodes'], info['materials']), (2, 1, 0))
+        for data in [glb(b'[]'), glb(b'{"meshes": 3}'), glb(b'{}', length=2 ** 32 - 1)]:
+            with self.subTest(data=data[20:]), self.assertRaises(ValueError):
+                media_metadata.extract('3d', BytesIO(data))
+
+    def test_broken_files_record_error(self):
+        from PIL import Image
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        buffer = BytesIO()
+        Image.new('RGB', (100, 100)).save(buffer, 'PNG')
+        # moov заканчивается пустым mvhd
+        truncated = mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'moov', mp4_box(b'mvhd', b''))
+        user = User.objects.create_user('m')
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            for file_type, name, data in [('video', 'cut.mp4', truncated),
+                                          ('image', 'bomb.png', buffer.getvalue())]:
+                item = MediaItem.objects.create(title=name, file_type=file_type, uploaded_by=user,
+                                                file=SimpleUploadedFile(name, data))
+                self.assertTrue(media_metadata.extract_metadata(item.pk))
+                item.refresh_from_db()
+                self.assertIn('error', item.metadata)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_upload_fills_indexed_columns(self):
+        from PIL import Image
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        buffer = BytesIO()
+        Image.new('RGB', (1920, 1080)).save(buffer, 'PNG')
+        with override_settings(MEDIA_ROOT=media_root):
+            item = MediaItem.objects.create(
+                title='Кадр', file_type='image', uploaded_by=User.objects.create_user('m'),
+                file=SimpleUploadedFile('frame.png', buffer.getvalue()),
+            )
+        item.refresh_from_db()
+        self.assertEqual((item.width, item.height), (1920, 1080))
+        self.assertEqual(item.metadata['format'], 'PNG')
+        self.assertIn('thumbnails', item.metadata)
+        self.assertEqual(list(MediaItem.objects.filter(file_type='image', width__gte=1920)),
+                         [item])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.author = User.objects.create_user('async')
+        self.category = Category.objects.create(name='Игры', slug='games')
+        self.article = Article.objects.create(
+            title='Уровни', slug='levels', content='Текст', author=self.author,
+            category=self.category, status='published', is_featured=True,
+        )
+        self.article.tags.add('gamedev')
+        Article.objects.create(title='Черновик', slug='draft', content='Текст',
+                               author=self.author, status='draft')
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        request.user = AnonymousUser()
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_pages_match_sync_views(self):
+        for view, path, kwargs in [
+            (async_views.home_view, '/', {}),
+            (async_views.article_list_view, '/category/games/', {'category_slug': 'games'}),
+            (async_views.article_detail_view, '/articles/levels/', {'slug': 'levels'}),
+        ]:
+            response = self.get(view, path, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Уровни')
+            self.assertContains(response, 'gamedev')
+            self.assertNotContains(response, 'Черновик')
+            cache.clear()
+            self.assertEqual(self.client.get(path).content, response.content)
+
+    def test_missing_pages_are_404(self):
+        with self.assertRaises(Http404):
+            self.get(async_views.article_detail_view, '/articles/draft/', slug='draft')
+        with self.assertRaises(Http404):
+            self.get(async_views.article_list_view, '/category/none/', category_slug='none')
+
+
+class TagStatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        sidebar_cache.clear_local()
+        self.user = User.objects.create_user('tags')
+        self.article = Article.objects.create(
+            title='Статья', slug='article', content='Текст', author=self.user,
+            status='published',
+        )
+
+    def counts(self):
+        return {tag.name: tag.num_times for tag in popular_tags(100)}
+
+    def test_tag_changes_on_published_article(self):
+        self.article.tags.add('django', 'python')
+        self.assertEqual(self.counts(), {'django': 1, 'python': 1})
+        self.article.tags.remove('python')
+        self.assertEqual(self.counts(), {'django': 1})
+        self.article.tags.set(['celery'])
+        self.assertEqual(self.counts(), {'celery': 1})
+        self.article.tags.clear()
+        self.assertEqual(self.counts(), {})
+
+    def test_only_published_articles_count(self):
+        draft = Article.objects.create(title='Черновик', slug='draft', content='Текст',
+                                       author=self.user, status='draft')
+        draft.tags.add('django')
+        self.article.tags.add('django')
+        self.assertEqual(self.counts(), {'django': 1})
+
+        draft.status = 'published'
+        draft.save()
+        self.assertEqual(self.counts(), {'django': 2})
+
+        self.article.status = 'archived'
+        self.article.save()
+        self.assertEqual(self.counts(), {'django': 1})
+
+        draft.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_popular_tags_cost_one_query(self):
+        self.article.tags.add('django')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(), {'django': 1})
+
+    def test_tag_cloud_weights(self):
+        for i in range(4):
+            article = Article.objects.create(title=f'Ещё {i}', slug=f'more-{i}', content='Текст',
+                                             author=self.user, status='published')
+            article.tags.add('popular')
+        self.article.tags.add('popular', 'rare')
+        cloud = tag_cloud(steps=5)
+        self.assertEqual([(tag.name, tag.weight) for tag in cloud],
+                         [('popular', 5), ('rare', 1)])
+
+    def test_rebuild_fixes_drift(self):
+        self.article.tags.add('django')
+        TagStat.objects.update(published_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--verify', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), {'django': 1})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, BLOG_RELATED_ARTICLES=3,
+                   BLOG_RELATED_CATEGORY_WEIGHT=0.5)
+class RelatedArticleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('related')
+        self.music = Category.objects.create(name='Музыка', slug='music')
+
+    def create(self, slug, tags=(), category=None, status='published'):
+        article = Article.objects.create(title=slug, slug=slug, content='Текст',
+                                         author=self.user, category=category, status=status)
+        if tags:
+            article.tags.add(*tags)
+        return article
+
+    def related(self, article):
+        return [a.slug for a in Article.objects.filter(
+            related_to__article=article).order_by('related_to__rank')]
+
+    def test_ranked_by_tag_and_category_similarity(self):
+        base = self.create('base', ['synth', 'mixing', 'vocals'], self.music)
+        self.create('two-tags', ['synth', 'mixing'])
+        self.create('one-tag-category', ['vocals'], self.music)
+        self.create('one-tag', ['synth'])
+        self.create('unrelated', ['photo'])
+        self.assertEqual(self.related(base), ['two-tags', 'one-tag-category', 'one-tag'])
+
+    def test_incremental_refresh(self):
+        base = self.create('base', ['synth'])
+        other = self.create('other', ['synth'])
+        self.assertEqual(self.related(base), ['other'])
+
+        other.tags.set(['photo'])
+        self.assertEqual(self.related(base), [])
+
+        other.tags.add('synth')
+        self.assertEqual(self.related(base), ['other'])
+
+        other.status = 'draft'
+        other.save()
+        self.assertEqual(self.related(base), [])
+        self.assertEqual(self.related(other), [])
+
+        other.status = 'published'
+        other.save()
+        third = self.create('third', ['synth', 'photo'])
+        self.assertEqual(self.related(other), ['third', 'base'])
+        third.delete()
+        self.assertEqual(self.related(other), ['base'])
+
+    def test_refresh_loads_only_neighbourhood(self):
+        base = self.create('base', ['synth'], self.music)
+        self.create('same-category', ['photo'], self.music)
+        self.create('far', ['travel'])
+        with mock.patch.object(related, 'load_features', wraps=related.load_features) as load:
+            # base и ссылающаяся на неё same-category
+            self.assertEqual(related.refresh_related([base.pk]), 2)
+        # Признаки статей без общих тегов и категории не читаются
+        features = related.load_features(load.call_args.args[0])
+        self.assertEqual({Article.objects.get(pk=pk).slug for pk in features},
+                         {'base', 'same-category'})
+        self.assertEqual(self.related(base), ['same-category'])
+
+    def test_python_and_scipy_agree(self):
+        import random
+        rng = random.Random(1)
+        features = {
+            pk: {('t', rng.randrange(20)): 1.0 for _ in range(rng.randrange(1, 5))}
+            for pk in range(1, 200)
+        }
+        for pk in range(1, 200, 3):
+            features[pk][('c', pk % 4)] = 0.5
+        expected = related.similar_python(features, list(features), 5)
+        if related.sparse is None:
+            self.skipTest('SciPy не установлен')
+        actual = related.similar_scipy(features, list(features), 5)
+        self.assertEqual(expected.keys(), actual.keys())
+        for pk in expected:
+            self.assertEqual([o for o, _ in actual[pk]], [o for o, _ in expected[pk]])
+
+    def test_detail_page_uses_one_query_and_falls_back(self):
+        base = self.create('base', ['synth'])
+        self.assertEqual(self.client.get(base.get_absolute_url()).status_code, 200)
+        self.create('newest', ['photo'])
+        self.assertEqual([a.slug for a in related.related_articles(base)], ['newest'])
+
+        self.create('similar', ['synth'])
+        with self.assertNumQueries(1):
+            self.assertEqual([a.slug for a in related.related_articles(base)], ['similar'])
+        self.assertContains(self.client.get(base.get_absolute_url()), 'similar')
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        sidebar_cache.clear_local()
+        self.user = User.objects.create_user('tree')
+        self.art = Category.objects.create(name='Искусство', slug='art')
+        self.music = Category.objects.create(name='Музыка', slug='music', parent=self.art)
+        self.synth = Category.objects.create(name='Синтез', slug='synth', parent=self.music)
+        self.photo = Category.objects.create(name='Фото', slug='photo')
+
+    def links(self):
+        return set(CategoryClosure.objects.values_list(
+            'ancestor__slug', 'descendant__slug', 'depth'))
+
+    def test_closure_follows_moves_and_deletes(self):
+        self.assertIn(('art', 'synth', 2), self.links())
+
+        self.music.parent = self.photo
+        self.music.save()
+        links = self.links()
+        self.assertIn(('photo', 'synth', 2), links)
+        self.assertNotIn(('art', 'synth', 2), links)
+        # Инкрементальные правки совпадают с полным пересчётом
+        call_command('rebuild_category_tree', stdout=StringIO())
+        self.assertEqual(self.links(), links)
+
+        self.music.delete()
+        self.assertEqual(self.links(), {('art', 'art', 0), ('photo', 'photo', 0)})
+
+    def test_cannot_move_under_own_descendant(self):
+        self.art.parent = self.synth
+        with self.assertRaises(ValidationError):
+            self.art.full_clean()
+        with self.assertRaises(ValueError):
+            self.art.save()
+        self.assertIn(('art', 'synth', 2), self.links())
+
+    def test_subtree_articles_and_breadcrumbs(self):
+        Article.objects.create(title='Осцилляторы', slug='osc', content='Текст',
+                               author=self.user, category=self.synth, status='published')
+        response = self.client.get(reverse('blog:category_detail', args=['art']))
+        self.assertContains(response, 'Осцилляторы')
+        self.assertEqual([c.slug for c in response.context['breadcrumbs']], ['art'])
+
+        with self.assertNumQueries(1):
+            path = category_tree.breadcrumbs(self.synth)
+        self.assertEqual([c.slug for c in path], ['art', 'music', 'synth'])
+        response = self.client.get(reverse('blog:article_detail', args=['osc']))
+        self.assertContains(response, reverse('blog:category_detail', args=['music']))
+
+    def test_tree_is_built_once_and_cached(self):
+        with self.assertNumQueries(1):
+            roots = category_tree.get_category_tree()
+        self.assertEqual([root.slug for root in roots], ['art', 'photo'])
+        self.assertEqual(roots[0].child_nodes[0].child_nodes[0].depth, 2)
+        with self.assertNumQueries(0):
+            html = category_tree.render_category_tree()
+        self.assertIn('Синтез', html)
+
+        Category.objects.create(name='Видео', slug='video', parent=self.photo)
+        self.assertIn('Видео', category_tree.render_category_tree())
+        response = self.client.get(reverse('blog:category_list'))
+        self.assertContains(response, 'Видео')
+
+
+class ArticleTransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('writer')
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write_jsonl(self, name, records):
+        path = f'{self.tmp}/{name}'
+        with open(path, 'w', encoding='utf-8') as stream:
+            transfer.write_jsonl(records, stream)
+        return path
+
+    def import_(self, *args):
+        call_command('import_articles', *args, '--workers', '0', '--author', 'writer',
+                     stdout=StringIO())
+
+    def assertCountersConsistent(self):
+        articles, categories = find_mismatches()
+        self.assertFalse(categories.exists())
+        self.assertEqual(find_tag_mismatches(), [])
+
+    def test_import_creates_and_updates_by_slug(self):
+        path = self.write_jsonl('articles.jsonl', [
+            {'slug': 'one', 'title': 'Первая', 'content': '# Один', 'status': 'published',
+             'category': 'synth', 'category_name': 'Синтез', 'tags': ['звук', 'модуляр']},
+            {'slug': 'two', 'title': 'Вторая', 'content': 'Текст', 'tags': 'звук, шум'},
+        ])
+        self.import_(path, '--batch-size', '1')
+        one = Article.objects.get(slug='one')
+        self.assertIn('<h1>Один</h1>', one.content_html)
+        self.assertEqual(one.category.name, 'Синтез')
+        self.assertEqual(sorted(one.tags.names()), ['звук', 'модуляр'])
+        self.assertEqual(Article.objects.get(slug='two').status, 'draft')
+        self.assertEqual(category_tree.breadcrumbs(one.category), [one.category])
+        self.assertCountersConsistent()
+        self.assertEqual(search_articles(Article.objects.all(), 'Первая').get(), one)
+
+        path = self.write_jsonl('update.jsonl', [
+            {'slug': 'one', 'title': 'Первая', 'content': '# Один', 'status': 'draft',
+             'tags': ['звук']},
+            {'slug': 'two', 'title': 'Вторая', 'content': '*Новый*', 'status': 'published',
+             'tags': ['шум']},
+        ])
+        with mock.patch.object(transfer, 'markdown_to_html',
+                               wraps=transfer.markdown_to_html) as md:
+            self.import_(path)
+        # Перерисована только статья с новым содержанием
+        md.assert_called_once_with('*Новый*')
+        self.assertEqual(Article.objects.count(), 2)
+        self.assertEqual(list(Article.objects.get(slug='one').tags.names()), ['звук'])
+        self.assertIn('<em>Новый</em>', Article.objects.get(slug='two').content_html)
+        self.assertCountersConsistent()
+
+    def test_import_schedules_covers_for_new_files(self):
+        Article.objects.create(title='Старая', slug='old', content='x', author=self.user,
+                               cover_image='articles/covers/old.jpg',
+                               cover_derivatives={'source': 'articles/covers/old.jpg'})
+        path = self.write_jsonl('covers.jsonl', [
+            {'slug': 'old', 'title': 'Старая', 'content': 'x',
+             'cover_image': 'articles/covers/new.jpg'},
+            {'slug': 'new', 'title': 'Новая', 'content': 'x',
+             'cover_image': 'articles/covers/other.jpg'},
+            {'slug': 'plain', 'title': 'Без обложки', 'content': 'x'},
+        ])
+        with mock.patch('uch.apps.core.background.run_task_on_commit') as run:
+            self.import_(path)
+        scheduled = {Article.objects.get(pk=args[1]).slug for args, _ in run.call_args_list
+                     if args[0].__name__ == 'generate_covers_task'}
+        self.assertEqual(scheduled, {'old', 'new'})
+        self.assertEqual(Article.objects.get(slug='old').cover_derivatives, {})
+
+        # Производные готовы — повторный импорт тех же обложек их не трогает
+        for article in Article.objects.exclude(cover_image=''):
+            Article.objects.filter(pk=article.pk).update(
+                cover_derivatives={'source': article.cover_image.name})
+        with mock.patch('uch.apps.core.background.run_task_on_commit') as run:
+            self.import_(path)
+        self.assertFalse([args for args, _ in run.call_args_list
+                          if args[0].__name__ == 'generate_covers_task'])
+
+    def test_export_round_trip_jsonl_and_markdown(self):
+        category = Category.objects.create(name='Фото', slug='photo')
+        article = Article.objects.create(
+            title='Плёнка', slug='film', content='---\nтекст\n', author=self.user,
+            category=category, status='published', excerpt='Коротко')
+        article.tags.add('аналог', 'фото')
+
+        jsonl = f'{self.tmp}/export.jsonl'
+        call_command('export_articles', jsonl, stdout=StringIO())
+        call_command('export_articles', f'{self.tmp}/md', '--format', 'markdown',
+                     stdout=StringIO())
+        with open(jsonl, encoding='utf-8') as stream:
+            [record] = transfer.read_jsonl(stream)
+        self.assertEqual(record['tags'], ['аналог', 'фото'])
+        self.assertEqual(record['author'], 'writer')
+        self.assertEqual(list(transfer.read_markdown(f'{self.tmp}/md')), [record])
+
+        Article.objects.all().delete()
+        self.import_(f'{self.tmp}/md')
+        article = Article.objects.get(slug='film')
+        self.assertEqual((article.content, article.category, article.excerpt),
+                         ('---\nтекст\n', category, 'Коротко'))
+        self.assertEqual(sorted(article.tags.names()), ['аналог', 'фото'])
+        self.assertCountersConsistent()
+
+    def test_hand_written_front_matter(self):
+        record = transfer.parse_markdown('---\ntitle: Привет, мир\ntags: a, b\n---\nТекст',
+                                         slug='hello')
+        self.assertEqual(record, {'title': 'Привет, мир', 'tags': 'a, b',
+                                  'content': 'Текст', 'slug': 'hello'})
+        self.assertEqual(transfer.clean_record(record)['tags'], ['a', 'b'])
+
+    def test_import_resumes_after_failed_batch(self):
+        records = [{'slug': f'a{i}', 'title': f'Статья {i}', 'content': 'x'} for i in range(4)]
+        records[2]['status'] = 'unknown'
+        path = self.write_jsonl('broken.jsonl', records)
+        with self.assertRaises(CommandError):
+            self.import_(path, '--batch-size', '2')
+        # Первая пачка записана, вторая откатилась целиком
+        self.assertEqual(sorted(Article.objects.values_list('slug', flat=True)), ['a0', 'a1'])
+        with open(f'{path}.progress') as stream:
+            self.assertIn('"done": 2', stream.read())
+
+        records[2]['status'] = 'draft'
+        self.write_jsonl('broken.jsonl', records)
+        Article.objects.filter(slug='a0').delete()
+        self.import_(path, '--batch-size', '2')
+        # Уже записанные записи пропущены
+        self.assertEqual(sorted(Article.objects.values_list('slug', flat=True)),
+                         ['a1', 'a2', 'a3'])
+        self.assertFalse(os.path.exists(f'{path}.progress'))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        benchmark.clear_caches()
+        self.user = User.objects.create_user('reader')
+        # Вошедшим страница целиком не кэшируется — только фрагменты
+        self.client.force_login(self.user)
+        self.articles = []
+        for i in range(3):
+            article = Article.objects.create(
+                title=f'Статья {i}', slug=f'a{i}', content=f'Текст **{i}**', author=self.user,
+                status='published', published_at=timezone.now() + timedelta(minutes=i),
+            )
+            article.tags.add(f'тег{i}')
+            self.articles.append(article)
+
+    def get(self, path):
+        with mock.patch.object(fragments, 'render_card', wraps=fragments.render_card) as render, \
+                mock.patch.object(fragments.cache, 'get_many',
+                                  wraps=fragments.cache.get_many) as get_many, \
+                CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        tag_queries = [query for query in captured if 'taggit_tag' in query['sql']
+                       and 'blog_tagstat' not in query['sql']]
+        return response, render.call_count, get_many.call_count, len(tag_queries)
+
+    def test_cards_are_rendered_once(self):
+        response, rendered, get_many, _ = self.get('/articles/')
+        self.assertEqual((rendered, get_many), (3, 1))
+        response, rendered, get_many, tag_queries = self.get('/articles/')
+        self.assertEqual((rendered, get_many, tag_queries), (0, 1, 0))
+        self.assertContains(response, 'тег2')
+
+    def test_changed_article_is_rerendered_alone(self):
+        self.get('/articles/')
+        article = Article.objects.get(slug='a1')
+        article.title = 'Новый заголовок'
+        article.save()
+        response, rendered, _, _ = self.get('/articles/')
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Новый заголовок')
+
+    def test_tag_and_category_changes_invalidate_cards(self):
+        self.get('/articles/')
+        self.articles[0].tags.add('новинка')
+        response, rendered, _, _ = self.get('/articles/')
+        self.assertEqual(rendered, 3)
+        self.assertContains(response, 'новинка')
+
+        category = Category.objects.create(name='Звук', slug='sound')
+        Article.objects.filter(pk=self.articles[0].pk).update(category=category)
+        category.name = 'Звукозапись'
+        category.save()
+        self.assertContains(self.client.get('/articles/'), 'Звукозапись')
+
+    def test_first_card_cover_is_eager(self):
+        version = fragment_cache.get_version()
+        eager = fragments.card_key(self.articles[0], 'list', False, version)
+        lazy = fragments.card_key(self.articles[0], 'list', True, version)
+        self.assertNotEqual(eager, lazy)
+
+    def test_search_results_are_not_cached(self):
+        self.get('/articles/?q=Статья')
+        _, rendered, _, _ = self.get('/articles/?q=Статья')
+        self.assertEqual(rendered, 3)
+
+    def test_article_body_is_cached(self):
+        response, _, _, tag_queries = self.get('/articles/a1/')
+        self.assertEqual(tag_queries, 1)
+        self.assertContains(response, '<strong>1</strong>', html=True)
+        response, _, _, tag_queries = self.get('/articles/a1/')
+        self.assertEqual(tag_queries, 0)
+        self.assertContains(response, 'тег1')
+
+        article = Article.objects.get(slug='a1')
+        article.content = 'Новый текст'
+        article.save()
+        self.assertContains(self.client.get('/articles/a1/'), 'Новый текст')
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_replica_reads_are_not_cached(self):
+        # Реплика может отставать от версии кэша: фрагменты не сохраняются
+        self.get('/articles/')
+        _, rendered, _, _ = self.get('/articles/')
+        self.assertEqual(rendered, 3)
+        self.get('/articles/a1/')
+        _, _, _, tag_queries = self.get('/articles/a1/')
+        self.assertEqual(tag_queries, 1)
+
+        # Промах кэша страниц для анонимов читает из основной БД и сохраняется
+        self.client.logout()
+        seen = []
+
+        def db_for_read(router, model, **hints):
+            seen.append(routers.replica_reads())
+            return 'default'
+
+        with mock.patch.object(routers.PrimaryReplicaRouter, 'db_for_read', autospec=True,
+                               side_effect=db_for_read):
+            self.client.get('/articles/a1/')
+        self.assertTrue(seen)
+        self.assertFalse(any(seen))
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get('/articles/a1/'), 'тег1')
+
+
+class ArticleQuerySetTests(TestCase):
+    def setUp(self):
+        benchmark.clear_caches()
+        author = User.objects.create_user('lean')
+        start = timezone.now()
+        for i, status in enumerate(['published', 'draft', 'published', 'published']):
+            Article.objects.create(
+                title=f'Статья {i}', slug=f'a{i}', content='Длинный текст ' * 50,
+                author=author, status=status, published_at=start + timedelta(days=i),
+            )
+
+    def selected_columns(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return ' '.join(query['sql'] for query in captured
+                        if query['sql'].startswith('SELECT "blog_article"'))
+
+    def test_lists_skip_text_columns(self):
+        for path in ['/', '/articles/', '/categories/']:
+            with self.subTest(path):
+                benchmark.clear_caches()
+                sql = self.selected_columns(path)
+                self.assertIn('"blog_article"."title"', sql)
+                self.assertNotIn('"blog_article"."content"', sql)
+                self.assertNotIn('"blog_article"."content_html"', sql)
+
+    def test_detail_skips_markdown_source(self):
+        sql = self.selected_columns('/articles/a2/')
+        self.assertIn('"blog_article"."content_html"', sql)
+        self.assertNotIn('"blog_article"."content",', sql)
+
+    def test_adjacent_links_skip_drafts(self):
+        response = self.client.get('/articles/a2/')
+        self.assertEqual(response.context['previous_article'].slug, 'a0')
+        self.assertEqual(response.context['next_article'].slug, 'a3')
+        self.assertContains(response, '/articles/a0/')
+        self.assertIsNone(self.client.get('/articles/a3/').context['next_article'])
+
+    def test_sidebar_articles_are_links(self):
+        latest = get_sidebar_data()['latest_articles']
+        self.assertEqual(latest[0].get_deferred_fields() & {'content', 'content_html'},
+                         {'content', 'content_html'})
+
+
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    """Горячие запросы публичных страниц идут по индексам, без сортировки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('planner')
+        cls.root = Category.objects.create(name='Музыка', slug='music')
+        child = Category.objects.create(name='Синтез', slug='synth', parent=cls.root)
+        for i in range(6):
+            article = Article.objects.create(
+                title=f'Статья {i}', slug=f'a{i}', content='Текст', author=author,
+                category=cls.root if i % 2 else child, is_featured=i < 2,
+                status='published' if i < 5 else 'draft',
+            )
+            Comment.objects.create(article=article, author=author, content='Да', is_approved=True)
+        cls.article = Article.objects.get(slug='a3')
+
+    def test_article_lists(self):
+        published = Article.objects.published()
+        self.assertIndexedPlans(published.for_cards()[:10])
+        self.assertIndexedPlans(published.filter(is_featured=True).for_cards()[:3])
+        self.assertIndexedPlans(published.for_links().order_by('-created_at')[:5])
+        self.assertIndexedPlans(lambda: CursorPaginator(published.for_cards(), 2).page())
+
+    def test_category_articles(self):
+        # Поддерево — несколько диапазонов индекса, их приходится сливать сортировкой
+        self.assertIndexedPlans(category_tree.in_subtree(Article.objects.published(), self.root)[:10],
+                                allow_sort=True)
+
+    def test_article_page(self):
+        previous, following = adjacent_articles(self.article)
+        self.assertIndexedPlans(lambda: (previous.first(), following.first()))
+        self.assertIndexedPlans(lambda: load_comment_tree(self.article))
+
+    def test_last_modified(self):
+        self.assertIndexedPlans(lambda: page_cache.blog_last_modified(None))
+        self.assertIndexedPlans(lambda: page_cache.article_last_modified(None, 'a3'))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.generate_dataset(articles=30, categories=6, tags=12, comments=60, authors=3)
+
+    def setUp(self):
+        benchmark.clear_caches()
+
+    def run_targets(self):
+        return benchmark.run_benchmark(repeat=1)
+
+    def test_pages_stay_within_query_budget(self):
+        results = self.run_targets()
+        self.assertEqual(set(results), set(benchmark.QUERY_BUDGETS))
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['queries'], result['budget'])
+
+    def test_query_count_does_not_grow_with_data(self):
+        before = {name: result['queries'] for name, result in self.run_targets().items()}
+        benchmark.generate_dataset(articles=60, categories=9, tags=24, comments=300, authors=6)
+        benchmark.clear_caches()
+        after = {name: result['queries'] for name, result in self.run_targets().items()}
+        self.assertEqual(after, before)
+
+    def test_dataset_is_deterministic(self):
+        first = list(benchmark.article_records(50, 5, 10, 3, seed=7))
+        self.assertEqual(list(benchmark.article_records(50, 5, 10, 3, seed=7)), first)
+        # Выборка меньшего размера — начало большей
+        self.assertEqual(list(benchmark.article_records(20, 5, 10, 3, seed=7)), first[:20])
+        self.assertNotEqual(list(benchmark.article_records(20, 5, 10, 3, seed=8)), first[:20])
+
+    def test_report_round_trip_and_comparison(self):
+        path = f'{tempfile.mkdtemp()}/report.json'
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('benchmark_blog', '--repeat', '1', '--output', path,
+                     '--check-budgets', stdout=StringIO())
+        with open(path, encoding='utf-8') as stream:
+            report = json.load(stream)
+        self.assertEqual(report['dataset']['articles'], 30)
+        self.assertEqual(report['results']['home']['budget'], benchmark.QUERY_BUDGETS['home'])
+
+        slower = json.loads(json.dumps(report))
+        slower['results']['home']['p50_ms'] = report['results']['home']['p50_ms'] * 2
+        rows = {row[0]: row for row in benchmark.compare_reports(report, slower)}
+        self.assertEqual(rows['home'][3], 100.0)
+        out = StringIO()
+        call_command('benchmark_blog', '--repeat', '1', '--compare', path, stdout=out)
+        self.assertIn('Сравнение', out.getvalue())
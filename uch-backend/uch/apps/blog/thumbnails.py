@@ -0,0 +1,235 @@
+# uch/apps/blog/thumbnails.py
+"""
+Превью изображений MediaItem.
+
+Результат записывается в ``metadata['thumbnails']``::
+
+    {'source': <имя исходного файла>, 'width': ..., 'height': ...,
+     'sizes': {'small': {'name': ..., 'width': ..., 'height': ...,
+                         'format': 'WEBP', 'signature': ...}, ...}}
+
+Каждый размер подписан хэшем своих настроек: повторный запуск
+досоздаёт только отсутствующие или изменившиеся размеры, а после замены
+исходного файла перегенерирует всё. ``render_thumbnails`` — чистая функция
+без Django (её выполняет пул процессов).
+"""
+import hashlib
+import io
+import logging
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_VERSION = 1
+ADMIN_SIZE = 'admin'
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+# Ошибки, из-за которых файл помечается битым (повтор не поможет)
+IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+
+def get_specs():
+    from django.conf import settings
+    return {
+        name: {'size': tuple(spec['size']), 'format': spec['format'].upper(),
+               'quality': settings.MEDIA_THUMBNAIL_QUALITY}
+        for name, spec in settings.MEDIA_THUMBNAILS.items()
+    }
+
+
+def spec_signature(spec):
+    raw = f"{THUMBNAIL_VERSION}:{spec['size'][0]}x{spec['size'][1]}:{spec['format']}:{spec['quality']}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:12]
+
+
+def missing_sizes(item, specs=None):
+    """Размеры, которые нужно (пере)создать"""
+    specs = specs or get_specs()
+    record = item.metadata.get('thumbnails') or {}
+    if record.get('source') != item.file.name:
+        return specs
+    if record.get('error'):
+        # Битый файл не пытаемся обработать снова, пока его не заменят
+        return {}
+    done = record.get('sizes', {})
+    return {
+        name: spec for name, spec in specs.items()
+        if done.get(name, {}).get('signature') != spec_signature(spec)
+    }
+
+
+def pending_thumbnails():
+    """Изображения, для которых missing_sizes() не пуст (одним запросом)"""
+    from django.db.models import F, Q
+    from django.db.models.fields.json import KeyTextTransform, KeyTransform
+    from .models import MediaItem
+
+    current = Q()
+    for name, spec in get_specs().items():
+        current &= Q(**{f'metadata__thumbnails__sizes__{name}__signature': spec_signature(spec)})
+    failed = Q(metadata__thumbnails__has_key='error') & ~Q(metadata__thumbnails__error='')
+    images = MediaItem.objects.filter(file_type='image').exclude(file='')
+    # Готовые — положительным условием: у отсутствующего ключа JSON сравнение
+    # даёт NULL, и exclude() по нему потерял бы строку
+    done = images.annotate(
+        thumbnail_source=KeyTextTransform('source', KeyTransform('thumbnails', 'metadata')),
+    ).filter(Q(thumbnail_source=F('file')) & (current | failed))
+    return images.exclude(pk__in=done.values('pk'))
+
+
+def _longest_side(spec):
+    return max(side for side in spec['size'] if side)
+
+
+def render_thumbnails(source, specs):
+    """Создаёт превью из пути к файлу или байтов.
+
+    JPEG декодируется в draft-режиме сразу в уменьшенном масштабе
+    (1/2–1/8), достаточном для самого большого превью. Сторона рамки
+    ``None`` — без ограничения. Возвращает размеры оригинала и
+    {имя: (байты, ширина, высота)}.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    with Image.open(source) as image:
+        width, height = image.size
+        largest = max(_longest_side(spec) for spec in specs.values())
+        # Рамка квадратная: после поворота по EXIF стороны могут поменяться
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        results = {}
+        # От большего к меньшему: каждое следующее уменьшение — из готового
+        for name, spec in sorted(specs.items(), key=lambda kv: -_longest_side(kv[1])):
+            box_width, box_height = spec['size']
+            thumb = image.copy()
+            thumb.thumbnail((box_width or image.width, box_height or image.height),
+                            Image.LANCZOS, reducing_gap=3.0)
+            if spec['format'] == 'JPEG' and thumb.mode == 'RGBA':
+                background = Image.new('RGB', thumb.size, 'white')
+                background.paste(thumb, mask=thumb.getchannel('A'))
+                thumb = background
+
+            buffer = io.BytesIO()
+            thumb.save(buffer, spec['format'], quality=spec['quality'], optimize=True)
+            results[name] = (buffer.getvalue(), thumb.width, thumb.height)
+            image = thumb if thumb.mode == image.mode else image
+    return (width, height), results
+
+
+def file_source(field_file):
+    """Путь к оригиналу для пула процессов (или байты для удалённых хранилищ)"""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        with field_file.open('rb') as f:
+            return f.read()
+
+
+def thumbnail_name(item, name, spec):
+    ext = EXTENSIONS.get(spec['format'], spec['format'].lower())
+    return f'media/thumbnails/{item.pk}/{name}-{spec_signature(spec)}.{ext}'
+
+
+def _update_record(item, update):
+    """Меняет metadata['thumbnails'] под блокировкой строки.
+
+    ``update(record)`` получает запись для текущего файла (старая запись
+    другого файла заменяется пустой, её превью удаляются). Если оригинал
+    заменили во время обработки, возвращает False.
+    """
+    from django.db import transaction
+    from .cache import media_cache
+    from .models import MediaItem
+
+    storage = item.file.storage
+    with transaction.atomic():
+        current = MediaItem.objects.select_for_update().filter(
+            pk=item.pk, file=item.file.name).first()
+        if current is None:
+            return False
+
+        record = current.metadata.get('thumbnails') or {}
+        if record.get('source') != item.file.name:
+            for old in record.get('sizes', {}).values():
+                storage.delete(old['name'])
+            record = {'source': item.file.name, 'sizes': {}}
+        update(record)
+
+        current.metadata['thumbnails'] = record
+        fields = {'metadata': current.metadata}
+        admin = record['sizes'].get(ADMIN_SIZE)
+        fields['thumbnail'] = admin['name'] if admin else None
+        MediaItem.objects.filter(pk=item.pk).update(**fields)
+        media_cache.bump()
+    return True
+
+
+def store_thumbnails(item, specs, original_size, results):
+    """Сохраняет файлы и обновляет metadata, если оригинал не заменили"""
+    from django.core.files.base import ContentFile
+
+    storage = item.file.storage
+    sizes = {}
+    for name, (content, width, height) in results.items():
+        path = thumbnail_name(item, name, specs[name])
+        # Имя детерминированное: остаток прерванного запуска перезаписываем
+        storage.delete(path)
+        sizes[name] = {
+            'name': storage.save(path, ContentFile(content)),
+            'width': width, 'height': height,
+            'format': specs[name]['format'], 'signature': spec_signature(specs[name]),
+        }
+
+    def update(record):
+        record.pop('error', None)
+        record['width'], record['height'] = original_size
+        for name, info in sizes.items():
+            old = record['sizes'].get(name)
+            if old and old['name'] != info['name']:
+                storage.delete(old['name'])
+            record['sizes'][name] = info
+
+    if not _update_record(item, update):
+        # Файл заменили во время обработки — превью уже не нужны
+        for info in sizes.values():
+            storage.delete(info['name'])
+        return False
+    return True
+
+
+def store_error(item, error):
+    return _update_record(item, lambda record: record.update(error=str(error)))
+
+
+def generate_thumbnails(item_id, force=False, pool=None):
+    """Создаёт недостающие превью медиафайла (идемпотентно)"""
+    from uch.apps.core.background import run_cpu
+    from .models import MediaItem
+
+    item = MediaItem.objects.filter(pk=item_id, file_type='image').first()
+    if item is None or not item.file:
+        return False
+
+    specs = get_specs() if force else missing_sizes(item)
+    if not specs:
+        return False
+
+    try:
+        original_size, results = run_cpu(
+            render_thumbnails, file_source(item.file), specs, pool=pool)
+    except IMAGE_ERRORS as e:
+        logger.warning('Не удалось создать превью для %s: %s', item.file.name, e)
+        store_error(item, e)
+        return False
+    return store_thumbnails(item, specs, original_size, results)
+
+
+def schedule_thumbnails(item):
+    from uch.apps.core.background import run_task_on_commit
+    from .tasks import generate_thumbnails_task
+
+    run_task_on_commit(generate_thumbnails_task, item.pk)
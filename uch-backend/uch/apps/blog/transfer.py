@@ -0,0 +1,390 @@
+# uch/apps/blog/transfer.py
+"""
+Массовый импорт и экспорт статей.
+
+Форматы:
+  * JSONL — одна статья на строку;
+  * каталог Markdown — файл ``<slug>.md`` на статью: front matter между
+    строками ``---`` (``ключ: значение``, значения в JSON — подмножество
+    YAML) и текст статьи после него.
+
+Поля записи: slug, title, excerpt, content, status, is_featured,
+allow_comments, author (username), category и category_name, tags
+(список имён), published_at (ISO 8601), cover_image (путь в MEDIA).
+
+Обе стороны потоковые: экспорт читает статьи пачками через iterator(),
+импорт — по одной записи из файла, так что память не зависит от объёма.
+
+Импорт пишет пачками через bulk_create/bulk_update, минуя Article.save():
+Markdown рендерится в пуле процессов, теги назначаются одним INSERT на
+пачку, счётчики категорий и тегов правятся разностями по пачке, там же
+обновляется поисковый индекс, а производные новых обложек ставятся в
+фон после коммита. Статьи сопоставляются по slug, поэтому повторный
+импорт ничего не портит, а прерванный можно продолжить по числу уже
+записанных записей (см. команду ``import_articles``).
+"""
+import json
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from taggit.models import Tag
+
+from .cache import fragment_cache, page_cache, sidebar_cache
+from .counters import adjust_category_count, adjust_tag_counts, article_tags
+from .covers import is_current, schedule_covers
+from .models import Article, Category
+from .rendering import content_hash, markdown_to_html
+from .search import get_search_backend
+
+FRONT_MATTER = '---'
+# Поля, которые переносятся без преобразований
+PLAIN_FIELDS = ('title', 'excerpt', 'content', 'status', 'is_featured', 'allow_comments')
+UPDATE_FIELDS = PLAIN_FIELDS + (
+    'author', 'category', 'published_at', 'updated_at',
+    'cover_image', 'cover_hash', 'cover_derivatives',
+)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Экспорт
+
+def export_records(queryset=None, batch_size=500):
+    """Записи статей по порядку pk; теги — одним запросом на пачку"""
+    queryset = Article.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values(
+        'pk', 'slug', *PLAIN_FIELDS, 'published_at', 'cover_image',
+        'author__username', 'category__slug', 'category__name',
+    ).iterator(chunk_size=batch_size)
+    for batch in batched(rows, batch_size):
+        tags = defaultdict(list)
+        for object_id, name in article_tags().filter(
+                object_id__in=[row['pk'] for row in batch]).order_by(
+                'tag__name').values_list('object_id', 'tag__name'):
+            tags[object_id].append(name)
+        for row in batch:
+            published_at = row['published_at']
+            yield {
+                'slug': row['slug'],
+                **{field: row[field] for field in PLAIN_FIELDS},
+                'author': row['author__username'],
+                'category': row['category__slug'],
+                'category_name': row['category__name'],
+                'tags': tags[row['pk']],
+                'published_at': published_at.isoformat() if published_at else None,
+                'cover_image': row['cover_image'] or '',
+            }
+
+
+def write_jsonl(records, stream):
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def dump_markdown(record):
+    """Markdown с front matter; текст статьи сохраняется байт в байт"""
+    lines = [FRONT_MATTER]
+    lines += [f'{key}: {json.dumps(value, ensure_ascii=False)}'
+              for key, value in record.items() if key != 'content']
+    lines += [FRONT_MATTER, record.get('content') or '']
+    return '\n'.join(lines)
+
+
+def write_markdown(records, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for record in records:
+        (directory / f'{record["slug"]}.md').write_text(dump_markdown(record), encoding='utf-8')
+        count += 1
+    return count
+
+
+# Чтение
+
+def parse_markdown(text, slug=None):
+    """Запись из Markdown с front matter; slug по умолчанию — имя файла"""
+    lines = text.split('\n')
+    record = {}
+    end = None
+    if lines and lines[0].strip() == FRONT_MATTER:
+        end = next((i for i, line in enumerate(lines[1:], 1)
+                    if line.strip() == FRONT_MATTER), None)
+    if end is None:
+        record['content'] = text
+    else:
+        for line in lines[1:end]:
+            key, sep, value = line.partition(':')
+            if not sep or not key.strip():
+                continue
+            value = value.strip()
+            try:
+                record[key.strip()] = json.loads(value)
+            except ValueError:
+                # Написанный вручную front matter: «title: Привет»
+                record[key.strip()] = value
+        record['content'] = '\n'.join(lines[end + 1:])
+    if slug and not record.get('slug'):
+        record['slug'] = slug
+    return record
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ValueError(f'строка {number}: некорректный JSON ({exc})')
+
+
+def read_markdown(directory):
+    for path in sorted(Path(directory).glob('*.md')):
+        yield parse_markdown(path.read_text(encoding='utf-8'), slug=path.stem)
+
+
+# Импорт
+
+def clean_record(record):
+    """Проверенные поля статьи из записи; ValueError при ошибке"""
+    if not isinstance(record, dict):
+        raise ValueError('запись должна быть объектом')
+    title = str(record.get('title') or '').strip()
+    slug = str(record.get('slug') or '').strip() or slugify(title)
+    if not title or not slug:
+        raise ValueError('нужны title и slug')
+    status = record.get('status') or 'draft'
+    if status not in dict(Article.STATUS_CHOICES):
+        raise ValueError(f'{slug}: неизвестный статус {status!r}')
+
+    tags = record.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    tags = list(dict.fromkeys(str(name).strip() for name in tags if str(name).strip()))
+
+    published_at = record.get('published_at')
+    if isinstance(published_at, str):
+        published_at = parse_datetime(published_at)
+        if published_at is None:
+            raise ValueError(f'{slug}: некорректная дата {record["published_at"]!r}')
+    if published_at and timezone.is_naive(published_at):
+        published_at = timezone.make_aware(published_at)
+    if status == 'published' and not published_at:
+        published_at = timezone.now()
+
+    return {
+        'slug': slug,
+        'title': title,
+        'excerpt': record.get('excerpt') or '',
+        'content': record.get('content') or '',
+        'status': status,
+        'is_featured': bool(record.get('is_featured', False)),
+        'allow_comments': bool(record.get('allow_comments', True)),
+        'author': record.get('author') or None,
+        'category': record.get('category') or None,
+        'category_name': record.get('category_name') or None,
+        'tags': tags,
+        'published_at': published_at,
+        'cover_image': record.get('cover_image') or '',
+    }
+
+
+class ArticleImporter:
+    """Пакетный импорт; кэширует id авторов, категорий и тегов между пачками"""
+
+    def __init__(self, default_author=None, workers=0):
+        self.default_author = default_author
+        self.workers = workers
+        self.pool = None
+        if workers:
+            # spawn: дочерние процессы не наследуют открытые соединения с БД
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.authors, self.categories, self.tags = {}, {}, {}
+        self.stats = Counter()
+        self.article_ids = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def render(self, contents):
+        if self.pool is None:
+            return [markdown_to_html(content) for content in contents]
+        chunksize = max(1, len(contents) // (self.workers * 4))
+        return list(self.pool.map(markdown_to_html, contents, chunksize=chunksize))
+
+    def resolve_authors(self, usernames):
+        missing = set(usernames) - self.authors.keys()
+        if missing:
+            self.authors.update(User.objects.filter(username__in=missing)
+                                .values_list('username', 'pk'))
+            unknown = missing - self.authors.keys()
+            if unknown:
+                raise ValueError(f'неизвестные авторы: {", ".join(sorted(unknown))}')
+
+    def resolve_categories(self, names):
+        """names: {slug: название}; недостающие категории создаются"""
+        missing = names.keys() - self.categories.keys()
+        if missing:
+            self.categories.update(Category.objects.filter(slug__in=missing)
+                                   .values_list('slug', 'pk'))
+            for slug in sorted(missing - self.categories.keys()):
+                # Через save(), чтобы обновилась таблица замыкания
+                category = Category(name=names[slug] or slug, slug=slug)
+                category.save()
+                self.categories[slug] = category.pk
+
+    def resolve_tags(self, names):
+        missing = set(names) - self.tags.keys()
+        if not missing:
+            return
+        self.tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+        new = missing - self.tags.keys()
+        if new:
+            Tag.objects.bulk_create([Tag(name=name, slug=Tag().slugify(name)) for name in new],
+                                    ignore_conflicts=True)
+            self.tags.update(Tag.objects.filter(name__in=new).values_list('name', 'pk'))
+            for name in sorted(new - self.tags.keys()):
+                # Slug занят другим тегом — save() подберёт свободный
+                tag = Tag(name=name)
+                tag.save()
+                self.tags[name] = tag.pk
+
+    def import_batch(self, records):
+        """Записывает пачку записей одной транзакцией"""
+        rows = {}
+        for record in records:
+            row = clean_record(record)
+            row['author'] = row['author'] or self.default_author
+            if not row['author']:
+                raise ValueError(f'{row["slug"]}: не указан автор')
+            rows[row['slug']] = row  # при повторе slug побеждает последняя запись
+
+        existing = {
+            row['slug']: row for row in Article.objects.filter(slug__in=rows).values(
+                'pk', 'slug', 'status', 'category_id', 'content_hash',
+                'cover_image', 'cover_hash', 'cover_derivatives')
+        }
+        old_tags = defaultdict(set)
+        for object_id, tag_id in article_tags().filter(
+                object_id__in=[row['pk'] for row in existing.values()]).values_list(
+                'object_id', 'tag_id'):
+            old_tags[object_id].add(tag_id)
+
+        for row in rows.values():
+            row['content_hash'] = content_hash(row['content'])
+        stale = [row for row in rows.values()
+                 if row['content_hash'] != existing.get(row['slug'], {}).get('content_hash')]
+        for row, html in zip(stale, self.render([row['content'] for row in stale])):
+            row['content_html'] = html
+
+        with transaction.atomic():
+            self.resolve_authors({row['author'] for row in rows.values()})
+            self.resolve_categories({row['category']: row['category_name']
+                                     for row in rows.values() if row['category']})
+            self.resolve_tags({name for row in rows.values() for name in row['tags']})
+
+            now = timezone.now()
+            created, updated, rerendered = [], [], []
+            for slug, row in rows.items():
+                old = existing.get(slug)
+                article = Article(
+                    pk=old['pk'] if old else None, slug=slug,
+                    **{field: row[field] for field in PLAIN_FIELDS},
+                    author_id=self.authors[row['author']],
+                    category_id=self.categories.get(row['category']),
+                    published_at=row['published_at'], updated_at=now,
+                    cover_image=row['cover_image'],
+                )
+                if old and old['cover_image'] == row['cover_image']:
+                    article.cover_hash = old['cover_hash']
+                    article.cover_derivatives = old['cover_derivatives']
+                if 'content_html' in row:
+                    article.content_html = row['content_html']
+                    article.content_hash = row['content_hash']
+                if not old:
+                    created.append(article)
+                elif 'content_html' in row:
+                    rerendered.append(article)
+                else:
+                    updated.append(article)
+
+            Article.objects.bulk_create(created)
+            Article.objects.bulk_update(updated, UPDATE_FIELDS)
+            Article.objects.bulk_update(rerendered,
+                                        UPDATE_FIELDS + ('content_html', 'content_hash'))
+            # Не все бэкенды возвращают pk из bulk_create
+            ids = dict(Article.objects.filter(slug__in=rows).values_list('slug', 'pk'))
+            for article in created:
+                article.pk = ids[article.slug]
+
+            self._store_tags(rows, existing, ids, old_tags)
+            self._adjust_counters(rows, existing, ids, old_tags)
+            search = get_search_backend()
+            for article in created + updated + rerendered:
+                search.index_article(article)
+                # Новая обложка (или новая статья с обложкой): производные — после коммита
+                if article.cover_image and not is_current(article):
+                    schedule_covers(article)
+            page_cache.bump()
+            sidebar_cache.bump()
+            fragment_cache.bump()
+
+        self.article_ids.update(ids.values())
+        self.stats.update(created=len(created), updated=len(updated) + len(rerendered),
+                          rendered=len(stale))
+        return len(rows)
+
+    def _store_tags(self, rows, existing, ids, old_tags):
+        TaggedItem = Article.tags.through
+        content_type = ContentType.objects.get_for_model(Article)
+        new_items = []
+        for slug, row in rows.items():
+            pk = ids[slug]
+            wanted = {self.tags[name] for name in row['tags']}
+            removed = old_tags[pk] - wanted if slug in existing else set()
+            if removed:
+                article_tags().filter(object_id=pk, tag_id__in=removed).delete()
+            new_items += [TaggedItem(content_type=content_type, object_id=pk, tag_id=tag_id)
+                          for tag_id in wanted - old_tags[pk]]
+        TaggedItem.objects.bulk_create(new_items, ignore_conflicts=True)
+
+    def _adjust_counters(self, rows, existing, ids, old_tags):
+        """Разности счётчиков по всей пачке вместо UPDATE на каждую статью"""
+        categories, tags = Counter(), Counter()
+        for slug, row in rows.items():
+            old = existing.get(slug)
+            if old and old['status'] == 'published':
+                categories[old['category_id']] -= 1
+                tags.subtract(old_tags[old['pk']])
+            if row['status'] == 'published':
+                categories[self.categories.get(row['category'])] += 1
+                tags.update(self.tags[name] for name in row['tags'])
+        for category_id, delta in categories.items():
+            adjust_category_count(category_id, delta)
+        by_delta = defaultdict(list)
+        for tag_id, delta in tags.items():
+            if delta:
+                by_delta[delta].append(tag_id)
+        for delta, tag_ids in by_delta.items():
+            adjust_tag_counts(tag_ids, delta)
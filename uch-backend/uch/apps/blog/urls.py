@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'blog'
 
+if getattr(settings, 'BLOG_ASYNC_VIEWS', False):
+    # Под ASGI: асинхронный ORM без переходов в поток на каждый запрос
+    from . import async_views
+    home_view = async_views.home_view
+    article_list_view = async_views.article_list_view
+    article_detail_view = async_views.article_detail_view
+else:
+    home_view = views.home_view
+    article_list_view = views.ArticleListView.as_view()
+    article_detail_view = views.ArticleDetailView.as_view()
+
 urlpatterns = [
-    path('', views.home_view, name='home'),
-    path('articles/', views.ArticleListView.as_view(), name='article_list'),
-    path('articles/<slug:slug>/', views.ArticleDetailView.as_view(), name='article_detail'),
-    path('category/<slug:category_slug>/', views.ArticleListView.as_view(), name='category_detail'),
+    path('', home_view, name='home'),
+    path('articles/', article_list_view, name='article_list'),
+    path('articles/<slug:slug>/', article_detail_view, name='article_detail'),
+    path('category/<slug:category_slug>/', article_list_view, name='category_detail'),
     path('categories/', views.CategoryListView.as_view(), name='category_list'),
-]
\ No newline at end of file
+]
@@ -1,11 +1,57 @@
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView
-from django.db import models
+from .category_tree import breadcrumbs, get_category_tree, in_subtree
+from .comments import load_comment_tree
 from .models import Article, Category
-from taggit.models import Tag
+from .page_cache import (
+    article_last_modified, blog_last_modified, category_last_modified, public_page,
+)
+from .pagination import CursorPaginator
+from .related import related_articles
+from .search import search_articles
+from .tags import popular_tags, tag_cloud
 
 
+def filter_articles(request, category=None):
+    """Опубликованные статьи для списка: категория, ?tag=, ?q="""
+    queryset = Article.objects.published()
+    
+    # Фильтрация по категории вместе с подкатегориями
+    if category is not None:
+        queryset = in_subtree(queryset, category)
+    
+    # Фильтрация по тегу
+    tag_slug = request.GET.get('tag')
+    if tag_slug:
+        queryset = queryset.filter(tags__slug=tag_slug)
+    
+    # Поиск (полнотекстовый индекс, сортировка по релевантности)
+    search_query = request.GET.get('q')
+    if search_query:
+        queryset = search_articles(queryset, search_query)
+    
+    return queryset.for_cards()
+
+
+def adjacent_articles(article):
+    """Запросы предыдущей и следующей опубликованных статей (по дате публикации)"""
+    links = Article.objects.published().for_links()
+    published_at, pk = article.published_at, article.pk
+    previous = links.filter(
+        Q(published_at__lt=published_at) | Q(published_at=published_at, pk__lt=pk)
+    ).order_by('-published_at', '-pk')
+    following = links.filter(
+        Q(published_at__gt=published_at) | Q(published_at=published_at, pk__gt=pk)
+    ).order_by('published_at', 'pk')
+    return previous, following
+
+
+@method_decorator(public_page(category_last_modified), name='dispatch')
 class ArticleListView(ListView):
     """Список всех статей с пагинацией"""
     model = Article
@@ -14,44 +60,46 @@ class ArticleListView(ListView):
     paginate_by = 10
     
     def get_queryset(self):
-        queryset = Article.objects.filter(status='published')
-        
-        # Фильтрация по категории
+        self.category = None
         category_slug = self.kwargs.get('category_slug')
         if category_slug:
-            category = get_object_or_404(Category, slug=category_slug)
-            queryset = queryset.filter(category=category)
-        
-        # Фильтрация по тегу
-        tag_slug = self.request.GET.get('tag')
-        if tag_slug:
-            queryset = queryset.filter(tags__slug=tag_slug)
+            self.category = get_object_or_404(Category, slug=category_slug)
+        return filter_articles(self.request, self.category)
+    
+    def use_cursor_pagination(self):
+        """Keyset-пагинация: включается настройкой или параметром ?cursor=.
         
-        # Поиск
-        search_query = self.request.GET.get('q')
-        if search_query:
-            queryset = queryset.filter(
-                models.Q(title__icontains=search_query) |
-                models.Q(content__icontains=search_query) |
-                models.Q(excerpt__icontains=search_query)
-            )
+        Для поиска не используется — там порядок задаёт релевантность.
+        """
+        if self.request.GET.get('q'):
+            return False
+        return (getattr(settings, 'BLOG_CURSOR_PAGINATION', False)
+                or 'cursor' in self.request.GET)
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
         
-        return queryset.select_related('author', 'category').prefetch_related('tags')
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise Http404(f'Неверная страница: {e}')
+        return (paginator, page, page.object_list, page.has_other_pages())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['category'] = self.category
+        context['breadcrumbs'] = breadcrumbs(self.category)
+        context['cursor_pagination'] = isinstance(context['paginator'], CursorPaginator)
         context['categories'] = Category.objects.filter(is_active=True)
-        context['recent_articles'] = Article.objects.filter(status='published')[:5]
-        
-        # Добавляем популярные теги
-        from django.db.models import Count
-        context['popular_tags'] = Tag.objects.annotate(
-            num_times=Count('taggit_taggeditem_items')
-        ).order_by('-num_times')[:10]
+        context['recent_articles'] = Article.objects.published().for_links()[:5]
+        context['popular_tags'] = popular_tags(10)
         
         return context
 
 
+@method_decorator(public_page(article_last_modified), name='dispatch')
 class ArticleDetailView(DetailView):
     """Детальная страница статьи"""
     model = Article
@@ -61,18 +109,33 @@ class ArticleDetailView(DetailView):
     slug_url_kwarg = 'slug'
     
     def get_queryset(self):
-        return Article.objects.filter(status='published')
+        return Article.objects.published().for_detail()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.filter(is_active=True)
-        context['recent_articles'] = Article.objects.filter(status='published').exclude(
-            pk=self.object.pk
-        )[:5]
+        context['category_path'] = breadcrumbs(self.object.category_id)
+        
+        # Соседние статьи (без черновиков и без текста)
+        if self.object.published_at:
+            previous, following = adjacent_articles(self.object)
+            context['previous_article'] = previous.first()
+            context['next_article'] = following.first()
+        
+        # Предрасчитанные похожие статьи (или свежие, пока их нет)
+        context['related_articles'] = related_articles(self.object)
         
         # Добавляем теги текущей статьи
         context['article_tags'] = self.object.tags.all()
         
+        # Ветки комментариев одним запросом
+        if self.object.allow_comments:
+            context['comment_tree'] = load_comment_tree(
+                self.object,
+                include_pending=self.request.user.is_staff,
+                page=self.request.GET.get('comments_page'),
+            )
+        
         return context
 
 
@@ -83,33 +146,30 @@ class CategoryListView(ListView):
     context_object_name = 'categories'
     
     def get_queryset(self):
-        return Category.objects.filter(is_active=True, parent=None)
+        # Корни дерева с подкатегориями (из кэша, без запросов на каждую)
+        return get_category_tree()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['recent_articles'] = Article.objects.filter(status='published')[:5]
+        context['recent_articles'] = Article.objects.published().for_links()[:5]
         return context
 
+@public_page(blog_last_modified)
 def home_view(request):
     """Домашняя страница блога"""
-    featured_articles = Article.objects.filter(
-        status='published', is_featured=True
-    )[:3]
+    published = Article.objects.published()
+    featured_articles = published.filter(is_featured=True).for_cards()[:3]
     
-    recent_articles = Article.objects.filter(status='published')[:6]
+    recent_articles = published.for_cards()[:6]
     categories = Category.objects.filter(is_active=True)[:8]  # Уже есть
     
-    # Популярные теги
-    from django.db.models import Count
-    from taggit.models import Tag
-    popular_tags = Tag.objects.annotate(
-        num_times=Count('taggit_taggeditem_items')
-    ).order_by('-num_times')[:10]
+    # Популярные теги (облако с весами)
+    tags = tag_cloud(10)
     
     context = {
         'featured_articles': featured_articles,
         'recent_articles': recent_articles,
         'categories': categories,  # Это передается
-        'popular_tags': popular_tags,
+        'popular_tags': tags,
     }
     return render(request, 'blog/home.html', context)
\ No newline at end of file
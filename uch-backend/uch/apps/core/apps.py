@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'uch.apps.core'
\ No newline at end of file
+    name = 'uch.apps.core'
+
+    def ready(self):
+        from .database import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='uch_sqlite_pragmas')
@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Повторы при блокировке БД (SQLite) — как autoretry у Celery-задач
+THREAD_RETRIES = 3
+THREAD_RETRY_DELAY = 0.5
+
+_executor = None
+_process_pool = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_THREAD_WORKERS', 4),
+                thread_name_prefix='uch-background',
+            )
+        return _executor
+
+
+def get_process_pool():
+    """Пул процессов для CPU-задач; None — выполнять в текущем процессе.
+
+    Нужен только без Celery: воркер Celery и так отдельный процесс, а
+    пул потоков веб-сервера делит GIL с запросами.
+    """
+    global _process_pool
+    if (getattr(settings, 'BACKGROUND_TASKS_EAGER', False)
+            or getattr(settings, 'CELERY_BROKER_URL', '')):
+        return None
+    with _executor_lock:
+        if _process_pool is None:
+            # spawn: дочерние процессы не наследуют соединения с БД
+            _process_pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_PROCESS_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _process_pool
+
+
+def run_cpu(func, *args, pool=None):
+    """Выполняет чистую функцию в пуле процессов (или на месте)"""
+    pool = pool or get_process_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
+
+
+def _run_in_thread(task, args):
+    for attempt in range(THREAD_RETRIES + 1):
+        close_old_connections()
+        try:
+            return task(*args)
+        except OperationalError:
+            if attempt == THREAD_RETRIES:
+                logger.exception('Фоновая задача %s: БД недоступна', task.name)
+            else:
+                time.sleep(THREAD_RETRY_DELAY * (attempt + 1))
+        except Exception:
+            logger.exception('Фоновая задача %s завершилась с ошибкой', task.name)
+            return None
+        finally:
+            close_old_connections()
+
+
+def run_task(task, *args):
+    """Запускает Celery-задачу в фоне.
+
+    С брокером — через очередь Celery, без брокера — в пуле потоков
+    текущего процесса, в режиме BACKGROUND_TASKS_EAGER — сразу.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        return task(*args)
+    if getattr(settings, 'CELERY_BROKER_URL', ''):
+        return task.delay(*args)
+    return _get_executor().submit(_run_in_thread, task, args)
+
+
+def run_task_on_commit(task, *args):
+    """То же, но после фиксации текущей транзакции"""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        return task(*args)
+    transaction.on_commit(lambda: run_task(task, *args))
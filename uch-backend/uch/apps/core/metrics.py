@@ -0,0 +1,183 @@
+# uch/apps/core/metrics.py
+"""
+Метрики в формате Prometheus: ``/metrics``.
+
+Собираются через prometheus_client:
+  * задержка запросов по имени URL (``blog:home``, ``blog:article_detail``, …)
+    и методу, число ответов по классу статуса;
+  * SQL-запросы, время БД и рендера шаблонов на запрос (замеры
+    ``profiling.RequestProfile``);
+  * длительность рендера Markdown;
+  * попадания и промахи кэшей VersionedCache (доля — в PromQL:
+    ``rate(..{result="miss"}) / rate(..)``);
+  * очередь превью — изображения, для которых превью ещё не созданы
+    (считается запросом к БД при каждом опросе).
+
+Несколько процессов (воркеры gunicorn) пишут значения в файлы каталога
+``PROMETHEUS_MULTIPROC_DIR`` — он задаётся в gunicorn.conf.py, — а
+``/metrics`` любого воркера отдаёт их сумму. Без переменной окружения
+метрики живут в памяти процесса (runserver, тесты).
+
+Без prometheus_client метрики ничего не делают, а ``/metrics`` отвечает 503.
+
+Доступ к ``/metrics`` закрыт по умолчанию: только адреса из
+``METRICS_ALLOWED_IPS`` (локальные) или запросы с заголовком
+``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import hmac
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from asgiref.sync import iscoroutinefunction
+
+from . import profiling
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover - prometheus_client необязателен
+    prometheus_client = None
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNRESOLVED = '<unresolved>'
+
+
+class _NoopMetric:
+    """Заглушка метрики без prometheus_client"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def time(self):
+        return _NoopTimer()
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        'uch_request_duration_seconds', 'Время обработки запроса',
+        ['view', 'method'], buckets=LATENCY_BUCKETS)
+    RESPONSES = Counter(
+        'uch_responses_total', 'Ответы по классу статуса', ['view', 'status'])
+    REQUEST_QUERIES = Histogram(
+        'uch_request_db_queries', 'SQL-запросов на запрос', ['view'], buckets=QUERY_BUCKETS)
+    REQUEST_DB_TIME = Histogram(
+        'uch_request_db_seconds', 'Время в БД на запрос', ['view'], buckets=LATENCY_BUCKETS)
+    REQUEST_TEMPLATE_TIME = Histogram(
+        'uch_request_template_seconds', 'Рендер шаблонов на запрос',
+        ['view'], buckets=LATENCY_BUCKETS)
+    MARKDOWN_RENDER = Histogram(
+        'uch_markdown_render_seconds', 'Рендер Markdown одной статьи', buckets=LATENCY_BUCKETS)
+    CACHE_REQUESTS = Counter(
+        'uch_cache_requests_total', 'Обращения к кэшу', ['cache', 'result'])
+else:  # pragma: no cover
+    REQUEST_LATENCY = RESPONSES = REQUEST_QUERIES = REQUEST_DB_TIME = _NoopMetric()
+    REQUEST_TEMPLATE_TIME = MARKDOWN_RENDER = CACHE_REQUESTS = _NoopMetric()
+
+
+def view_name(request):
+    """Имя URL как метка: число значений ограничено числом маршрутов"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+def record_request(request, response, profile, started):
+    view = view_name(request)
+    REQUEST_LATENCY.labels(view, request.method).observe(time.perf_counter() - started)
+    RESPONSES.labels(view, f'{response.status_code // 100}xx').inc()
+    REQUEST_QUERIES.labels(view).observe(profile.queries)
+    REQUEST_DB_TIME.labels(view).observe(profile.db_time)
+    REQUEST_TEMPLATE_TIME.labels(view).observe(profile.template_time)
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    if prometheus_client is None or not getattr(settings, 'METRICS_ENABLED', True):
+        raise MiddlewareNotUsed
+    profiling.install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            profile, token = profiling.begin_profile()
+            try:
+                response = await get_response(request)
+            finally:
+                profiling.end_profile(token)
+            record_request(request, response, profile, started)
+            return response
+        return middleware
+
+    def middleware(request):
+        started = time.perf_counter()
+        profile, token = profiling.begin_profile()
+        try:
+            response = get_response(request)
+        finally:
+            profiling.end_profile(token)
+        record_request(request, response, profile, started)
+        return response
+    return middleware
+
+
+class BacklogCollector:
+    """Значения, которые считаются при опросе (одни на все процессы)"""
+
+    def collect(self):
+        from uch.apps.blog.thumbnails import pending_thumbnails
+
+        yield GaugeMetricFamily(
+            'uch_thumbnail_queue_depth', 'Изображения без актуальных превью',
+            value=pending_thumbnails().count())
+
+
+def generate():
+    """Текст метрик: все процессы (multiprocess) или текущий"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    backlog = prometheus_client.CollectorRegistry()
+    backlog.register(BacklogCollector())
+    return prometheus_client.generate_latest(registry) + prometheus_client.generate_latest(backlog)
+
+
+def can_scrape(request):
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', []):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def metrics_view(request):
+    if not can_scrape(request):
+        raise PermissionDenied
+    if prometheus_client is None:
+        return HttpResponse('prometheus_client не установлен', status=503,
+                            content_type='text/plain; charset=utf-8')
+    return HttpResponse(generate(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,317 @@
+# uch/apps/core/profiling.py
+"""
+Профилирование запросов: ``ProfilingMiddleware``.
+
+Для каждого запроса собирается:
+  * число SQL-запросов, время в БД и повторы (одинаковый SQL с одинаковыми
+    параметрами — лишний запрос; одинаковый SQL с разными — признак N+1);
+  * время рендера шаблонов (только внешних — include не считается дважды);
+  * время контекстных процессоров, по каждому отдельно;
+  * участки, размеченные ``timed('имя')`` (например, Markdown).
+
+Итог уходит в заголовок ``Server-Timing`` (виден во вкладке Network
+браузера), медленные запросы (``PROFILING_SLOW_REQUEST_MS``) пишутся в
+лог ``uch.profiling`` одной JSON-строкой. Доля ``PROFILING_SAMPLE_RATE``
+синхронных запросов выполняется под cProfile (или pyinstrument, если он
+установлен и выбран), и профиль медленных из них сохраняется в
+``PROFILING_DIR``.
+
+Замеры привязаны к запросу через contextvar, поэтому работают и в
+асинхронных представлениях: asgiref переносит контекст в потоки
+sync_to_async. Вне запроса обёртки ничего не делают.
+"""
+import cProfile
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.utils import CursorWrapper
+from django.template import engines
+from django.template.base import Template
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - pyinstrument необязателен
+    pyinstrument = None
+
+logger = logging.getLogger('uch.profiling')
+
+_current = ContextVar('request_profile', default=None)
+_installed = False
+
+TOP_DUPLICATES = 5
+SQL_PREVIEW = 200
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()  # (sql, параметры) -> сколько раз
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.processors = defaultdict(float)
+        self.spans = defaultdict(float)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self):
+        """Точные повторы: [(sql, сколько раз)]"""
+        return [(sql, count) for (sql, _), count in self.statements.most_common()
+                if count > 1][:TOP_DUPLICATES]
+
+    def similar(self):
+        """Один SQL с разными параметрами: [(sql, сколько раз)]"""
+        by_sql = Counter()
+        for (sql, _), count in self.statements.items():
+            by_sql[sql] += count
+        return [(sql, count) for sql, count in by_sql.most_common()
+                if count > 1][:TOP_DUPLICATES]
+
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def server_timing(self, total):
+        processors = sum(self.processors.values())
+        metrics = [
+            ('db', self.db_time, f'{self.queries} queries ({self.duplicate_count()} duplicates)'),
+            # Контекстные процессоры выполняются внутри рендера шаблона
+            ('tpl', max(self.template_time - processors, 0), 'templates'),
+            ('cp', processors, 'context processors'),
+            *((name, duration, name) for name, duration in self.spans.items()),
+            ('total', total, 'total'),
+        ]
+        return ', '.join(f'{name};dur={duration * 1000:.1f};desc="{desc}"'
+                         for name, duration, desc in metrics)
+
+    def as_dict(self, request, response, total):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'queries': self.queries,
+            'duplicate_queries': self.duplicate_count(),
+            'template_ms': round(self.template_time * 1000, 1),
+            'context_processors_ms': {
+                name: round(duration * 1000, 1) for name, duration in self.processors.items()},
+            'spans_ms': {name: round(duration * 1000, 1) for name, duration in self.spans.items()},
+            'duplicates': [[sql[:SQL_PREVIEW], count] for sql, count in self.duplicates()],
+            'similar': [[sql[:SQL_PREVIEW], count] for sql, count in self.similar()],
+        }
+
+
+def current_profile():
+    return _current.get()
+
+
+def begin_profile():
+    """Профиль запроса: уже начатый (внешним middleware) или новый.
+
+    Возвращает (профиль, токен); токен передаётся в end_profile().
+    """
+    profile = _current.get()
+    if profile is not None:
+        return profile, None
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def end_profile(token):
+    if token is not None:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Участок кода, который попадёт в Server-Timing под именем name"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - started
+
+
+# Перехватчики
+
+def _timed_cursor_method(method):
+    """CursorWrapper.execute/executemany: на уровне класса, чтобы учитывать
+    соединения всех потоков, в том числе открытые до включения"""
+    @wraps(method)
+    def wrapper(self, sql, params=None):
+        profile = _current.get()
+        if profile is None:
+            return method(self, sql, params)
+        started = time.perf_counter()
+        try:
+            return method(self, sql, params)
+        finally:
+            profile.db_time += time.perf_counter() - started
+            profile.queries += 1
+            profile.statements[(sql, repr(params))] += 1
+    return wrapper
+
+
+def _timed_processor(processor):
+    name = f'{processor.__module__}.{processor.__name__}'
+
+    @wraps(processor)
+    def wrapper(request):
+        profile = _current.get()
+        if profile is None:
+            return processor(request)
+        started = time.perf_counter()
+        try:
+            return processor(request)
+        finally:
+            profile.processors[name] += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def _wrap_template_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+    return wrapper
+
+
+def install():
+    """Ставит перехватчики SQL, шаблонов и контекстных процессоров (один раз)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    # CursorDebugWrapper (DEBUG) вызывает эти методы через super()
+    CursorWrapper.execute = _timed_cursor_method(CursorWrapper.execute)
+    CursorWrapper.executemany = _timed_cursor_method(CursorWrapper.executemany)
+
+    Template.render = _wrap_template_render(Template.render)
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is not None:
+            # cached_property: подменяем уже вычисленный список
+            engine.__dict__['template_context_processors'] = tuple(
+                processor if getattr(processor, 'profiled', False)
+                else _timed_processor(processor)
+                for processor in engine.template_context_processors
+            )
+
+
+# Профили выбросов
+
+def _start_profiler():
+    if getattr(settings, 'PROFILING_PROFILER', 'cprofile') == 'pyinstrument' and pyinstrument:
+        profiler = pyinstrument.Profiler()
+    else:
+        profiler = cProfile.Profile()
+    if isinstance(profiler, cProfile.Profile):
+        profiler.enable()
+    else:
+        profiler.start()
+    return profiler
+
+
+def _save_profile(profiler, request, total):
+    directory = Path(getattr(settings, 'PROFILING_DIR', 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = request.path.strip('/').replace('/', '_')[:60] or 'root'
+    stem = f'{time.strftime("%Y%m%d-%H%M%S")}-{total * 1000:.0f}ms-{slug}'
+    if isinstance(profiler, cProfile.Profile):
+        path = directory / f'{stem}.prof'
+        profiler.dump_stats(path)
+    else:
+        path = directory / f'{stem}.html'
+        path.write_text(profiler.output_html(), encoding='utf-8')
+    return path
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+# Middleware
+
+def _finish(profile, request, response, profiler=None):
+    total = profile.elapsed
+    response['Server-Timing'] = profile.server_timing(total)
+
+    threshold = getattr(settings, 'PROFILING_SLOW_REQUEST_MS', 500) / 1000
+    if total < threshold:
+        return response
+    record = profile.as_dict(request, response, total)
+    if profiler is not None:
+        record['profile'] = str(_save_profile(profiler, request, total))
+    logger.warning('slow request %s', json.dumps(record, ensure_ascii=False),
+                   extra={'profile': record})
+    return response
+
+
+def _sampled():
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    if not getattr(settings, 'PROFILING_ENABLED', False):
+        raise MiddlewareNotUsed
+    install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # cProfile видит только свой поток, а в цикле событий — чужие
+            # запросы, поэтому асинхронные запросы не профилируются
+            profile = RequestProfile()
+            token = _current.set(profile)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(profile, request, response)
+        return middleware
+
+    def middleware(request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = _start_profiler() if _sampled() else None
+        try:
+            response = get_response(request)
+        finally:
+            if profiler is not None:
+                _stop_profiler(profiler)
+            _current.reset(token)
+        return _finish(profile, request, response, profiler)
+    return middleware
@@ -0,0 +1,91 @@
+# uch/apps/core/query_plans.py
+"""
+Проверка планов запросов (EXPLAIN) в тестах.
+
+``capture_statements()`` собирает SQL с параметрами, ``explain()`` возвращает
+план, ``plan_problems()`` — строки плана, означающие полный просмотр
+таблицы или сортировку без индекса:
+  * SQLite: ``SCAN <таблица>`` без индекса и ``USE TEMP B-TREE``;
+  * PostgreSQL: ``Seq Scan`` и узлы ``Sort``. На маленьких тестовых таблицах
+    планировщик и так выберет последовательный просмотр, поэтому он и
+    сортировка отключаются (enable_seqscan/enable_sort) — если они всё равно
+    остались в плане, подходящего индекса нет.
+
+В тестах — через примесь ``QueryPlanAssertions``.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.models import QuerySet
+
+SQLITE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)\S+$')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE')
+POSTGRES_SCAN = re.compile(r'\bSeq Scan on\b')
+POSTGRES_SORT = re.compile(r'(?:^|->\s+)(?:Incremental )?Sort\b')
+
+
+@contextmanager
+def capture_statements(using='default'):
+    """SELECT-запросы блока: [(sql, params)]"""
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(wrapper):
+        yield statements
+
+
+def explain(sql, params=(), using='default'):
+    """Строки плана запроса (для SQLite и PostgreSQL)"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = [row[0] for row in cursor.fetchall()]
+            cursor.execute('RESET enable_seqscan')
+            cursor.execute('RESET enable_sort')
+            return plan
+    return []
+
+
+def plan_problems(plan, vendor='sqlite', allow_sort=False):
+    if vendor == 'sqlite':
+        patterns = (SQLITE_SCAN,) if allow_sort else (SQLITE_SCAN, SQLITE_SORT)
+    else:
+        patterns = (POSTGRES_SCAN,) if allow_sort else (POSTGRES_SCAN, POSTGRES_SORT)
+    return [line for line in plan if any(pattern.search(line.strip()) for pattern in patterns)]
+
+
+class QueryPlanAssertions:
+    """Примесь к TestCase: горячие запросы должны идти по индексам"""
+
+    def assertIndexedPlans(self, action, allow_sort=False, using='default'):
+        """action — queryset или функция, выполняющая запросы.
+
+        allow_sort — сортировка допустима (строки нескольких диапазонов
+        индекса, например статьи поддерева категорий), полный просмотр — нет.
+        """
+        if isinstance(action, QuerySet):
+            queryset, action = action, lambda: list(queryset)
+        with capture_statements(using) as statements:
+            action()
+        self.assertTrue(statements, 'Нет запросов для проверки')
+
+        vendor = connections[using].vendor
+        failures = []
+        for sql, params in statements:
+            plan = explain(sql, params, using)
+            problems = plan_problems(plan, vendor, allow_sort)
+            if problems:
+                failures.append(f'{sql}\n  ' + '\n  '.join(plan))
+        if failures:
+            self.fail('Запросы без индекса:\n\n' + '\n\n'.join(failures))
@@ -0,0 +1,128 @@
+# uch/apps/core/routers.py
+"""
+Чтение с реплик (``DATABASE_REPLICAS``), запись — в основную БД.
+
+На реплику уходят только чтения публичных страниц: ``ReplicaRoutingMiddleware``
+разрешает их для GET/HEAD без входа в админку. Всё остальное — запросы
+с записью, админка, сотрудники, management-команды и фоновые задачи — читает
+из основной БД, как и чтения внутри транзакции.
+
+Read-your-writes: после первой записи запрос до конца читает из основной
+БД, а ответ ставит cookie ``DATABASE_PIN_COOKIE`` на ``DATABASE_PIN_SECONDS``
+— пока реплика догоняет, следующие запросы того же посетителя тоже идут
+в основную БД (например, страница с только что добавленным комментарием).
+
+Версии кэшей страниц и фрагментов увеличиваются по коммиту в основной БД,
+а реплика может ещё отставать. Собранное из её данных нельзя сохранять
+под новой версией (``replica_reads()``): промах кэша страниц читает из
+основной БД (``use_primary()``), а фрагменты с реплики не сохраняются.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.read_replica = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (state is None or not state.use_replica or not replicas()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        state.read_replica = True
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # Дальше в этом запросе читаем то, что записали
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def replica_reads():
+    """Данные этого запроса читались (или будут читаться) с реплики"""
+    state = _routing.get()
+    return state is not None and (state.use_replica or state.read_replica)
+
+
+def use_primary():
+    """Дальше в этом запросе читать из основной БД"""
+    state = _routing.get()
+    if state is not None:
+        state.use_replica = False
+
+
+def pin_cookie():
+    return getattr(settings, 'DATABASE_PIN_COOKIE', 'uch_primary')
+
+
+def can_use_replica(request):
+    # request.user — до выбора реплики: сессия читается из основной БД
+    if request.method not in SAFE_METHODS or pin_cookie() in request.COOKIES:
+        return False
+    if request.path_info.startswith('/admin/'):
+        return False
+    user = getattr(request, 'user', None)
+    return not (user is not None and user.is_staff)
+
+
+def _finish(request, response, state):
+    if state.wrote:
+        response.set_cookie(pin_cookie(), '1', max_age=getattr(settings, 'DATABASE_PIN_SECONDS', 10),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def ReplicaRoutingMiddleware(get_response):
+    if not replicas():
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = RoutingState(await sync_to_async(can_use_replica)(request))
+            token = _routing.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                _routing.reset(token)
+            return _finish(request, response, state)
+        return middleware
+
+    def middleware(request):
+        state = RoutingState(can_use_replica(request))
+        token = _routing.set(state)
+        try:
+            response = get_response(request)
+        finally:
+            _routing.reset(token)
+        return _finish(request, response, state)
+    return middleware
@@ -1,5 +1,12 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.views.decorators.cache import never_cache
 
 def home(request):
     return render(request, 'home.html', {
@@ -8,4 +15,51 @@ def home(request):
     })
 
 def health_check(request):
-    return HttpResponse('OK', status=200)
\ No newline at end of file
+    """Liveness: процесс жив и отвечает (без обращения к БД)"""
+    return HttpResponse('OK', status=200)
+
+
+def _check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def _check_cache():
+    key = f'readiness:{uuid.uuid4().hex}'
+    cache.set(key, key, 10)
+    try:
+        if cache.get(key) != key:
+            raise RuntimeError('значение не прочиталось')
+    finally:
+        cache.delete(key)
+
+
+READINESS_CHECKS = {
+    'database': _check_database,
+    'cache': _check_cache,
+}
+
+
+@never_cache
+def readiness_check(request):
+    """Readiness: время отклика БД и кэша; 503, если что-то недоступно или медленно"""
+    limit = getattr(settings, 'READINESS_MAX_LATENCY_MS', 500)
+    checks = {}
+    for name, check in READINESS_CHECKS.items():
+        started = time.perf_counter()
+        try:
+            check()
+            error = None
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        latency = (time.perf_counter() - started) * 1000
+        if error is None and latency > limit:
+            error = f'отклик дольше {limit} мс'
+        checks[name] = {'ok': error is None, 'latency_ms': round(latency, 2)}
+        if error:
+            checks[name]['error'] = error
+
+    ready = all(check['ok'] for check in checks.values())
+    return JsonResponse({'status': 'ok' if ready else 'unavailable', 'checks': checks},
+                        status=200 if ready else 503)
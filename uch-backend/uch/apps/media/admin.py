@@ -1,3 +1,25 @@
 from django.contrib import admin
+from .models import Blob, UploadSession
 
-# Register your models here.
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'name', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256', 'name')
+    readonly_fields = ('sha256', 'name', 'size', 'ref_count', 'created_at')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        # Файлы удаляются вместе с последним медиафайлом (см. cas.py)
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'owner', 'file_type', 'offset', 'size',
+                    'media_item', 'updated_at')
+    list_filter = ('file_type',)
+    search_fields = ('filename', 'owner__username')
+    readonly_fields = ('owner', 'filename', 'size', 'offset', 'media_item')
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class MediaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'uch.apps.media'
\ No newline at end of file
+    name = 'uch.apps.media'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,91 @@
+# uch/apps/media/cas.py
+"""
+Хранилище с адресацией по содержимому.
+
+Файл лежит по пути ``cas/<sha[:2]>/<sha[2:4]>/<sha><расширение>`` и
+описан строкой Blob со счётчиком ссылок. Одинаковые загрузки получают
+один и тот же Blob. Счётчик меняется в самой БД (``F('ref_count') ± 1``),
+а не записью значения, посчитанного в Python: на SQLite блокировки строк
+нет, и параллельные изменения иначе терялись бы. Файл удаляется после
+фиксации транзакции, в которой счётчик дошёл до нуля, под блокировкой. Поэтому параллельная загрузка того же
+содержимого либо успевает переиспользовать файл, либо кладёт его заново.
+"""
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob
+
+CAS_DIR = 'cas'
+
+
+def blob_prefix(digest):
+    return f'{CAS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def _store(path, name):
+    """Перемещает готовый файл в хранилище под точным именем"""
+    if isinstance(default_storage, FileSystemStorage):
+        target = default_storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Временный каталог — внутри MEDIA_ROOT, переименование атомарно
+        os.replace(path, target)
+    else:
+        default_storage.delete(name)
+        with open(path, 'rb') as f:
+            default_storage.save(name, File(f))
+        os.remove(path)
+
+
+def acquire_blob(digest, path, size, extension=''):
+    """Регистрирует файл path с хэшем digest и берёт на него ссылку.
+
+    Если такое содержимое уже есть, path удаляется. Возвращает (Blob,
+    создан ли новый файл). Вызывать внутри transaction.atomic().
+    """
+    blob = Blob.objects.select_for_update().filter(pk=digest).first()
+    if blob is None:
+        try:
+            with transaction.atomic():
+                blob = Blob.objects.create(
+                    sha256=digest, name=blob_prefix(digest) + extension.lower(), size=size)
+        except IntegrityError:
+            # Тот же файл только что зарегистрировала параллельная загрузка
+            blob = Blob.objects.select_for_update().get(pk=digest)
+
+    if not default_storage.exists(blob.name):
+        _store(path, blob.name)
+        created = True
+    else:
+        os.remove(path)
+        created = False
+
+    Blob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1)
+    blob.refresh_from_db(fields=['ref_count'])
+    return blob, created
+
+
+def release_blob(digest):
+    """Снимает ссылку; файл без ссылок удаляется после фиксации"""
+    with transaction.atomic():
+        Blob.objects.filter(pk=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        # Решение об удалении — по значению в БД после уменьшения
+        remaining = Blob.objects.filter(pk=digest).values_list('ref_count', flat=True).first()
+        if remaining == 0:
+            transaction.on_commit(lambda: delete_unused_blob(digest))
+
+
+def delete_unused_blob(digest):
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=digest, ref_count=0).first()
+        if blob is None:
+            # Пока ждали, файл снова понадобился
+            return False
+        # Файл удаляется до COMMIT, пока строка заблокирована: новая загрузка
+        # того же содержимого дождётся блокировки и положит файл заново
+        default_storage.delete(blob.name)
+        blob.delete()
+    return True
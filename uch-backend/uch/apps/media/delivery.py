@@ -0,0 +1,189 @@
+# uch/apps/media/delivery.py
+"""
+Отдача файлов из MEDIA_ROOT.
+
+Поддерживаются условные запросы и диапазоны (перемотка аудио и видео).
+Файл передаётся через FileResponse: gunicorn и другие WSGI-серверы с
+``wsgi.file_wrapper`` отправляют его через sendfile, без копирования в
+Python. Если задан ``MEDIA_ACCEL_REDIRECT_PREFIX``, тело отдаёт nginx
+(X-Accel-Redirect), а Django только проверяет запрос и ставит заголовки.
+
+Пути с адресацией по содержимому (CAS и производные обложек) никогда не
+меняются и кэшируются навсегда (immutable); ETag файла в CAS — его SHA-256.
+Незавершённые загрузки (``uploads.temp_dir()``) не отдаются никогда.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .cas import CAS_DIR
+from .uploads import temp_dir
+
+READ_BLOCK = 64 * 1024
+# Каталоги, где имя файла определяется его содержимым
+CONTENT_ADDRESSED_PREFIXES = (f'{CAS_DIR}/', 'articles/covers/derived/')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+COMPRESSED_TYPES = {'gzip': 'application/gzip', 'bzip2': 'application/x-bzip',
+                    'xz': 'application/x-xz'}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+SHA256_RE = re.compile(r'[0-9a-f]{64}')
+
+
+class RangeFile:
+    """Часть открытого файла: read() не выходит за length байт.
+
+    fileno() оставлен, чтобы сервер мог отправить часть через sendfile
+    (начиная с текущей позиции и не больше Content-Length). tell/seek
+    нет намеренно: иначе FileResponse посчитает длину до конца файла.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def is_content_addressed(path):
+    return path.startswith(CONTENT_ADDRESSED_PREFIXES)
+
+
+def make_etag(path, stat):
+    if path.startswith(f'{CAS_DIR}/'):
+        match = SHA256_RE.search(path)
+        if match:
+            return f'"{match.group(0)}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) одного диапазона; None — отдать целиком.
+
+    Несколько диапазонов не поддерживаются: по RFC 9110 можно ответить
+    всем файлом. ValueError — диапазон вне файла (416).
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N: последние N байт
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def range_allowed(request, etag, last_modified):
+    """If-Range: диапазон действует, только если файл не изменился"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(last_modified) <= date
+
+
+def set_cache_headers(response, path, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+
+
+def is_private(full_path):
+    """Файл во временном каталоге загрузок (части ещё не принятых файлов)"""
+    private = os.path.realpath(temp_dir())
+    return os.path.commonpath([private, os.path.realpath(full_path)]) == private
+
+
+def serve(request, path):
+    """Ответ на GET/HEAD файла path относительно MEDIA_ROOT"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('Файл не найден')
+    if is_private(full_path):
+        raise Http404('Файл не найден')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+
+    etag = make_etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_cache_headers(response, path, etag, last_modified)
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    # Как в FileResponse: сжатые архивы не помечаем Content-Encoding
+    content_type = COMPRESSED_TYPES.get(encoding, content_type) or 'application/octet-stream'
+
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        # Тело и диапазоны отдаёт nginx из internal-локации
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + path.lstrip('/')
+        set_cache_headers(response, path, etag, last_modified)
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and range_allowed(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            set_cache_headers(response, path, etag, last_modified)
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        file = open(full_path, 'rb')
+        file.seek(start)
+        response = FileResponse(RangeFile(file, length), content_type=content_type)
+        response.block_size = READ_BLOCK
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    set_cache_headers(response, path, etag, last_modified)
+    return response
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from uch.apps.media.cas import delete_unused_blob
+from uch.apps.media.models import Blob, UploadSession
+from uch.apps.media.uploads import cancel_session
+
+
+class Command(BaseCommand):
+    help = ('Удаляет брошенные незавершённые загрузки и файлы CAS без ссылок '
+            '(например, оставшиеся после сбоя)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=48,
+                            help='Возраст брошенной загрузки, часов (по умолчанию 48)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than'])
+        stale = UploadSession.objects.filter(media_item=None, updated_at__lt=cutoff)
+        sessions = 0
+        for session in stale.iterator():
+            cancel_session(session)
+            sessions += 1
+
+        blobs = sum(
+            delete_unused_blob(digest)
+            for digest in Blob.objects.filter(ref_count=0).values_list('pk', flat=True)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {sessions}, файлов без ссылок: {blobs}'
+        ))
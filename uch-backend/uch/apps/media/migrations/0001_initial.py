@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0006_mediaitem_indexed_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('name', models.CharField(max_length=255, verbose_name='Путь в хранилище')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Файл (CAS)',
+                'verbose_name_plural': 'Файлы (CAS)',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('title', models.CharField(blank=True, max_length=200, verbose_name='Название')),
+                ('file_type', models.CharField(choices=[('image', 'Изображение'), ('audio', 'Аудио'), ('video', 'Видео'), ('document', 'Документ'), ('3d', '3D модель')], max_length=20, verbose_name='Тип файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Получено байт')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('media_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='blog.mediaitem', verbose_name='Медиафайл')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Загружает')),
+            ],
+            options={
+                'verbose_name': 'Загрузка',
+                'verbose_name_plural': 'Загрузки',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
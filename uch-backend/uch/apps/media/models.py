@@ -1,3 +1,52 @@
+import uuid
+
+from django.contrib.auth.models import User
 from django.db import models
 
-# Create your models here.
+from uch.apps.blog.models import MediaItem
+
+
+class Blob(models.Model):
+    """Файл в хранилище с адресацией по содержимому (см. cas.py)"""
+    sha256 = models.CharField(max_length=64, primary_key=True, verbose_name="SHA-256")
+    name = models.CharField(max_length=255, verbose_name="Путь в хранилище")
+    size = models.BigIntegerField(verbose_name="Размер")
+    # Число MediaItem, ссылающихся на файл; при нуле файл удаляется
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    
+    class Meta:
+        verbose_name = "Файл (CAS)"
+        verbose_name_plural = "Файлы (CAS)"
+    
+    def __str__(self):
+        return self.name
+
+
+class UploadSession(models.Model):
+    """Загрузка файла частями (см. uploads.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Загружает")
+    filename = models.CharField(max_length=255, verbose_name="Имя файла")
+    title = models.CharField(max_length=200, blank=True, verbose_name="Название")
+    file_type = models.CharField(max_length=20, choices=MediaItem.MEDIA_TYPES,
+                                 verbose_name="Тип файла")
+    size = models.BigIntegerField(verbose_name="Размер")
+    offset = models.BigIntegerField(default=0, verbose_name="Получено байт")
+    media_item = models.ForeignKey(MediaItem, on_delete=models.SET_NULL,
+                                   null=True, blank=True, verbose_name="Медиафайл")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Начата")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлена")
+    
+    class Meta:
+        verbose_name = "Загрузка"
+        verbose_name_plural = "Загрузки"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+    
+    @property
+    def is_complete(self):
+        return self.media_item_id is not None
@@ -0,0 +1,34 @@
+# uch/apps/media/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from uch.apps.blog.models import MediaItem
+
+from .cas import blob_prefix, release_blob
+
+
+@receiver(pre_save, sender=MediaItem)
+def detach_replaced_blob(sender, instance, **kwargs):
+    """Файл заменили обычной загрузкой — общий файл больше не нужен.
+
+    Ссылка снимается только после успешного сохранения (release_replaced_blob):
+    если save() упадёт, медиафайл по-прежнему ссылается на общий файл.
+    """
+    if instance.blob_id and not instance.file.name.startswith(blob_prefix(instance.blob_id)):
+        instance._replaced_blob = instance.blob_id
+        instance.blob = None
+
+
+@receiver(post_save, sender=MediaItem)
+def release_replaced_blob(sender, instance, **kwargs):
+    digest = instance.__dict__.pop('_replaced_blob', None)
+    if digest:
+        transaction.on_commit(lambda: release_blob(digest))
+
+
+@receiver(post_delete, sender=MediaItem)
+def release_deleted_blob(sender, instance, **kwargs):
+    """Снимает ссылку на общий файл удалённого медиафайла"""
+    if instance.blob_id:
+        release_blob(instance.blob_id)
@@ -1,3 +1,231 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from uch.apps.blog.models import MediaItem
+
+from . import uploads
+from .models import Blob, UploadSession
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = self.uploader('uploader')
+        self.client.force_login(self.user)
+
+    def uploader(self, username):
+        user = User.objects.create_user(username)
+        user.user_permissions.add(Permission.objects.get(codename='add_mediaitem'))
+        return user
+
+    def start(self, data, filename='scene.glb'):
+        response = self.client.post(
+            reverse('media:upload_create'),
+            {'filename': filename, 'size': len(data), 'file_type': '3d'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def send(self, upload_id, offset, chunk):
+        return self.client.generic(
+            'PATCH', reverse('media:upload_detail', args=[upload_id]), chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, data, chunk_size=4):
+        upload_id = self.start(data)
+        for offset in range(0, len(data), chunk_size):
+            response = self.send(upload_id, offset, data[offset:offset + chunk_size])
+        self.assertEqual(response.status_code, 201)
+        return MediaItem.objects.get(pk=response.json()['media_item']['id'])
+
+    def test_upload_in_chunks(self):
+        data = b'0123456789abcdef-model'
+        item = self.upload(data)
+        self.assertEqual(item.blob_id, hashlib.sha256(data).hexdigest())
+        self.assertTrue(item.file.name.endswith('.glb'))
+        with item.file.open('rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(uploads.temp_dir()), [])
+
+    def test_resume_after_interruption(self):
+        data = b'x' * 10 + b'y' * 10
+        upload_id = self.start(data)
+        self.send(upload_id, 0, data[:10])
+
+        # Повтор уже принятой части — клиенту сообщают текущее смещение
+        response = self.send(upload_id, 0, data[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '10')
+
+        # Следующая часть пришла в другой процесс: хэш пересчитывается по файлу
+        uploads._hashers.clear()
+        head = self.client.head(reverse('media:upload_detail', args=[upload_id]))
+        response = self.send(upload_id, int(head['Upload-Offset']), data[10:])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['media_item']['sha256'],
+                         hashlib.sha256(data).hexdigest())
+
+    def test_duplicates_share_blob_until_last_delete(self):
+        data = b'same bytes, uploaded twice'
+        first = self.upload(data)
+        second = self.upload(data, chunk_size=100)
+        self.assertEqual(first.file.name, second.file.name)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_chunk_past_declared_size_is_rejected(self):
+        upload_id = self.start(b'abc')
+        self.assertEqual(self.send(upload_id, 0, b'abcdef').status_code, 413)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_uploads_are_private(self):
+        upload_id = self.start(b'abc')
+        self.client.force_login(self.uploader('other'))
+        self.assertEqual(self.send(upload_id, 0, b'abc').status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.send(upload_id, 0, b'abc').status_code, 403)
+
+    def test_parallel_retry_of_same_chunk_is_rejected(self):
+        from django.core.files import locks
+
+        upload_id = self.start(b'abcdef')
+        session = UploadSession.objects.get()
+        # Первая попытка ещё пишет часть (держит блокировку .part)
+        with open(uploads.part_path(session), 'r+b') as f:
+            locks.lock(f, locks.LOCK_EX)
+            response = self.send(upload_id, 0, b'abcdef')
+            locks.unlock(f)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+        self.assertEqual(self.send(upload_id, 0, b'abcdef').status_code, 201)
+
+    def test_replaced_blob_released_only_after_save(self):
+        from django.db.models.signals import pre_save
+
+        item = self.upload(b'shared bytes')
+        blob = Blob.objects.get()
+
+        def fail(sender, instance, **kwargs):
+            raise RuntimeError('save failed')
+
+        pre_save.connect(fail, sender=MediaItem)
+        self.addCleanup(pre_save.disconnect, fail, sender=MediaItem)
+        item.file = ContentFile(b'other', name='other.glb')
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            item.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+        pre_save.disconnect(fail, sender=MediaItem)
+        item = MediaItem.objects.get(pk=item.pk)
+        item.file = ContentFile(b'other', name='other.glb')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_upload_requires_permission(self):
+        self.client.force_login(User.objects.create_user('reader'))
+        response = self.client.post(
+            reverse('media:upload_create'), {'filename': 'a.glb', 'size': 3},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(UploadSession.objects.exists())
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.start(b'abc')
+
+
+class MediaDeliveryTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX='')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.data = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.data).hexdigest()
+        self.cas_name = f'cas/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.mp3'
+        default_storage.save(self.cas_name, ContentFile(self.data))
+        default_storage.save('media/2024/01/01/track.mp3', ContentFile(self.data))
+        self.url = '/media/' + self.cas_name
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_with_immutable_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        plain = self.client.get('/media/media/2024/01/01/track.mp3')
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+                         .status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self.body(response), self.data[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.body(response), self.data[-10:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(self.body(response), self.data[1000:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_if_range_mismatch_returns_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.body(response)), len(self.data))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE=f'"{self.digest}"')
+        self.assertEqual(response.status_code, 206)
+
+    def test_accel_redirect_and_traversal(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.cas_name)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.head(self.url)['Content-Length'], str(len(self.data)))
+
+    def test_partial_uploads_are_not_served(self):
+        default_storage.save('uploads/partial/abc.part', ContentFile(b'secret'))
+        self.assertEqual(self.client.get('/media/uploads/partial/abc.part').status_code, 404)
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get('/media/uploads/partial/abc.part')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,193 @@
+# uch/apps/media/uploads.py
+"""
+Загрузка файлов частями с возобновлением.
+
+Клиент создаёт сессию (имя, размер, тип), затем отправляет части
+PATCH-запросами с заголовком ``Upload-Offset``; после обрыва узнаёт
+текущее смещение через HEAD и продолжает с него. Каждая часть пишется
+прямо в ``<id>.part`` во временном каталоге блоками по 64 КБ, без
+буферизации всей части в памяти, и одновременно добавляется в SHA-256.
+
+Состояние хэша нельзя сохранить в БД, поэтому процесс держит его в
+памяти для недавних сессий. Если часть пришла в другой процесс (или
+после перезапуска), хэш пересчитывается по уже записанному файлу.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+from django.utils import timezone
+
+from uch.apps.blog.models import MediaItem
+
+from .cas import acquire_blob
+from .models import UploadSession
+
+READ_BLOCK = 64 * 1024
+HASHER_CACHE_SIZE = 64
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки; status — HTTP-код ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f'Ожидалось смещение {offset}', status=409)
+        self.offset = offset
+
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def temp_dir():
+    return getattr(settings, 'MEDIA_UPLOAD_TEMP_DIR',
+                   os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial'))
+
+
+def part_path(session):
+    return os.path.join(temp_dir(), f'{session.pk}.part')
+
+
+def _take_hasher(session):
+    """Хэш первых session.offset байт: из памяти процесса или по файлу"""
+    with _hashers_lock:
+        cached = _hashers.pop(session.pk, None)
+    if cached is not None and cached[0] == session.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.offset
+    if remaining:
+        with open(part_path(session), 'rb') as f:
+            while remaining:
+                block = f.read(min(READ_BLOCK, remaining))
+                if not block:
+                    raise UploadError('Часть файла потеряна, начните загрузку заново', 410)
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def _keep_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (session.offset, hasher)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+def create_session(owner, filename, size, file_type, title=''):
+    if file_type not in dict(MediaItem.MEDIA_TYPES):
+        raise UploadError('Неизвестный тип файла')
+    if not filename or size <= 0:
+        raise UploadError('Нужны имя файла и размер')
+    if size > settings.MEDIA_UPLOAD_MAX_SIZE:
+        raise UploadError('Файл слишком большой', status=413)
+
+    session = UploadSession.objects.create(
+        owner=owner, filename=os.path.basename(filename)[:255], size=size,
+        file_type=file_type, title=title[:200],
+    )
+    os.makedirs(temp_dir(), exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def append_chunk(session_id, owner, offset, stream, length):
+    """Дописывает часть из потока stream; возвращает обновлённую сессию.
+
+    Части одной загрузки пишутся строго по очереди: на время записи
+    ``.part`` захватывается блокировкой файла, и параллельный повтор той же
+    части получает 409. Тело читается вне транзакции; новое смещение
+    сохраняется условным UPDATE (``offset`` не изменился с начала записи).
+    Когда получены все байты, файл регистрируется в CAS и создаётся
+    MediaItem (session.media_item).
+    """
+    if length > settings.MEDIA_UPLOAD_CHUNK_SIZE:
+        raise UploadError('Слишком большая часть', status=413)
+
+    session = _get_session(session_id, owner)
+    try:
+        f = open(part_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Часть файла потеряна, начните загрузку заново', 410)
+    with f:
+        if not locks.lock(f, locks.LOCK_EX | locks.LOCK_NB):
+            raise UploadError('Эта часть уже загружается', status=409)
+        # Смещение — уже под блокировкой: предыдущая часть могла только что записаться
+        session = _get_session(session_id, owner)
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+        if offset + length > session.size:
+            raise UploadError('Часть выходит за размер файла', status=413)
+
+        hasher = _take_hasher(session)
+        received = 0
+        # Хвост от оборванной записи, не попавшей в БД, отбрасываем
+        f.truncate(offset)
+        f.seek(offset)
+        while received < length:
+            block = stream.read(min(READ_BLOCK, length - received))
+            if not block:
+                break
+            f.write(block)
+            hasher.update(block)
+            received += len(block)
+        f.flush()
+
+        # Если соединение оборвалось, сохраняем то, что успели получить:
+        # клиент узнает смещение через HEAD и продолжит с него
+        with transaction.atomic():
+            claimed = UploadSession.objects.filter(
+                pk=session.pk, offset=offset, media_item__isnull=True,
+            ).update(offset=offset + received, updated_at=timezone.now())
+            if not claimed:
+                # Загрузку отменили, пока шла запись
+                raise UploadError('Загрузка не найдена', status=404)
+            session.offset = offset + received
+            if session.offset == session.size:
+                session.media_item = _finish(session, hasher.hexdigest())
+                session.save(update_fields=['media_item'])
+        if not session.is_complete:
+            _keep_hasher(session, hasher)
+    return session
+
+
+def _get_session(session_id, owner):
+    session = UploadSession.objects.filter(pk=session_id, owner=owner).first()
+    if session is None:
+        raise UploadError('Загрузка не найдена', status=404)
+    if session.is_complete:
+        raise UploadError('Загрузка уже завершена', status=409)
+    return session
+
+
+def _finish(session, digest):
+    extension = os.path.splitext(session.filename)[1][:10]
+    blob, _ = acquire_blob(digest, part_path(session), session.size, extension)
+    item = MediaItem(
+        title=session.title or session.filename, file_type=session.file_type,
+        uploaded_by=session.owner, blob=blob,
+    )
+    item.file.name = blob.name
+    item.save()
+    return item
+
+
+def cancel_session(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    session.delete()
@@ -1,3 +1,97 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods, require_safe
+
+from . import delivery
+from .models import UploadSession
+from .uploads import OffsetMismatch, UploadError, append_chunk, cancel_session, create_session
+
+
+def _upload_state(session, status=200):
+    data = {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'complete': session.is_complete,
+    }
+    if session.is_complete:
+        item = session.media_item
+        data['media_item'] = {'id': item.pk, 'url': item.file.url, 'sha256': item.blob_id}
+    response = JsonResponse(data, status=status)
+    response['Upload-Offset'] = session.offset
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _error(error):
+    response = JsonResponse({'error': str(error)}, status=error.status)
+    if isinstance(error, OffsetMismatch):
+        response['Upload-Offset'] = error.offset
+    return response
+
+
+def _uploader_required(view):
+    """Загружать медиа (файлы до MEDIA_UPLOAD_MAX_SIZE, которые становятся
+    публичными) могут сотрудники и пользователи с правом blog.add_mediaitem.
+
+    Для JSON-клиентов — 403 вместо перенаправления на страницу входа.
+    """
+    def wrapper(request, *args, **kwargs):
+        user = request.user
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Требуется вход'}, status=403)
+        if not (user.is_staff or user.has_perm('blog.add_mediaitem')):
+            return JsonResponse({'error': 'Нет прав на загрузку'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_http_methods(['POST'])
+@_uploader_required
+def upload_create(request):
+    """Начинает загрузку: {"filename", "size", "file_type", "title"}"""
+    try:
+        data = json.loads(request.body or b'{}')
+        session = create_session(
+            request.user, str(data.get('filename', '')), int(data.get('size', 0)),
+            str(data.get('file_type', '')), str(data.get('title', '')),
+        )
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Неверный запрос'}, status=400)
+    except UploadError as e:
+        return _error(e)
+    return _upload_state(session, status=201)
+
+
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+@_uploader_required
+def upload_detail(request, upload_id):
+    """Состояние (GET/HEAD), очередная часть (PATCH), отмена (DELETE)"""
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Нужны Upload-Offset и Content-Length'}, status=400)
+        try:
+            # Тело читается из потока запроса, а не через request.body
+            session = append_chunk(upload_id, request.user, offset, request, length)
+        except UploadError as e:
+            return _error(e)
+        return _upload_state(session, status=201 if session.is_complete else 200)
+
+    session = get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    if request.method == 'DELETE':
+        if not session.is_complete:
+            cancel_session(session)
+        return HttpResponse(status=204)
+    return _upload_state(session)
+
+
+@require_safe
+def serve_media(request, path):
+    """Файл из MEDIA_ROOT с поддержкой Range и X-Accel-Redirect"""
+    return delivery.serve(request, path)
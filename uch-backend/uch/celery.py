@@ -0,0 +1,16 @@
+"""
+Celery application for uch project.
+
+Воркер запускается командой ``celery -A uch worker`` (см. docker-compose.yml).
+Без брокера (CELERY_BROKER_URL пуст) фоновые задачи выполняются в пуле
+потоков процесса — см. uch.apps.core.background.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uch.settings')
+
+app = Celery('uch')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
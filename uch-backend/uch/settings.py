@@ -6,6 +6,8 @@ Django settings for uch project.
 import os
 from pathlib import Path
 
+from uch.apps.core.database import databases_from_env
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-development-key-change-in-production'
@@ -29,15 +31,19 @@ INSTALLED_APPS = [
     'uch.apps.blog.apps.BlogConfig',
     'uch.apps.users',
     'uch.apps.media',
+    'uch.apps.api',
 ]
 
 MIDDLEWARE = [
+    'uch.apps.core.profiling.ProfilingMiddleware',
+    'uch.apps.core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'uch.apps.core.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,10 +61,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'uch.apps.blog.context_processors.blog_categories',
-                'uch.apps.blog.context_processors.popular_tags',
-                'uch.apps.blog.context_processors.blog_stats',
-                'blog.context_processors.sidebar_data',
+                'uch.apps.blog.context_processors.sidebar_data',
             ],
         },
     },
@@ -67,13 +70,44 @@ TEMPLATES = [
 WSGI_APPLICATION = 'uch.wsgi.application'
 ASGI_APPLICATION = 'uch.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# БД из DATABASE_URL (без него — SQLite рядом с проектом) и реплики из
+# DATABASE_REPLICA_URLS, см. uch.apps.core.database
+DATABASES = databases_from_env(default_url=f'sqlite:///{BASE_DIR / "db.sqlite3"}')
+
+# Публичные страницы читают с реплик, запись и админка — в основную БД;
+# после записи посетитель DATABASE_PIN_SECONDS секунд читает из основной
+DATABASE_ROUTERS = ['uch.apps.core.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_PIN_SECONDS = 10
+
+# Выполняются при каждом подключении к SQLite: WAL, чтобы читатели
+# воркеров gunicorn не ждали писателя, ожидание блокировки вместо ошибки
+# «database is locked», кэш страниц и временные таблицы в памяти
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,  # в КиБ
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
 }
 
+# Кэш: Redis, если задан REDIS_URL, иначе локальная память процесса
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -99,4 +133,69 @@ CORS_ALLOW_ALL_ORIGINS = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Настройки для taggit
-TAGGIT_CASE_INSENSITIVE = True
\ No newline at end of file
+TAGGIT_CASE_INSENSITIVE = True
+
+# Похожие статьи (uch.apps.blog.related): сколько хранить и показывать и
+# вес совпадения категории относительно одного общего тега
+BLOG_RELATED_ARTICLES = 5
+BLOG_RELATED_CATEGORY_WEIGHT = 0.5
+
+# Асинхронные представления блога (главная, список, статья) — для запуска
+# под ASGI-сервером (uvicorn uch.asgi:application). Под WSGI не включать:
+# каждый запрос будет поднимать свой цикл событий
+BLOG_ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# Профилирование запросов (uch.apps.core.profiling): заголовок Server-Timing,
+# лог медленных запросов и профили cProfile (или pyinstrument) для доли
+# запросов, которые оказались медленными. Разбирать: python -m pstats <файл>
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_PROFILER = os.environ.get('PROFILING_PROFILER', 'cprofile')  # или 'pyinstrument'
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Метрики Prometheus (uch.apps.core.metrics) на /metrics. Под gunicorn
+# значения воркеров складываются через PROMETHEUS_MULTIPROC_DIR (см.
+# gunicorn.conf.py). По умолчанию /metrics доступен только с локального
+# адреса. Открыть для Prometheus: METRICS_ALLOWED_IPS=10.0.0.5,10.0.0.6
+# (адреса через запятую) и/или METRICS_TOKEN=<секрет> — тогда scrape
+# передаёт заголовок Authorization: Bearer <секрет> (bearer_token в scrape_config)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Проверка готовности /ready/: максимальное время отклика БД и кэша
+READINESS_MAX_LATENCY_MS = 500
+
+# Фоновые задачи: Celery при наличии брокера, иначе пул потоков процесса
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL or '')
+CELERY_TASK_IGNORE_RESULT = True
+BACKGROUND_TASKS_EAGER = False  # True — выполнять сразу (тесты, отладка)
+BACKGROUND_THREAD_WORKERS = 4
+BACKGROUND_PROCESS_WORKERS = 2  # CPU-задачи (превью) без Celery
+
+# Превью изображений MediaItem: имя -> размер (вписывается в рамку) и формат.
+# 'admin' сохраняется в поле MediaItem.thumbnail
+MEDIA_THUMBNAILS = {
+    'admin': {'size': (200, 200), 'format': 'JPEG'},
+    'small': {'size': (480, 480), 'format': 'WEBP'},
+    'medium': {'size': (1024, 1024), 'format': 'WEBP'},
+    'medium_jpeg': {'size': (1024, 1024), 'format': 'JPEG'},
+}
+MEDIA_THUMBNAIL_QUALITY = 82
+
+# Производные обложек статей для srcset: ширины (px) и форматы.
+# Первый формат — основной (<source>), последний — запасной для <img>
+ARTICLE_COVER_WIDTHS = [320, 480, 768, 1200]
+ARTICLE_COVER_FORMATS = ['WEBP', 'JPEG']
+
+# Загрузка файлов частями (uch.apps.media)
+MEDIA_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+MEDIA_UPLOAD_CHUNK_SIZE = 16 * 1024 ** 2  # максимальный размер одной части
+
+# Отдача медиафайлов (uch.apps.media.delivery). Если задан префикс, файлы
+# отдаёт nginx из internal-локации, например:
+#   location /protected-media/ { internal; alias /media/; }
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+MEDIA_CACHE_MAX_AGE = 60 * 60  # для путей без адресации по содержимому
@@ -15,22 +15,31 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from uch.apps.core.views import home, health_check
+from uch.apps.core.metrics import metrics_view
+from uch.apps.core.views import home, health_check, readiness_check
+from uch.apps.media.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('uch.apps.blog.urls')),
     path('health/', health_check, name='health_check'),
+    path('ready/', readiness_check, name='readiness_check'),
+    path('metrics', metrics_view, name='metrics'),
+    path('uploads/', include('uch.apps.media.urls')),
     # Добавим позже:
     path('blog/', include('uch.apps.blog.urls')),
-    # path('api/', include('uch.apps.api.urls')),
+    path('api/', include('uch.apps.api.urls')),
 ]
 
-# Добавляем пути к медиафайлам в режиме разработки
+# Медиафайлы: Range, условные запросы и X-Accel-Redirect (см. media/delivery.py)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media_file'),
+]
+
+# Статика в режиме разработки
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file